@@ -0,0 +1,80 @@
+"""Change-data-capture triggers for shipments, trucks and delivery events
+
+Revision ID: change_feed_v1
+Revises: notification_log_v1
+Create Date: 2025-03-20 09:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'change_feed_v1'
+down_revision = 'notification_log_v1'
+branch_labels = None
+depends_on = None
+
+# Mirrors WATCHED_COLUMNS in app/services/change_feed.py
+WATCHED_COLUMNS = {
+    'shipments': ['status', 'priority', 'assigned_truck_id', 'assigned_driver_id',
+                  'pickup_time', 'delivery_deadline', 'actual_delivery_time'],
+    'trucks': ['status', 'driver_id', 'last_maintenance', 'next_maintenance'],
+    'delivery_events': ['shipment_id', 'event_type', 'location', 'timestamp'],
+}
+
+# NOTIFY smarthaul_changes with the watched columns that changed as [old, new];
+# transactions can opt out with set_config('smarthaul.change_feed', 'off', true)
+NOTIFY_FUNCTION = """
+CREATE OR REPLACE FUNCTION smarthaul_notify_change() RETURNS trigger AS $$
+DECLARE
+    old_row jsonb := CASE WHEN TG_OP = 'INSERT' THEN '{}'::jsonb ELSE to_jsonb(OLD) END;
+    new_row jsonb := CASE WHEN TG_OP = 'DELETE' THEN '{}'::jsonb ELSE to_jsonb(NEW) END;
+    current_row jsonb := CASE WHEN TG_OP = 'DELETE' THEN old_row ELSE new_row END;
+    row_values jsonb := '{}'::jsonb;
+    changes jsonb := '{}'::jsonb;
+    col text;
+BEGIN
+    IF current_setting('smarthaul.change_feed', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+    FOREACH col IN ARRAY TG_ARGV LOOP
+        row_values := row_values || jsonb_build_object(col, current_row -> col);
+        IF TG_OP <> 'DELETE' AND (old_row -> col) IS DISTINCT FROM (new_row -> col) THEN
+            changes := changes || jsonb_build_object(col, jsonb_build_array(old_row -> col, new_row -> col));
+        END IF;
+    END LOOP;
+    IF TG_OP = 'UPDATE' AND changes = '{}'::jsonb THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('smarthaul_changes', jsonb_build_object(
+        'table', TG_TABLE_NAME,
+        'op', lower(TG_OP),
+        'id', current_row -> 'id',
+        'row', row_values,
+        'changes', changes
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(NOTIFY_FUNCTION)
+    for table, columns in WATCHED_COLUMNS.items():
+        arguments = ', '.join(f"'{column}'" for column in columns)
+        watched = ', '.join(f'"{column}"' for column in columns)
+        # UPDATE OF: bulk writes that only touch other columns (ETAs, positions) never fire
+        op.execute(
+            f"CREATE TRIGGER {table}_change_feed AFTER INSERT OR DELETE OR UPDATE OF {watched} "
+            f"ON {table} FOR EACH ROW EXECUTE FUNCTION smarthaul_notify_change({arguments})"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in WATCHED_COLUMNS:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_change_feed ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS smarthaul_notify_change()")
@@ -0,0 +1,41 @@
+"""Cold-chain temperature compliance aggregates
+
+Revision ID: cold_chain_compliance_v1
+Revises: telemetry_history_v1
+Create Date: 2025-02-24 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'cold_chain_compliance_v1'
+down_revision = 'telemetry_history_v1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # One row per refrigerated shipment, updated in place as telemetry arrives
+    op.create_table('shipment_temperature_compliance',
+        sa.Column('shipment_id', sa.Integer(), nullable=False),
+        sa.Column('truck_id', sa.Integer(), nullable=True),
+        sa.Column('cargo_type', sa.String(length=100), nullable=True),
+        sa.Column('min_temperature', sa.Float(), nullable=True),
+        sa.Column('max_temperature', sa.Float(), nullable=True),
+        sa.Column('monitored_seconds', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('in_range_seconds', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('excursion_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('excursion_seconds', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('peak_deviation', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('in_excursion', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('last_reading_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['shipment_id'], ['shipments.id'], ),
+        sa.ForeignKeyConstraint(['truck_id'], ['trucks.id'], ),
+        sa.PrimaryKeyConstraint('shipment_id')
+    )
+
+
+def downgrade():
+    op.drop_table('shipment_temperature_compliance')
@@ -0,0 +1,22 @@
+"""Index for incremental scans of recently updated shipments
+
+Revision ID: feature_store_v1
+Revises: prediction_upsert_v1
+Create Date: 2025-03-12 09:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'feature_store_v1'
+down_revision = 'prediction_upsert_v1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shipments_status_updated_at', 'shipments', ['status', 'updated_at'])
+
+
+def downgrade():
+    op.drop_index('ix_shipments_status_updated_at', table_name='shipments')
@@ -0,0 +1,42 @@
+"""Geofences for automatic pickup/arrival delivery events
+
+Revision ID: geofences_v1
+Revises: cold_chain_compliance_v1
+Create Date: 2025-03-03 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'geofences_v1'
+down_revision = 'cold_chain_compliance_v1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('geofences',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('shape', sa.String(length=20), nullable=False, server_default='circle'),
+        sa.Column('center_lat', sa.Float(), nullable=True),
+        sa.Column('center_lng', sa.Float(), nullable=True),
+        sa.Column('radius_m', sa.Float(), nullable=True),
+        sa.Column('polygon', sa.JSON(), nullable=True),
+        sa.Column('location', sa.String(length=255), nullable=True),
+        sa.Column('shipment_id', sa.Integer(), nullable=True),
+        sa.Column('active', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['shipment_id'], ['shipments.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_geofences_id'), 'geofences', ['id'], unique=False)
+    op.create_index(op.f('ix_geofences_shipment_id'), 'geofences', ['shipment_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_geofences_shipment_id'), table_name='geofences')
+    op.drop_index(op.f('ix_geofences_id'), table_name='geofences')
+    op.drop_table('geofences')
@@ -0,0 +1,31 @@
+"""Append-only notification log with sequence numbers for resume
+
+Revision ID: notification_log_v1
+Revises: feature_store_v1
+Create Date: 2025-03-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'notification_log_v1'
+down_revision = 'feature_store_v1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_log',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_notification_log_created_at'), 'notification_log', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_notification_log_created_at'), table_name='notification_log')
+    op.drop_table('notification_log')
@@ -0,0 +1,30 @@
+"""One current prediction per shipment
+
+Revision ID: prediction_upsert_v1
+Revises: geofences_v1
+Create Date: 2025-03-10 08:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'prediction_upsert_v1'
+down_revision = 'geofences_v1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the newest prediction per shipment so the batch scorer can upsert on shipment_id
+    op.execute("""
+        DELETE FROM predictions
+        WHERE id NOT IN (SELECT max(id) FROM predictions GROUP BY shipment_id)
+    """)
+    op.create_index('uq_predictions_shipment_id', 'predictions', ['shipment_id'], unique=True)
+    op.add_column('predictions', sa.Column('model_version', sa.String(length=50), nullable=True))
+
+
+def downgrade():
+    op.drop_column('predictions', 'model_version')
+    op.drop_index('uq_predictions_shipment_id', table_name='predictions')
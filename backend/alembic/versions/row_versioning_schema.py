@@ -0,0 +1,30 @@
+"""Row versioning for optimistic concurrency on trucks and shipments
+
+Revision ID: row_versioning_v1
+Revises: fleet_management_v1
+Create Date: 2025-02-03 09:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'row_versioning_v1'
+down_revision = 'fleet_management_v1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Version counters checked by the ORM on every UPDATE
+    op.add_column('trucks', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+    op.add_column('shipments', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+    
+    # Dispatch queries filter available trucks; keep that lookup indexed
+    op.create_index('ix_trucks_status', 'trucks', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_trucks_status', table_name='trucks')
+    op.drop_column('shipments', 'version')
+    op.drop_column('trucks', 'version')
@@ -0,0 +1,118 @@
+"""Partitioned telemetry history with 1-minute and 1-hour rollups
+
+Revision ID: telemetry_history_v1
+Revises: truck_telemetry_v1
+Create Date: 2025-02-17 10:00:00.000000
+
+"""
+from datetime import datetime, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'telemetry_history_v1'
+down_revision = 'truck_telemetry_v1'
+branch_labels = None
+depends_on = None
+
+ROLLUP_COLUMNS = """
+    truck_id INTEGER NOT NULL,
+    recorded_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    temperature DOUBLE PRECISION,
+    temperature_min DOUBLE PRECISION,
+    temperature_max DOUBLE PRECISION,
+    samples INTEGER NOT NULL DEFAULT 0
+"""
+
+
+def _rollup_columns():
+    return [
+        sa.Column('truck_id', sa.Integer(), nullable=False),
+        sa.Column('recorded_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('lat', sa.Float(), nullable=True),
+        sa.Column('lng', sa.Float(), nullable=True),
+        sa.Column('temperature', sa.Float(), nullable=True),
+        sa.Column('temperature_min', sa.Float(), nullable=True),
+        sa.Column('temperature_max', sa.Float(), nullable=True),
+        sa.Column('samples', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('truck_id', 'recorded_at'),
+    ]
+
+
+def _create_daily_partitions(table, first, last):
+    day = first
+    while day <= last:
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS {table}_p{day:%Y%m%d} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{day} 00:00:00+00') TO ('{day + timedelta(days=1)} 00:00:00+00')"
+        )
+        day += timedelta(days=1)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        # Plain tables elsewhere; the BRIN indexes fall back to regular indexes
+        op.create_table('truck_telemetry_1m', *_rollup_columns())
+        op.create_table('truck_telemetry_1h', *_rollup_columns())
+        for table in ('truck_telemetry', 'truck_telemetry_1m', 'truck_telemetry_1h'):
+            op.create_index(f'ix_{table}_recorded_at_brin', table, ['recorded_at'])
+        return
+
+    today = datetime.now(timezone.utc).date()
+    # Rebuild the raw history as a table range-partitioned by day
+    op.rename_table('truck_telemetry', 'truck_telemetry_unpartitioned')
+    op.execute("ALTER TABLE truck_telemetry_unpartitioned RENAME CONSTRAINT truck_telemetry_pkey "
+               "TO truck_telemetry_unpartitioned_pkey")
+    op.execute("""
+        CREATE TABLE truck_telemetry (
+            truck_id INTEGER NOT NULL,
+            recorded_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            lat DOUBLE PRECISION,
+            lng DOUBLE PRECISION,
+            temperature DOUBLE PRECISION,
+            PRIMARY KEY (truck_id, recorded_at)
+        ) PARTITION BY RANGE (recorded_at)
+    """)
+    first, last = op.get_bind().execute(sa.text(
+        "SELECT min(recorded_at)::date, max(recorded_at)::date FROM truck_telemetry_unpartitioned"
+    )).one()
+    _create_daily_partitions('truck_telemetry', min(first or today, today - timedelta(days=1)),
+                             max(last or today, today + timedelta(days=3)))
+    op.execute("CREATE TABLE truck_telemetry_default PARTITION OF truck_telemetry DEFAULT")
+    op.execute("INSERT INTO truck_telemetry SELECT truck_id, recorded_at, lat, lng, temperature "
+               "FROM truck_telemetry_unpartitioned")
+    op.drop_table('truck_telemetry_unpartitioned')
+
+    op.execute(f"CREATE TABLE truck_telemetry_1m ({ROLLUP_COLUMNS}, PRIMARY KEY (truck_id, recorded_at)) "
+               "PARTITION BY RANGE (recorded_at)")
+    _create_daily_partitions('truck_telemetry_1m', today - timedelta(days=1), today + timedelta(days=3))
+    op.execute("CREATE TABLE truck_telemetry_1m_default PARTITION OF truck_telemetry_1m DEFAULT")
+    op.create_table('truck_telemetry_1h', *_rollup_columns())
+
+    # Rows arrive roughly in time order, so BRIN ranges stay tight at a fraction of a btree's size
+    for table in ('truck_telemetry', 'truck_telemetry_1m', 'truck_telemetry_1h'):
+        op.execute(f"CREATE INDEX ix_{table}_recorded_at_brin ON {table} USING brin (recorded_at)")
+
+
+def downgrade():
+    op.drop_table('truck_telemetry_1h')
+    op.drop_table('truck_telemetry_1m')
+    if op.get_bind().dialect.name != 'postgresql':
+        op.drop_index('ix_truck_telemetry_recorded_at_brin', table_name='truck_telemetry')
+        return
+
+    op.rename_table('truck_telemetry', 'truck_telemetry_partitioned')
+    op.create_table('truck_telemetry',
+        sa.Column('truck_id', sa.Integer(), nullable=False),
+        sa.Column('recorded_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('lat', sa.Float(), nullable=True),
+        sa.Column('lng', sa.Float(), nullable=True),
+        sa.Column('temperature', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('truck_id', 'recorded_at', name='truck_telemetry_unpartitioned_pkey')
+    )
+    op.execute("INSERT INTO truck_telemetry SELECT truck_id, recorded_at, lat, lng, temperature "
+               "FROM truck_telemetry_partitioned")
+    op.execute("DROP TABLE truck_telemetry_partitioned CASCADE")
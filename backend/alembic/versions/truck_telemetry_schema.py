@@ -0,0 +1,31 @@
+"""Truck telemetry history table
+
+Revision ID: truck_telemetry_v1
+Revises: row_versioning_v1
+Create Date: 2025-02-10 14:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'truck_telemetry_v1'
+down_revision = 'row_versioning_v1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Append-only history written in bulk by the telemetry pipeline
+    op.create_table('truck_telemetry',
+        sa.Column('truck_id', sa.Integer(), nullable=False),
+        sa.Column('recorded_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('lat', sa.Float(), nullable=True),
+        sa.Column('lng', sa.Float(), nullable=True),
+        sa.Column('temperature', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('truck_id', 'recorded_at')
+    )
+
+
+def downgrade():
+    op.drop_table('truck_telemetry')
@@ -0,0 +1,38 @@
+"""Outbound webhook delivery queue and dead letters
+
+Revision ID: webhook_queue_v1
+Revises: change_feed_v1
+Create Date: 2025-03-22 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'webhook_queue_v1'
+down_revision = 'change_feed_v1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('webhook_deliveries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('destination', sa.String(length=500), nullable=False),
+        sa.Column('event_type', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('claim', sa.String(length=36), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_webhook_deliveries_status_next_attempt_at', 'webhook_deliveries',
+                    ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_webhook_deliveries_status_next_attempt_at', table_name='webhook_deliveries')
+    op.drop_table('webhook_deliveries')
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel, Field
 
 from ..models.base import get_db
 from ..models.tables import Truck, MaintenanceRecord, FuelRecord, User
+from ..services.bulk_service import BulkWriter
+from ..services.change_feed import record_change, update_with_changes
+from ..services.maintenance_service import URGENCY_LEVELS, maintenance_engine
+from ..services.fuel_analytics_service import SORTABLE_FIELDS, fuel_analytics
 
 router = APIRouter()
 
@@ -26,6 +31,7 @@ class TruckCreate(TruckBase):
     pass
 
 class TruckUpdate(TruckBase):
+    plate_number: Optional[str] = Field(None, description="License plate number")
     status: Optional[str] = Field(None, description="available, in_use, maintenance, out_of_service")
     current_lat: Optional[float] = Field(None, description="Current latitude")
     current_lng: Optional[float] = Field(None, description="Current longitude")
@@ -43,6 +49,7 @@ class TruckResponse(TruckBase):
     total_miles: float
     created_at: datetime
     updated_at: datetime
+    version: Optional[int] = None
     
     class Config:
         from_attributes = True
@@ -107,6 +114,12 @@ async def create_truck(truck: TruckCreate, db: Session = Depends(get_db)):
     db.refresh(db_truck)
     return db_truck
 
+@router.post("/trucks/bulk")
+async def bulk_create_trucks(request: Request, upsert: bool = False, db: Session = Depends(get_db)):
+    """Create (or with upsert=true, update) trucks from a JSON array or NDJSON stream"""
+    writer = BulkWriter(db, Truck, "plate_number", TruckCreate, upsert=upsert)
+    return await writer.write_request(request)
+
 @router.get("/trucks", response_model=List[TruckResponse])
 async def get_trucks(
     skip: int = 0, 
@@ -136,23 +149,27 @@ async def get_truck(truck_id: int, db: Session = Depends(get_db)):
 
 @router.put("/trucks/{truck_id}", response_model=TruckResponse)
 async def update_truck(truck_id: int, truck_update: TruckUpdate, db: Session = Depends(get_db)):
-    """Update truck information"""
-    db_truck = db.query(Truck).filter(Truck.id == truck_id).first()
-    if not db_truck:
+    """Update truck information in a single UPDATE ... RETURNING round trip"""
+    update_data = truck_update.dict(exclude_unset=True)
+    try:
+        updated, changes = update_with_changes(
+            db, Truck, truck_id, update_data, {"updated_at": datetime.utcnow(), "version": Truck.version + 1}
+        )
+    except IntegrityError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid truck update: {e.orig}"
+        )
+    if not updated:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Truck with ID {truck_id} not found"
         )
     
-    # Update fields
-    update_data = truck_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_truck, field, value)
-    
-    db_truck.updated_at = datetime.utcnow()
+    record_change(db, "trucks", "update", updated, changes)
     db.commit()
-    db.refresh(db_truck)
-    return db_truck
+    return updated
 
 @router.delete("/trucks/{truck_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_truck(truck_id: int, db: Session = Depends(get_db)):
@@ -198,6 +215,7 @@ async def create_maintenance_record(record: MaintenanceRecordCreate, db: Session
     
     db.commit()
     db.refresh(db_record)
+    maintenance_engine.invalidate()
     return db_record
 
 @router.get("/maintenance/{truck_id}", response_model=List[MaintenanceRecordResponse])
@@ -236,6 +254,8 @@ async def create_fuel_record(record: FuelRecordCreate, db: Session = Depends(get
     
     db.commit()
     db.refresh(db_record)
+    maintenance_engine.invalidate()
+    fuel_analytics.invalidate()
     return db_record
 
 @router.get("/fuel/{truck_id}", response_model=List[FuelRecordResponse])
@@ -274,25 +294,58 @@ async def get_fleet_overview(db: Session = Depends(get_db)):
     }
 
 @router.get("/analytics/maintenance-alerts")
-async def get_maintenance_alerts(db: Session = Depends(get_db)):
-    """Get trucks that need maintenance soon"""
-    from datetime import timedelta
-    
-    # Get trucks that need maintenance in the next 30 days
-    thirty_days_from_now = datetime.utcnow() + timedelta(days=30)
-    trucks_needing_maintenance = db.query(Truck).filter(
-        Truck.next_maintenance <= thirty_days_from_now,
-        Truck.status != "out_of_service"
-    ).all()
-    
-    alerts = []
-    for truck in trucks_needing_maintenance:
-        days_until_maintenance = (truck.next_maintenance - datetime.utcnow()).days
-        alerts.append({
-            "truck_id": truck.id,
-            "plate_number": truck.plate_number,
-            "days_until_maintenance": days_until_maintenance,
-            "urgency": "critical" if days_until_maintenance <= 7 else "warning" if days_until_maintenance <= 14 else "info"
-        })
-    
-    return {"maintenance_alerts": alerts}
+async def get_maintenance_alerts(skip: int = 0, limit: int = 100, urgency: Optional[str] = None):
+    """Get trucks that need maintenance soon, ranked by predicted risk
+
+    Risk combines mileage since last service, fuel efficiency degradation and the
+    scheduled maintenance date. It is computed for the whole fleet in one vectorized
+    pass and cached, so this endpoint does not touch the database on a warm cache.
+    """
+    if urgency and urgency not in URGENCY_LEVELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"urgency must be one of {', '.join(URGENCY_LEVELS)}"
+        )
+    snapshot = await maintenance_engine.get_snapshot()
+    return snapshot.alerts(skip=skip, limit=limit, urgency=urgency)
+
+# Fuel Analytics Endpoints
+@router.get("/analytics/fuel-efficiency")
+async def get_fuel_efficiency(
+    skip: int = 0,
+    limit: int = 100,
+    sort: str = "cost_per_mile",
+    descending: bool = True
+):
+    """Per-truck MPG, rolling MPG and cost per mile across the fleet"""
+    if sort not in SORTABLE_FIELDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"sort must be one of {', '.join(SORTABLE_FIELDS)}"
+        )
+    await fuel_analytics.ensure_fresh()
+    return fuel_analytics.fleet_summary(skip=skip, limit=limit, sort=sort, descending=descending)
+
+@router.get("/analytics/fuel-efficiency/{truck_id}")
+async def get_truck_fuel_efficiency(truck_id: int):
+    """Fill-by-fill MPG, rolling MPG and cost per mile for one truck, as column arrays"""
+    await fuel_analytics.ensure_fresh()
+    result = fuel_analytics.truck_series(truck_id)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No fuel records for truck with ID {truck_id}"
+        )
+    return result
+
+@router.get("/analytics/fuel-anomalies")
+async def get_fuel_anomalies(skip: int = 0, limit: int = 100):
+    """Fill-ups whose MPG is an outlier for their truck (possible leaks, theft or bad odometer readings)"""
+    await fuel_analytics.ensure_fresh()
+    return fuel_analytics.anomalies(skip=skip, limit=limit)
+
+@router.get("/analytics/fuel-cost-trend")
+async def get_fuel_cost_trend():
+    """Fleet fuel spend, gallons and average price per gallon by month"""
+    await fuel_analytics.ensure_fresh()
+    return fuel_analytics.cost_trend()
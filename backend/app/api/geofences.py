@@ -0,0 +1,131 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import datetime
+from pydantic import BaseModel, Field
+
+from ..models.base import get_db
+from ..models.tables import Geofence, Shipment, Truck
+from ..services.geofence_service import FENCE_KINDS, geofence_engine
+
+router = APIRouter()
+
+# Pydantic Models for API
+class GeofenceBase(BaseModel):
+    name: str = Field(..., description="Fence name")
+    kind: str = Field(..., description="origin, destination, depot")
+    shape: str = Field("circle", description="circle, polygon")
+    center_lat: Optional[float] = Field(None, description="Circle center latitude")
+    center_lng: Optional[float] = Field(None, description="Circle center longitude")
+    radius_m: Optional[float] = Field(None, description="Circle radius in meters")
+    polygon: Optional[List[List[float]]] = Field(None, description="Polygon vertices as [lat, lng] pairs")
+    location: Optional[str] = Field(None, description="Matches shipment origin/destination text, e.g. 'Chicago, IL'")
+    shipment_id: Optional[int] = Field(None, description="Restrict the fence to one shipment")
+    active: bool = Field(True, description="Whether telemetry is matched against this fence")
+
+class GeofenceCreate(GeofenceBase):
+    pass
+
+class GeofenceResponse(GeofenceBase):
+    id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+def _validate_geometry(fence: GeofenceCreate):
+    if fence.kind not in FENCE_KINDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"kind must be one of {', '.join(FENCE_KINDS)}"
+        )
+    if fence.shape == "circle":
+        if fence.center_lat is None or fence.center_lng is None or not fence.radius_m or fence.radius_m <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Circle fences need center_lat, center_lng and a positive radius_m"
+            )
+    elif fence.shape == "polygon":
+        if not fence.polygon or len(fence.polygon) < 3 or any(len(vertex) != 2 for vertex in fence.polygon):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Polygon fences need at least 3 [lat, lng] vertices"
+            )
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="shape must be circle or polygon"
+        )
+
+# Geofence Endpoints
+@router.post("/", response_model=GeofenceResponse, status_code=status.HTTP_201_CREATED)
+async def create_geofence(fence: GeofenceCreate, db: Session = Depends(get_db)):
+    """Create a geofence; telemetry is matched against it from the next batch on"""
+    _validate_geometry(fence)
+    if fence.shipment_id and not db.query(Shipment.id).filter(Shipment.id == fence.shipment_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Shipment with ID {fence.shipment_id} not found"
+        )
+    db_fence = Geofence(**fence.dict())
+    db.add(db_fence)
+    db.commit()
+    db.refresh(db_fence)
+    geofence_engine.invalidate()
+    return db_fence
+
+@router.get("/", response_model=List[GeofenceResponse])
+async def get_geofences(
+    skip: int = 0,
+    limit: int = 100,
+    kind: Optional[str] = None,
+    shipment_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Get geofences with optional filtering"""
+    query = db.query(Geofence)
+    if kind:
+        query = query.filter(Geofence.kind == kind)
+    if shipment_id:
+        query = query.filter(Geofence.shipment_id == shipment_id)
+    return query.order_by(Geofence.id).offset(skip).limit(limit).all()
+
+@router.get("/status")
+async def get_geofence_status():
+    """Get geofence index size and matching statistics"""
+    return geofence_engine.status()
+
+@router.get("/trucks/{truck_id}")
+async def get_truck_geofences(truck_id: int, db: Session = Depends(get_db)):
+    """Get the fences a truck is currently inside (after debouncing)"""
+    if not db.query(Truck.id).filter(Truck.id == truck_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Truck with ID {truck_id} not found"
+        )
+    return {"truck_id": truck_id, "geofences": geofence_engine.truck_fences(truck_id)}
+
+@router.get("/{geofence_id}", response_model=GeofenceResponse)
+async def get_geofence(geofence_id: int, db: Session = Depends(get_db)):
+    """Get a specific geofence by ID"""
+    fence = db.query(Geofence).filter(Geofence.id == geofence_id).first()
+    if not fence:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Geofence with ID {geofence_id} not found"
+        )
+    return fence
+
+@router.delete("/{geofence_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_geofence(geofence_id: int, db: Session = Depends(get_db)):
+    """Delete a geofence"""
+    fence = db.query(Geofence).filter(Geofence.id == geofence_id).first()
+    if not fence:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Geofence with ID {geofence_id} not found"
+        )
+    db.delete(fence)
+    db.commit()
+    geofence_engine.invalidate()
+    return None
@@ -0,0 +1,94 @@
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import JSONResponse, Response
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
+from ..services.job_queue import JOB_STATUSES, job_info, job_queue
+
+router = APIRouter()
+
+# Pydantic Models for API
+class JobRequest(BaseModel):
+    kind: str = Field(..., description="Job kind, e.g. pdf.delivery_confirmation or predictions.refresh")
+    payload: Dict[str, Any] = Field(default_factory=dict, description="Arguments for the job handler")
+    priority: int = Field(0, ge=-100, le=100, description="Higher runs first")
+    max_attempts: Optional[int] = Field(None, ge=1, le=10, description="Defaults to job_max_attempts")
+
+async def submit_job(kind: str, payload: Dict[str, Any], priority: int = 0,
+                     max_attempts: Optional[int] = None) -> JSONResponse:
+    """Queue a job and answer 202 with where to poll for it"""
+    try:
+        job = await run_in_threadpool(job_queue.submit, kind, payload, priority, max_attempts)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={**job, "status_url": f"/api/jobs/{job['id']}"},
+        headers={"Location": f"/api/jobs/{job['id']}"}
+    )
+
+async def _get_job(job_id: int, with_result: bool = False):
+    job = await run_in_threadpool(job_queue.get, job_id, with_result)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with ID {job_id} not found"
+        )
+    return job
+
+# Job Endpoints
+@router.post("", status_code=status.HTTP_202_ACCEPTED)
+async def create_job(request: JobRequest):
+    """Queue a background job; poll its status, then fetch /result"""
+    return await submit_job(request.kind, request.payload, request.priority, request.max_attempts)
+
+@router.get("")
+async def list_jobs(
+    status_filter: Optional[str] = Query(None, alias="status", description=", ".join(JOB_STATUSES)),
+    kind: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Most recent jobs, optionally filtered by status and kind"""
+    jobs = await run_in_threadpool(job_queue.list, status_filter, kind, limit)
+    return {"jobs": jobs, "count": len(jobs)}
+
+@router.get("/status")
+async def get_job_queue_status():
+    """Queue depth by status, oldest waiting job and worker health"""
+    return {**job_queue.status(), **await run_in_threadpool(job_queue.counts)}
+
+@router.get("/{job_id}")
+async def get_job(job_id: int):
+    """Job status, attempts and error"""
+    return job_info(await _get_job(job_id))
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: int):
+    """The finished job's output: the stored file for PDF/QR jobs, otherwise JSON"""
+    job = await _get_job(job_id, with_result=True)
+    if job.status != "succeeded":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job {job_id} is {job.status}" + (f": {job.error}" if job.error else "")
+        )
+    if job.result_data is not None:
+        filename = job.payload.get("filename")
+        headers = {"Content-Disposition": f"attachment; filename={filename}"} if filename else None
+        return Response(content=job.result_data, media_type=job.result_type, headers=headers)
+    return {"id": job.id, "kind": job.kind, "result": job.result}
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: int):
+    """Cancel a job that has not started yet"""
+    await _get_job(job_id)
+    if not await run_in_threadpool(job_queue.cancel, job_id):
+        job = await _get_job(job_id)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job {job_id} is {job.status} and can no longer be cancelled"
+        )
+    return {"status": "success", "message": f"Job {job_id} cancelled"}
@@ -1,18 +1,21 @@
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
-from typing import Dict, List, Any
+from fastapi import APIRouter, Header, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, List, Any, Optional
 import json
-import asyncio
 from datetime import datetime
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
-router = APIRouter()
-
-# Store connected WebSocket clients
-connected_clients: List[WebSocket] = []
+from ..core.config import settings
+from ..services.change_feed import change_feed
+from ..services.notification_bus import notification_bus
+from ..services.notification_log import notification_log
+from ..services.webhook_service import webhook_dispatcher
+from ..services.websocket_service import (
+    EventStreamClient, notification_key, notification_manager, parse_subscription
+)
 
-# Store notification history
-notification_history: List[Dict[str, Any]] = []
+router = APIRouter()
 
 class NotificationRequest(BaseModel):
     type: str
@@ -21,40 +24,172 @@ class NotificationRequest(BaseModel):
     shipment_id: int = None
     truck_id: int = None
     statistics: Dict[str, Any] = None
+    region: Optional[str] = None  # e.g. "IL"; delivered to clients subscribed to that region
+
+class DeadLetterRequest(BaseModel):
+    ids: Optional[List[int]] = None  # None means every dead letter
+
+def welcome() -> Dict[str, Any]:
+    return {
+        "type": "connection",
+        "message": "Connected to SmartHaul notifications",
+        "last_seq": notification_log.last_seq,
+        "timestamp": datetime.now().isoformat()
+    }
+
+def replay_missed(client, since: int):
+    """Queue what a reconnecting client missed after `since`, capped by its send queue.
+
+    Runs right after the client is registered with no await in between, so the replay lands
+    ahead of any live notification.
+    """
+    missed, truncated = notification_log.tail(since, max(notification_manager.max_queue - 2, 1))
+    # Notifications still in the current batch window reach this client when it flushes
+    pending = {notification.get("seq") for notification, _ in notification_manager.pending.values()}
+    missed = [
+        notification for notification in missed
+        if notification["seq"] not in pending and notification_manager.wants(client, notification)
+    ]
+    if truncated:
+        notification_manager.send(client, {
+            "type": "resume_gap",
+            "message": "Some missed notifications were not replayed; page them from /history",
+            "since": since,
+            "replayed_from": missed[0]["seq"] if missed else notification_log.last_seq + 1,
+            "timestamp": datetime.now().isoformat()
+        })
+    for notification in missed:
+        notification_manager.send(client, notification, notification["seq"])
 
 @router.websocket("/ws/notifications")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time notifications"""
-    await websocket.accept()
-    connected_clients.append(websocket)
+async def websocket_endpoint(websocket: WebSocket, since: Optional[int] = None):
+    """WebSocket endpoint for real-time notifications.
+
+    Without subscriptions a client receives every notification. Clients may send
+    {"action": "subscribe" | "unsubscribe", "shipment_ids": [...], "truck_ids": [...],
+    "regions": [...], "types": [...]}; entity subscriptions are OR-ed and "types" narrows them.
+
+    Every notification carries a "seq"; reconnect with ?since=<last seen seq> to be sent what
+    was missed. Replay is capped by the send queue; when more was missed a "resume_gap" message
+    says where to page from with GET /history?since=.
+    """
+    client = await notification_manager.connect(websocket)
     
     try:
         # Send welcome message
-        await websocket.send_text(json.dumps({
-            "type": "connection",
-            "message": "Connected to SmartHaul notifications",
-            "timestamp": datetime.now().isoformat()
-        }))
+        notification_manager.send(client, welcome())
+        
+        if since is not None:
+            replay_missed(client, since)
         
-        # Keep connection alive
         while True:
-            await websocket.receive_text()
+            text = await websocket.receive_text()
+            try:
+                request = json.loads(text)
+                action = request.get("action")
+                if action not in ("subscribe", "unsubscribe"):
+                    raise ValueError("action must be subscribe or unsubscribe")
+                topics, types = parse_subscription(request)
+                if action == "subscribe":
+                    notification_manager.subscribe(client, topics, types)
+                else:
+                    notification_manager.unsubscribe(client, topics, types)
+                notification_manager.send(client, {
+                    "type": "subscription",
+                    "topics": sorted(client.topics),
+                    "types": sorted(client.types),
+                    "timestamp": datetime.now().isoformat()
+                })
+            except (ValueError, TypeError, AttributeError) as e:
+                notification_manager.send(client, {
+                    "type": "error",
+                    "message": f"Invalid subscription message: {e}",
+                    "timestamp": datetime.now().isoformat()
+                })
             
     except WebSocketDisconnect:
-        connected_clients.remove(websocket)
+        pass
     except Exception as e:
         print(f"WebSocket error: {e}")
-        if websocket in connected_clients:
-            connected_clients.remove(websocket)
+    finally:
+        notification_manager.disconnect(client)
 
-async def broadcast_notification(notification: Dict[str, Any]):
-    """Broadcast notification to all connected clients"""
-    if connected_clients:
-        message = json.dumps(notification)
-        await asyncio.gather(
-            *[client.send_text(message) for client in connected_clients],
-            return_exceptions=True
+def split_param(value: Optional[str]) -> List[str]:
+    return [item for item in (value or "").split(",") if item.strip()]
+
+@router.get("/stream")
+async def notification_stream(
+    since: Optional[int] = None,
+    shipment_ids: Optional[str] = None,
+    truck_ids: Optional[str] = None,
+    regions: Optional[str] = None,
+    types: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """Server-Sent Events stream of notifications, for read-only dashboards.
+
+    Same notifications, batching and slow-client handling as /ws/notifications. Subscriptions
+    are comma-separated query parameters (shipment_ids, truck_ids, regions, types; none means
+    everything). Each event's id is its newest "seq", so EventSource resumes through
+    Last-Event-ID on reconnect (or pass ?since=). Idle streams get a comment line every
+    sse_heartbeat_interval seconds to keep proxies from timing them out.
+    """
+    try:
+        topics, type_filter = parse_subscription({
+            "shipment_ids": split_param(shipment_ids),
+            "truck_ids": split_param(truck_ids),
+            "regions": split_param(regions),
+            "types": split_param(types),
+        })
+        if last_event_id:
+            since = int(last_event_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid stream request: {e}"
         )
+    
+    client = notification_manager.register(EventStreamClient(notification_manager))
+    try:
+        notification_manager.subscribe(client, topics, type_filter)
+    except ValueError as e:
+        notification_manager.disconnect(client)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid stream request: {e}"
+        )
+    notification_manager.send(client, welcome())
+    if since is not None:
+        replay_missed(client, since)
+    
+    return StreamingResponse(
+        client.events(settings.sse_heartbeat_interval),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def deliver_notification(notification: Dict[str, Any]):
+    """Record and fan out a notification to this worker's clients.
+
+    Only clients subscribed to the notification's shipment, truck, region or type (or with no
+    subscriptions) receive it. Serialized once and queued per client; slow clients are coalesced,
+    trimmed or evicted by their own writer instead of holding up the broadcast.
+    """
+    notification_log.remember(notification)
+    notification_manager.publish(notification, notification_key(notification))
+
+notification_bus.on_message(deliver_notification)
+
+async def broadcast_notification(notification: Dict[str, Any]):
+    """Broadcast notification to all connected clients.
+
+    Appended to the notification log (which assigns its sequence number), delivered locally,
+    then published once on the notification bus so every other worker delivers it too.
+    Shipment and truck events are also queued for the outbound webhooks.
+    """
+    await notification_log.record(notification)
+    await notification_bus.publish(notification)
+    await webhook_dispatcher.enqueue(notification)
 
 @router.post("/delay")
 async def notify_delay(request: NotificationRequest):
@@ -64,13 +199,11 @@ async def notify_delay(request: NotificationRequest):
         "message": request.message,
         "shipment_id": request.shipment_id,
         "timestamp": request.timestamp,
-        "severity": "warning"
+        "severity": "warning",
+        "region": request.region
     }
     
-    # Store in history
-    notification_history.append(notification)
-    
-    # Broadcast to connected clients
+    # Store in history and broadcast to connected clients on every worker
     await broadcast_notification(notification)
     
     return JSONResponse({
@@ -87,13 +220,11 @@ async def notify_maintenance(request: NotificationRequest):
         "message": request.message,
         "truck_id": request.truck_id,
         "timestamp": request.timestamp,
-        "severity": "error"
+        "severity": "error",
+        "region": request.region
     }
     
-    # Store in history
-    notification_history.append(notification)
-    
-    # Broadcast to connected clients
+    # Store in history and broadcast to connected clients on every worker
     await broadcast_notification(notification)
     
     return JSONResponse({
@@ -110,13 +241,11 @@ async def notify_urgent(request: NotificationRequest):
         "message": request.message,
         "shipment_id": request.shipment_id,
         "timestamp": request.timestamp,
-        "severity": "critical"
+        "severity": "critical",
+        "region": request.region
     }
     
-    # Store in history
-    notification_history.append(notification)
-    
-    # Broadcast to connected clients
+    # Store in history and broadcast to connected clients on every worker
     await broadcast_notification(notification)
     
     return JSONResponse({
@@ -136,10 +265,7 @@ async def notify_daily_report(request: NotificationRequest):
         "severity": "info"
     }
     
-    # Store in history
-    notification_history.append(notification)
-    
-    # Broadcast to connected clients
+    # Store in history and broadcast to connected clients on every worker
     await broadcast_notification(notification)
     
     return JSONResponse({
@@ -149,18 +275,55 @@ async def notify_daily_report(request: NotificationRequest):
     })
 
 @router.get("/history")
-async def get_notification_history():
-    """Get notification history"""
+async def get_notification_history(
+    since: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """Get notification history.
+
+    Without `since`, the newest `limit` notifications; with it, the `limit` notifications after
+    that sequence number, oldest first (page forward with the last "seq" returned).
+    """
+    notifications = await notification_log.history(since, limit)
     return {
-        "notifications": notification_history[-50:],  # Last 50 notifications
-        "total": len(notification_history)
+        "notifications": notifications,
+        "total": notification_log.last_seq,
+        "last_seq": notification_log.last_seq
     }
 
 @router.get("/status")
 async def get_notification_status():
     """Get notification system status"""
     return {
-        "connected_clients": len(connected_clients),
-        "total_notifications": len(notification_history),
-        "status": "active"
+        "connected_clients": len(notification_manager.clients),
+        "total_notifications": notification_log.last_seq,
+        "status": "active",
+        "fan_out": notification_manager.status(),
+        "bus": notification_bus.status(),
+        "change_feed": change_feed.status(),
+        "webhooks": webhook_dispatcher.status(),
+        "history": notification_log.status()
     }
+
+@router.get("/webhooks")
+async def get_webhook_status():
+    """Outbound webhook destinations, delivery counters and queue depth"""
+    return {**webhook_dispatcher.status(), **await run_in_threadpool(webhook_dispatcher.counts)}
+
+@router.get("/webhooks/dead-letters")
+async def get_dead_letters(limit: int = Query(100, ge=1, le=1000)):
+    """Events that were rejected or ran out of delivery attempts, newest first"""
+    dead_letters = await run_in_threadpool(webhook_dispatcher.dead_letters, limit)
+    return {"dead_letters": dead_letters, "count": len(dead_letters)}
+
+@router.post("/webhooks/dead-letters/retry")
+async def retry_dead_letters(request: Optional[DeadLetterRequest] = None):
+    """Queue dead letters for delivery again with fresh attempts"""
+    requeued = await run_in_threadpool(webhook_dispatcher.requeue, request.ids if request else None)
+    return {"status": "success", "requeued": requeued}
+
+@router.delete("/webhooks/dead-letters")
+async def purge_dead_letters(request: Optional[DeadLetterRequest] = None):
+    """Discard dead letters"""
+    purged = await run_in_threadpool(webhook_dispatcher.purge, request.ids if request else None)
+    return {"status": "success", "purged": purged}
@@ -1,17 +1,52 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Depends, Request, status
+from fastapi.responses import JSONResponse, Response
 from typing import Dict, Any, List
-import io
+import os
 
-from ..services.pdf_service import PDFService
+from ..services.pdf_render_pool import PDFRenderBusy, pdf_render_pool
+from ..services.render_cache import render_cache, render_key
+from .jobs import submit_job
 
 
 router = APIRouter(prefix="/api/pdf", tags=["PDF Generation"])
-pdf_service = PDFService()
+
+def render_busy(e: PDFRenderBusy) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=f"PDF rendering is at capacity ({e}); retry shortly or use background=true",
+        headers={"Retry-After": "1"}
+    )
+
+def render_busy_response(e: Exception):
+    """render_busy as a response, for renders that run while the response is being sent"""
+    if not isinstance(e, PDFRenderBusy):
+        return None
+    busy = render_busy(e)
+    return JSONResponse({"detail": busy.detail}, status_code=busy.status_code, headers=busy.headers)
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+async def render_response(request: Request, method: str, args: tuple, media_type: str, filename: str) -> Response:
+    """Serve a render from the content-addressed cache, rendering it on a miss; If-None-Match gets 304 without rendering"""
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if not render_cache.enabled:
+        return Response(await pdf_render_pool.render(method, *args), media_type=media_type, headers=headers)
+
+    key = render_key(method, args)
+    etag = f'"{key}"'
+    headers.update({"ETag": etag, "Cache-Control": "no-cache"})
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return await render_cache.response(
+        key, os.path.splitext(filename)[1], lambda: pdf_render_pool.render(method, *args),
+        on_error=render_busy_response, media_type=media_type, headers=headers
+    )
 
 @router.post("/delivery-confirmation/{shipment_id}")
-async def generate_delivery_confirmation(shipment_id: int):
-    """Generate delivery confirmation PDF for a shipment"""
+async def generate_delivery_confirmation(request: Request, shipment_id: int, background: bool = False):
+    """Generate delivery confirmation PDF for a shipment (background=true queues it as a job)"""
     try:
         # Using sample data for demonstration
         shipment_data = {
@@ -26,22 +61,28 @@ async def generate_delivery_confirmation(shipment_id: int):
             "delivery_deadline": "2025-01-17T18:00:00"
         }
         
-        pdf_bytes = pdf_service.generate_delivery_confirmation(shipment_data)
+        if background:
+            return await submit_job("pdf.delivery_confirmation", {
+                "shipment_data": shipment_data, "filename": f"delivery_confirmation_{shipment_id}.pdf"
+            })
         
-        return StreamingResponse(
-            io.BytesIO(pdf_bytes),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename=delivery_confirmation_{shipment_id}.pdf"}
+        return await render_response(
+            request, "generate_delivery_confirmation", (shipment_data,),
+            "application/pdf", f"delivery_confirmation_{shipment_id}.pdf"
         )
+    except PDFRenderBusy as e:
+        raise render_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate PDF: {str(e)}")
 
 @router.post("/exception-report/{shipment_id}")
 async def generate_exception_report(
+    request: Request,
     shipment_id: int,
-    exception_details: Dict[str, Any]
+    exception_details: Dict[str, Any],
+    background: bool = False
 ):
-    """Generate exception report PDF for a shipment"""
+    """Generate exception report PDF for a shipment (background=true queues it as a job)"""
     try:
         # Using sample data for demonstration
         shipment_data = {
@@ -51,22 +92,29 @@ async def generate_exception_report(
             "status": "delayed"
         }
         
-        pdf_bytes = pdf_service.generate_exception_report(shipment_data, exception_details)
+        if background:
+            return await submit_job("pdf.exception_report", {
+                "shipment_data": shipment_data, "exception_details": exception_details,
+                "filename": f"exception_report_{shipment_id}.pdf"
+            })
         
-        return StreamingResponse(
-            io.BytesIO(pdf_bytes),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename=exception_report_{shipment_id}.pdf"}
+        return await render_response(
+            request, "generate_exception_report", (shipment_data, exception_details),
+            "application/pdf", f"exception_report_{shipment_id}.pdf"
         )
+    except PDFRenderBusy as e:
+        raise render_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate PDF: {str(e)}")
 
 @router.post("/chain-of-custody/{shipment_id}")
 async def generate_chain_of_custody_report(
+    request: Request,
     shipment_id: int,
-    custody_events: List[Dict[str, Any]]
+    custody_events: List[Dict[str, Any]],
+    background: bool = False
 ):
-    """Generate chain of custody report PDF for a shipment"""
+    """Generate chain of custody report PDF for a shipment (background=true queues it as a job)"""
     try:
         # Using sample data for demonstration
         shipment_data = {
@@ -78,28 +126,40 @@ async def generate_chain_of_custody_report(
             "created_at": "2025-01-15T08:00:00"
         }
         
-        pdf_bytes = pdf_service.generate_chain_of_custody_report(shipment_data, custody_events)
+        if background:
+            return await submit_job("pdf.chain_of_custody", {
+                "shipment_data": shipment_data, "custody_events": custody_events,
+                "filename": f"chain_of_custody_{shipment_id}.pdf"
+            })
         
-        return StreamingResponse(
-            io.BytesIO(pdf_bytes),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename=chain_of_custody_{shipment_id}.pdf"}
+        return await render_response(
+            request, "generate_chain_of_custody_report", (shipment_data, custody_events),
+            "application/pdf", f"chain_of_custody_{shipment_id}.pdf"
         )
+    except PDFRenderBusy as e:
+        raise render_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate PDF: {str(e)}")
 
 @router.post("/qr-code/{shipment_id}")
-async def generate_qr_code(shipment_id: int):
-    """Generate QR code for a shipment"""
+async def generate_qr_code(request: Request, shipment_id: int, background: bool = False):
+    """Generate QR code for a shipment (background=true queues it as a job)"""
     try:
         # Generate QR code data
         qr_data = f"SmartHaul:SH{shipment_id:03d}"
-        qr_bytes = pdf_service.generate_qr_code(qr_data)
+        if background:
+            return await submit_job("pdf.qr_code", {"data": qr_data, "filename": f"qr_code_{shipment_id}.png"})
         
-        return StreamingResponse(
-            io.BytesIO(qr_bytes),
-            media_type="image/png",
-            headers={"Content-Disposition": f"attachment; filename=qr_code_{shipment_id}.png"}
+        return await render_response(
+            request, "generate_qr_code", (qr_data,),
+            "image/png", f"qr_code_{shipment_id}.png"
         )
+    except PDFRenderBusy as e:
+        raise render_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate QR code: {str(e)}")
+
+@router.get("/status")
+async def get_render_status():
+    """Render pool workers, queue depth and throughput, and render cache usage"""
+    return {**pdf_render_pool.status(), "cache": render_cache.status()}
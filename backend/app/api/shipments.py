@@ -1,13 +1,26 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy import func
-from typing import List, Optional
+from sqlalchemy.exc import IntegrityError
+from typing import Any, Dict, List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import json
 import math
 
 from ..models.base import get_db
-from ..models.tables import Shipment, Truck, User, Route
+from ..models.tables import Shipment, Truck, User, Route, ShipmentTemperatureCompliance
+from ..services.consolidation_service import ConsolidationService
+from ..services.bulk_service import BulkWriter
+from ..services.cold_chain_service import ShipmentMonitor, cold_chain_monitor, limits_for
+from ..services.eta_service import ACTIVE_STATUSES, eta_engine, prediction_batcher
+from ..services.simulation_service import what_if_simulator
+from ..services.change_feed import record_change, update_with_changes
+from .jobs import submit_job
+from ..core.config import settings
 
 router = APIRouter()
 
@@ -31,6 +44,9 @@ class ShipmentCreate(ShipmentBase):
     cargo_volume: float = Field(..., description="Volume in cubic feet")
 
 class ShipmentUpdate(ShipmentBase):
+    tracking_number: Optional[str] = Field(None, description="Unique tracking number")
+    origin: Optional[str] = Field(None, description="Pickup location")
+    destination: Optional[str] = Field(None, description="Delivery location")
     status: Optional[str] = Field(None, description="pending, in_transit, delivered, cancelled")
     assigned_truck_id: Optional[int] = Field(None, description="ID of assigned truck")
     assigned_driver_id: Optional[int] = Field(None, description="ID of assigned driver")
@@ -48,6 +64,7 @@ class ShipmentResponse(ShipmentBase):
     estimated_fuel_cost: Optional[float]
     created_at: datetime
     updated_at: datetime
+    version: Optional[int] = None
     
     class Config:
         from_attributes = True
@@ -66,6 +83,26 @@ class RouteOptimizationRequest(BaseModel):
     cargo_volume: float
     priority: str = "normal"
 
+class ConsolidationRequest(BaseModel):
+    shipment_ids: Optional[List[int]] = Field(None, description="Limit planning to these pending shipments")
+    max_cluster_size: int = Field(500, description="Maximum shipments considered together for one lane and time window")
+
+class WhatIfSimulationRequest(BaseModel):
+    truck_ids: List[int] = Field(..., description="Trucks hit by the disruption")
+    delay_hours: float = Field(..., description="Delay added to every active shipment on those trucks")
+    trials: int = Field(10000, description="Monte Carlo trials")
+    time_budget_seconds: float = Field(5.0, description="Return partial results after this long")
+    seed: Optional[int] = Field(None, description="Fix for reproducible draws")
+
+class ShipmentPredictionResponse(BaseModel):
+    shipment_id: int
+    predicted_delay: int = Field(..., description="Expected minutes past the delivery deadline")
+    risk_score: float = Field(..., description="Probability of arriving more than 30 minutes late")
+    eta: datetime
+    factors: Dict[str, Any]
+    model_version: str
+    cached: bool = Field(..., description="Served from the prediction cache for this shipment version")
+
 # Shipment Management Endpoints
 @router.post("/", response_model=ShipmentResponse, status_code=status.HTTP_201_CREATED)
 async def create_shipment(shipment: ShipmentCreate, db: Session = Depends(get_db)):
@@ -92,6 +129,18 @@ async def create_shipment(shipment: ShipmentCreate, db: Session = Depends(get_db
     
     return db_shipment
 
+@router.post("/bulk")
+async def bulk_create_shipments(request: Request, upsert: bool = False, db: Session = Depends(get_db)):
+    """Create (or with upsert=true, update) shipments from a JSON array or NDJSON stream
+
+    Rows are validated and written in chunks; the response carries one result per input row.
+    """
+    writer = BulkWriter(
+        db, Shipment, "tracking_number", ShipmentCreate,
+        upsert=upsert, insert_overrides={"status": "pending"}
+    )
+    return await writer.write_request(request)
+
 @router.get("/", response_model=List[ShipmentResponse])
 async def get_shipments(
     skip: int = 0, 
@@ -121,23 +170,32 @@ async def get_shipment(shipment_id: int, db: Session = Depends(get_db)):
 
 @router.put("/{shipment_id}", response_model=ShipmentResponse)
 async def update_shipment(shipment_id: int, shipment_update: ShipmentUpdate, db: Session = Depends(get_db)):
-    """Update shipment information"""
-    db_shipment = db.query(Shipment).filter(Shipment.id == shipment_id).first()
-    if not db_shipment:
+    """Update shipment information
+
+    Applies only the fields sent by the client in a single UPDATE ... RETURNING,
+    so a status flip costs one round trip instead of fetch, commit and refresh.
+    On PostgreSQL the same statement returns the previous values for the change feed.
+    """
+    update_data = shipment_update.dict(exclude_unset=True)
+    try:
+        updated, changes = update_with_changes(
+            db, Shipment, shipment_id, update_data, {"updated_at": datetime.utcnow(), "version": Shipment.version + 1}
+        )
+    except IntegrityError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid shipment update: {e.orig}"
+        )
+    if not updated:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Shipment with ID {shipment_id} not found"
         )
     
-    # Update fields
-    update_data = shipment_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_shipment, field, value)
-    
-    db_shipment.updated_at = datetime.utcnow()
+    record_change(db, "shipments", "update", updated, changes)
     db.commit()
-    db.refresh(db_shipment)
-    return db_shipment
+    return updated
 
 @router.delete("/{shipment_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_shipment(shipment_id: int, db: Session = Depends(get_db)):
@@ -156,18 +214,37 @@ async def delete_shipment(shipment_id: int, db: Session = Depends(get_db)):
 # Truck Assignment Endpoints
 @router.post("/assign", response_model=ShipmentResponse)
 async def assign_shipment_to_truck(assignment: TruckAssignmentRequest, db: Session = Depends(get_db)):
-    """Assign a shipment to a truck"""
+    """Assign a shipment to a truck
+
+    Rows are locked with FOR UPDATE SKIP LOCKED where the database supports it, so a
+    second dispatcher gets an immediate 409 instead of queueing behind the first.
+    SQLite ignores the lock clause and relies on the version check at commit instead.
+    """
     # Verify shipment exists
-    shipment = db.query(Shipment).filter(Shipment.id == assignment.shipment_id).first()
+    shipment = db.query(Shipment).filter(
+        Shipment.id == assignment.shipment_id
+    ).with_for_update(skip_locked=True).first()
     if not shipment:
+        if db.query(Shipment.id).filter(Shipment.id == assignment.shipment_id).first():
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Shipment with ID {assignment.shipment_id} is being updated by another request"
+            )
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Shipment with ID {assignment.shipment_id} not found"
         )
     
     # Verify truck exists and is available
-    truck = db.query(Truck).filter(Truck.id == assignment.truck_id).first()
+    truck = db.query(Truck).filter(
+        Truck.id == assignment.truck_id
+    ).with_for_update(skip_locked=True).first()
     if not truck:
+        if db.query(Truck.id).filter(Truck.id == assignment.truck_id).first():
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Truck with ID {assignment.truck_id} is being assigned by another request"
+            )
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Truck with ID {assignment.truck_id} not found"
@@ -202,7 +279,14 @@ async def assign_shipment_to_truck(assignment: TruckAssignmentRequest, db: Sessi
     truck.status = "in_use"
     truck.updated_at = datetime.utcnow()
     
-    db.commit()
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Truck {assignment.truck_id} or shipment {assignment.shipment_id} was modified concurrently, retry the assignment"
+        )
     db.refresh(shipment)
     return shipment
 
@@ -285,6 +369,24 @@ async def optimize_route(request: RouteOptimizationRequest, db: Session = Depend
         "route_suggestions": route_suggestions[:5]  # Top 5 suggestions
     }
 
+# Load Consolidation Endpoints
+@router.post("/consolidation-plan")
+async def get_consolidation_plan(request: ConsolidationRequest, db: Session = Depends(get_db)):
+    """Suggest consolidated truck loads for pending partial-truckload shipments"""
+    shipment_query = db.query(
+        Shipment.id, Shipment.origin, Shipment.destination, Shipment.cargo_type,
+        Shipment.cargo_weight, Shipment.cargo_volume, Shipment.pickup_time, Shipment.delivery_deadline
+    ).filter(Shipment.status == "pending")
+    if request.shipment_ids:
+        shipment_query = shipment_query.filter(Shipment.id.in_(request.shipment_ids))
+
+    trucks = db.query(
+        Truck.id, Truck.plate_number, Truck.capacity_weight, Truck.capacity_volume
+    ).filter(Truck.status == "available").all()
+
+    service = ConsolidationService(max_cluster_size=request.max_cluster_size)
+    return service.plan(shipment_query.all(), trucks)
+
 # Shipment Analytics Endpoints
 @router.get("/analytics/overview")
 async def get_shipment_overview(db: Session = Depends(get_db)):
@@ -322,3 +424,103 @@ async def get_shipment_overview(db: Session = Depends(get_db)):
         "avg_delivery_time_hours": round(avg_delivery_time, 2),
         "completion_rate": round((delivered_shipments / total_shipments * 100), 2) if total_shipments > 0 else 0
     }
+
+@router.get("/analytics/temperature-compliance")
+async def get_temperature_compliance():
+    """Cold-chain compliance: % of monitored time within cargo temperature limits, overall and per cargo type.
+
+    Served from incrementally maintained aggregates; open excursions are listed with their current state.
+    """
+    return cold_chain_monitor.summary()
+
+@router.get("/analytics/prediction-model")
+async def get_prediction_model():
+    """Current delay model version, training metrics and the last scoring run"""
+    return eta_engine.info()
+
+@router.post("/analytics/predictions/refresh")
+async def refresh_predictions(retrain: bool = False, background: bool = False):
+    """Score all active shipments now (optionally retraining first) instead of waiting for the schedule.
+
+    With background=true the run is queued as a job and answered with 202 and its status URL.
+    """
+    if background:
+        return await submit_job("predictions.refresh", {"retrain": retrain})
+    return await run_in_threadpool(eta_engine.run_once, retrain)
+
+@router.post("/analytics/what-if")
+async def simulate_what_if(request: WhatIfSimulationRequest, stream: bool = False, db: Session = Depends(get_db)):
+    """Monte Carlo on-time rate and at-risk shipments if the given trucks are delayed.
+
+    Baseline and scenario share the same draws from historical transit timing. With stream=true,
+    progressively refined results are sent as newline-delimited JSON; the last line is final.
+    """
+    if not 1 <= request.trials <= settings.simulation_max_trials:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"trials must be between 1 and {settings.simulation_max_trials}"
+        )
+    if not 0 < request.time_budget_seconds <= settings.simulation_max_seconds:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"time_budget_seconds must be between 0 and {settings.simulation_max_seconds}"
+        )
+    truck_ids = set(request.truck_ids)
+    found = {row[0] for row in db.query(Truck.id).filter(Truck.id.in_(truck_ids)).all()}
+    if truck_ids - found:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Trucks not found: {', '.join(str(t) for t in sorted(truck_ids - found))}"
+        )
+
+    results = what_if_simulator.simulate(
+        sorted(truck_ids), request.delay_hours, request.trials, request.time_budget_seconds, request.seed
+    )
+    if stream:
+        async def lines():
+            async for snapshot in results:
+                yield json.dumps(snapshot) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    async for snapshot in results:
+        final = snapshot
+    return final
+
+@router.get("/{shipment_id}/temperature-compliance")
+async def get_shipment_temperature_compliance(shipment_id: int, db: Session = Depends(get_db)):
+    """Temperature compliance and excursion history totals for one refrigerated shipment"""
+    view = cold_chain_monitor.shipment_view(shipment_id)
+    if view:
+        return view
+    shipment = db.query(Shipment).filter(Shipment.id == shipment_id).first()
+    if not shipment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Shipment with ID {shipment_id} not found"
+        )
+    if not limits_for(shipment.cargo_type):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cargo type '{shipment.cargo_type}' has no temperature requirements"
+        )
+    row = db.query(ShipmentTemperatureCompliance).filter(
+        ShipmentTemperatureCompliance.shipment_id == shipment_id
+    ).first()
+    return ShipmentMonitor(shipment_id, shipment.assigned_truck_id, shipment.cargo_type, row).view()
+
+@router.get("/{shipment_id}/prediction", response_model=ShipmentPredictionResponse)
+async def get_shipment_prediction(shipment_id: int):
+    """Fresh delay prediction and risk score for one active shipment.
+
+    Concurrent requests are micro-batched into one model call and cached until the shipment changes.
+    """
+    shipment, prediction = await prediction_batcher.predict(shipment_id)
+    if shipment is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Shipment with ID {shipment_id} not found"
+        )
+    if prediction is None:
+        detail = (f"Shipment is {shipment.status}; predictions are made for {', '.join(ACTIVE_STATUSES)} shipments"
+                  if shipment.status not in ACTIVE_STATUSES else "Shipment has no delivery deadline to predict against")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+    return prediction
@@ -0,0 +1,120 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+import json
+
+from ..models.base import get_db
+from ..models.tables import Truck
+from ..services.telemetry_service import DEAD_LETTER_LIMIT, BufferFullError, telemetry_pipeline, utc_now
+from ..services.timeseries_service import LEVELS, telemetry_store
+
+router = APIRouter()
+
+# Pydantic Models for API
+class TelemetrySampleIn(BaseModel):
+    truck_id: int = Field(..., description="Truck ID")
+    lat: Optional[float] = Field(None, description="Latitude")
+    lng: Optional[float] = Field(None, description="Longitude")
+    temperature: Optional[float] = Field(None, description="Cargo temperature")
+    recorded_at: Optional[datetime] = Field(None, description="Device timestamp; defaults to receipt time")
+
+class TelemetryBatch(BaseModel):
+    samples: List[TelemetrySampleIn]
+
+def _as_tuples(samples: List[TelemetrySampleIn]):
+    received_at = utc_now()
+    return [
+        (s.truck_id, _as_utc(s.recorded_at) if s.recorded_at else received_at, s.lat, s.lng, s.temperature)
+        for s in samples
+    ]
+
+def _as_utc(recorded_at: datetime) -> datetime:
+    """Device timestamps without an offset are taken as UTC"""
+    if recorded_at.tzinfo is None:
+        return recorded_at.replace(tzinfo=timezone.utc)
+    return recorded_at
+
+@router.post("/batch", status_code=status.HTTP_202_ACCEPTED)
+async def ingest_telemetry_batch(batch: TelemetryBatch):
+    """Accept a batch of position/temperature samples for buffered bulk writing"""
+    try:
+        accepted = telemetry_pipeline.ingest(_as_tuples(batch.samples))
+    except BufferFullError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return {"accepted": accepted, "buffered": telemetry_pipeline.buffered}
+
+@router.websocket("/ws")
+async def telemetry_stream(websocket: WebSocket):
+    """Streaming ingest: each frame is one sample object or an array of samples"""
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                payload = json.loads(message)
+                items = payload if isinstance(payload, list) else [payload]
+                samples = [TelemetrySampleIn(**item) for item in items]
+                accepted = telemetry_pipeline.ingest(_as_tuples(samples))
+                await websocket.send_text(json.dumps({"accepted": accepted}))
+            except BufferFullError as e:
+                await websocket.send_text(json.dumps({"accepted": 0, "error": str(e), "retry": True}))
+            except (ValueError, TypeError, ValidationError) as e:
+                await websocket.send_text(json.dumps({"accepted": 0, "error": f"Invalid telemetry frame: {e}"}))
+    except WebSocketDisconnect:
+        pass
+
+@router.get("/status")
+async def get_telemetry_status():
+    """Get ingest buffer and flush statistics"""
+    return {
+        "buffered_samples": telemetry_pipeline.buffered,
+        "trucks_pending": len(telemetry_pipeline.latest),
+        "flush_interval": telemetry_pipeline.flush_interval,
+        **telemetry_pipeline.stats,
+    }
+
+@router.get("/dead-letters")
+async def get_telemetry_dead_letters(limit: int = Query(100, ge=1, le=DEAD_LETTER_LIMIT)):
+    """Most recent samples the database rejected (e.g. constraint violations); they are not retried"""
+    dead_letters = list(telemetry_pipeline.dead_letters)
+    return {
+        "dead_letters": dead_letters[-limit:][::-1],
+        "total": telemetry_pipeline.stats["samples_dead_lettered"],
+    }
+
+@router.get("/trucks/{truck_id}/track")
+async def get_truck_track(
+    truck_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = "auto",
+    db: Session = Depends(get_db)
+):
+    """Position/temperature history for one truck as parallel arrays (t is epoch seconds).
+
+    resolution: raw, 1m, 1h, or auto to pick by window length and retention.
+    Defaults to the last hour.
+    """
+    if resolution != "auto" and resolution not in LEVELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid resolution '{resolution}'. Use auto, {', '.join(LEVELS)}"
+        )
+    end = end or utc_now()
+    start = start or end - timedelta(hours=1)
+    # Naive timestamps are taken as UTC
+    start, end = (value if value.tzinfo else value.replace(tzinfo=timezone.utc) for value in (start, end))
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end"
+        )
+    if not db.query(Truck.id).filter(Truck.id == truck_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Truck with ID {truck_id} not found"
+        )
+    return await run_in_threadpool(telemetry_store.track, truck_id, start.timestamp(), end.timestamp(), resolution)
@@ -24,6 +24,68 @@ class Settings(BaseSettings):
     upload_dir: str = "./uploads"
     max_file_size: int = 10485760  # 10MB
     
+    # Telemetry ingestion
+    telemetry_flush_interval: float = 1.0  # Seconds between bulk writes
+    telemetry_max_buffered: int = 500000  # Samples held in memory before ingest returns 503
+    
+    # Telemetry history
+    telemetry_storage: str = "database"  # "database" (daily partitions on PostgreSQL) or "files" for local mode
+    telemetry_data_dir: str = "./data/telemetry"  # Columnar file store root when telemetry_storage = "files"
+    telemetry_raw_retention_days: int = 7
+    telemetry_minute_retention_days: int = 90
+    telemetry_hour_retention_days: int = 730
+    telemetry_rollup_interval: float = 60.0  # Seconds between downsampling/retention runs
+    
+    # Delay prediction
+    model_dir: str = "./models"  # Trained model artifacts
+    prediction_interval: float = 300.0  # Seconds between batch scoring runs
+    model_retrain_interval: float = 86400.0
+    feature_refresh_interval: float = 60.0  # Seconds between feature store catch-ups on delivered shipments
+    prediction_batch_window_ms: float = 5.0  # On-demand predictions wait this long to share one model call
+    prediction_cache_ttl: int = 60
+    
+    # Notification WebSockets
+    ws_send_queue_size: int = 256  # Messages buffered per client before the slow-client policy applies
+    ws_send_timeout: float = 10.0  # A send blocked this long evicts the client
+    ws_slow_client_policy: str = "coalesce"  # coalesce, drop_oldest, disconnect
+    ws_batch_window_ms: float = 5.0  # Notifications published within this window share one frame per client and one log INSERT; 0 disables
+    sse_heartbeat_interval: float = 15.0  # Seconds between keepalive comments on idle /stream connections
+    notification_bus: str = "local"  # local (single worker), socket, redis or postgres
+    notification_bus_url: str = ""  # Redis URL or PostgreSQL DSN; defaults to redis://localhost:6379 / database_url
+    notification_bus_channel: str = "smarthaul_notifications"
+    notification_socket_dir: str = "./run/notification-bus"  # Shared by all workers when notification_bus = "socket"
+    change_feed: str = "orm"  # Shipment/truck/delivery event changes as notifications: off, orm (hooks) or postgres (triggers)
+    notification_history_size: int = 1000  # Recent notifications kept in memory for /history and resume
+    notification_retention_days: int = 30  # Log table retention
+    
+    # Outbound webhooks (shipment/truck events pushed to n8n instead of polled)
+    webhooks_enabled: bool = False
+    webhook_urls: List[str] = []  # Destinations; empty means n8n_webhook_url
+    webhook_event_types: List[str] = ["shipment_update", "truck_update", "delivery_event", "temperature_excursion"]
+    webhook_batch_size: int = 100  # Events per POST to one destination
+    webhook_max_attempts: int = 8  # Failed deliveries after which an event becomes a dead letter
+    webhook_retry_base: float = 2.0  # Seconds; backoff doubles per attempt, with jitter
+    webhook_retry_max: float = 600.0
+    webhook_timeout: float = 10.0
+    
+    # PDF rendering
+    pdf_render_workers: int = 0  # Render processes per API process; 0 = one per CPU
+    pdf_render_queue: int = 32  # Renders queued or running per API process before requests get 503
+    render_cache_max_mb: int = 256  # Disk cache of rendered PDFs/QR codes under upload_dir; 0 disables
+    
+    # Background jobs
+    job_workers: int = 1  # Worker processes each API process starts; 0 = run `python -m app.services.job_queue` separately
+    job_poll_interval: float = 0.25  # Seconds an idle worker waits before checking for jobs again
+    job_lease_seconds: float = 600.0  # A running job whose worker disappeared is retried after this (renewed while it runs)
+    job_max_attempts: int = 3
+    job_retry_base: float = 5.0  # Seconds before the first retry; doubles per attempt, with jitter
+    job_retention_days: int = 7  # Finished jobs and their stored results
+    
+    # What-if simulation
+    simulation_workers: int = 0  # Monte Carlo worker processes; 0 = one per CPU
+    simulation_max_trials: int = 200000
+    simulation_max_seconds: float = 30.0
+    
     # Logging
     log_level: str = "INFO"
     log_file: str = "./logs/smarthaul.log"
@@ -6,7 +6,22 @@ from .core.config import settings
 from .core.performance import PerformanceMiddleware
 from .models.base import get_db
 from .models.tables import Shipment, DeliveryEvent, Truck, User, Document, Prediction
-from .api import performance, notifications, fleet, shipments, pdf
+from .api import performance, notifications, fleet, shipments, pdf, telemetry, geofences, jobs
+from .services.maintenance_service import maintenance_engine
+from .services.telemetry_service import telemetry_pipeline
+from .services.timeseries_service import telemetry_store
+from .services.cold_chain_service import cold_chain_monitor
+from .services.geofence_service import geofence_engine
+from .services.feature_store import feature_store
+from .services.eta_service import eta_engine
+from .services.simulation_service import what_if_simulator
+from .services.notification_bus import notification_bus
+from .services.notification_log import notification_log
+from .services.change_feed import change_feed
+from .services.webhook_service import webhook_dispatcher
+from .services.job_queue import job_queue
+from .services.pdf_render_pool import pdf_render_pool
+import asyncio
 
 app = FastAPI(
     title="SmartHaul API",
@@ -43,6 +58,56 @@ app.include_router(shipments.router, prefix="/api/shipments", tags=["shipments"]
 # Include PDF generation routes
 app.include_router(pdf.router)
 
+# Include telemetry ingestion routes
+app.include_router(telemetry.router, prefix="/api/telemetry", tags=["telemetry"])
+
+# Include geofence routes
+app.include_router(geofences.router, prefix="/api/geofences", tags=["geofences"])
+
+# Include background job routes
+app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
+
+@app.on_event("startup")
+async def start_background_jobs():
+    # Notifications published on any worker reach WebSocket clients on every worker
+    await notification_bus.start()
+    # Recent notification history for /history and WebSocket resume; log retention
+    asyncio.create_task(notification_log.run())
+    # Shipment, truck and delivery event changes pushed as notifications after commit
+    await change_feed.start()
+    # Durable, batched delivery of shipment/truck events to outbound webhooks (n8n)
+    asyncio.create_task(webhook_dispatcher.run())
+    # Keep the fleet maintenance risk cache warm
+    asyncio.create_task(maintenance_engine.run_schedule())
+    # Periodic bulk writes of buffered truck telemetry
+    asyncio.create_task(telemetry_pipeline.run())
+    # Telemetry partitions, raw -> 1m -> 1h downsampling and retention
+    asyncio.create_task(telemetry_store.run(settings.telemetry_rollup_interval))
+    # Cold-chain compliance evaluates every flushed telemetry batch
+    telemetry_pipeline.add_listener(cold_chain_monitor.on_samples)
+    asyncio.create_task(cold_chain_monitor.run())
+    # Geofence enter/exit detection writes pickup/arrival delivery events
+    telemetry_pipeline.add_listener(geofence_engine.on_samples)
+    asyncio.create_task(geofence_engine.run())
+    # Route/driver/time-of-week delivery aggregates, caught up as shipments complete
+    asyncio.create_task(feature_store.run(settings.feature_refresh_interval))
+    # Batch delay predictions and ETA updates for active shipments
+    asyncio.create_task(eta_engine.run())
+    # Worker processes for queued PDF, prediction and report jobs
+    asyncio.create_task(job_queue.run())
+    # Warm process pool so PDF renders never run on the event loop
+    asyncio.create_task(pdf_render_pool.start())
+
+@app.on_event("shutdown")
+async def flush_buffers():
+    await telemetry_pipeline.flush()
+    what_if_simulator.shutdown()
+    job_queue.stop()
+    pdf_render_pool.shutdown()
+    await change_feed.stop()
+    await webhook_dispatcher.stop()
+    await notification_bus.stop()
+
 @app.get("/")
 async def root():
     return {"message": "SmartHaul API is running!"}
@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine, MetaData
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from ..core.config import settings
@@ -20,6 +21,15 @@ Base = declarative_base()
 # Metadata for migrations
 metadata = MetaData()
 
+def upsert_insert(bind, table):
+    """INSERT supporting on_conflict_do_nothing/on_conflict_do_update on PostgreSQL and SQLite"""
+    dialect = bind.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Upserts are not supported on {dialect}")
+
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
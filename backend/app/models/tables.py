@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, JSON, ForeignKey, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .base import Base
@@ -18,6 +18,10 @@ class User(Base):
 
 class Shipment(Base):
     __tablename__ = "shipments"
+    # Incremental scans of recently changed shipments (feature store, delivery analytics)
+    __table_args__ = (
+        Index("ix_shipments_status_updated_at", "status", "updated_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     tracking_number = Column(String(100), unique=True, index=True, nullable=False)
@@ -39,6 +43,10 @@ class Shipment(Base):
     eta = Column(DateTime(timezone=True), nullable=True)
     actual_delivery_time = Column(DateTime(timezone=True), nullable=True)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Optimistic concurrency counter
+    
+    # Every ORM UPDATE checks and bumps the version, so concurrent writers cannot silently overwrite each other
+    __mapper_args__ = {"version_id_col": version}
     
     # Relationships
     assigned_truck = relationship("Truck", back_populates="assigned_shipments")
@@ -63,13 +71,16 @@ class Truck(Base):
     current_lat = Column(Float, nullable=True)
     current_lng = Column(Float, nullable=True)
     driver_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    status = Column(String(50), nullable=False, default="available")  # available, in_use, maintenance, out_of_service
+    status = Column(String(50), nullable=False, default="available", index=True)  # available, in_use, maintenance, out_of_service
     temperature = Column(Float, nullable=True)  # For temperature monitoring
     last_maintenance = Column(DateTime(timezone=True), nullable=True)
     next_maintenance = Column(DateTime(timezone=True), nullable=True)
     total_miles = Column(Float, nullable=True, default=0.0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Optimistic concurrency counter
+    
+    __mapper_args__ = {"version_id_col": version}
     
     # Relationships
     driver = relationship("User", back_populates="trucks")
@@ -107,12 +118,17 @@ class DeliveryEvent(Base):
 
 class Prediction(Base):
     __tablename__ = "predictions"
+    # One current prediction per shipment, upserted by the ETA engine
+    __table_args__ = (
+        Index("uq_predictions_shipment_id", "shipment_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     shipment_id = Column(Integer, ForeignKey("shipments.id"), nullable=False)
     predicted_delay = Column(Integer, nullable=True)  # Delay in minutes
     risk_score = Column(Float, nullable=True)  # 0.0 to 1.0
     factors = Column(JSON, nullable=True)  # Factors contributing to prediction
+    model_version = Column(String(50), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -168,4 +184,139 @@ class Route(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
-    shipments = relationship("Shipment", back_populates="route") 
\ No newline at end of file
+    shipments = relationship("Shipment", back_populates="route") 
+
+class TelemetrySample(Base):
+    """Append-only position/temperature history; the latest value also lives on Truck"""
+    __tablename__ = "truck_telemetry"  # Range-partitioned by day on PostgreSQL
+    __table_args__ = (
+        Index("ix_truck_telemetry_recorded_at_brin", "recorded_at", postgresql_using="brin"),
+    )
+    
+    truck_id = Column(Integer, primary_key=True)  # No FK: keeps bulk COPY ingest cheap
+    recorded_at = Column(DateTime(timezone=True), primary_key=True)
+    lat = Column(Float, nullable=True)
+    lng = Column(Float, nullable=True)
+    temperature = Column(Float, nullable=True)
+
+class TelemetryMinuteRollup(Base):
+    """Per-minute downsample of truck_telemetry: last position and temperature stats"""
+    __tablename__ = "truck_telemetry_1m"  # Range-partitioned by day on PostgreSQL
+    __table_args__ = (
+        Index("ix_truck_telemetry_1m_recorded_at_brin", "recorded_at", postgresql_using="brin"),
+    )
+    
+    truck_id = Column(Integer, primary_key=True)
+    recorded_at = Column(DateTime(timezone=True), primary_key=True)  # Bucket start
+    lat = Column(Float, nullable=True)
+    lng = Column(Float, nullable=True)
+    temperature = Column(Float, nullable=True)  # Mean over the bucket
+    temperature_min = Column(Float, nullable=True)
+    temperature_max = Column(Float, nullable=True)
+    samples = Column(Integer, nullable=False, default=0)
+
+class TelemetryHourRollup(Base):
+    """Per-hour downsample built from truck_telemetry_1m"""
+    __tablename__ = "truck_telemetry_1h"
+    __table_args__ = (
+        Index("ix_truck_telemetry_1h_recorded_at_brin", "recorded_at", postgresql_using="brin"),
+    )
+    
+    truck_id = Column(Integer, primary_key=True)
+    recorded_at = Column(DateTime(timezone=True), primary_key=True)  # Bucket start
+    lat = Column(Float, nullable=True)
+    lng = Column(Float, nullable=True)
+    temperature = Column(Float, nullable=True)
+    temperature_min = Column(Float, nullable=True)
+    temperature_max = Column(Float, nullable=True)
+    samples = Column(Integer, nullable=False, default=0)
+
+class ShipmentTemperatureCompliance(Base):
+    """Running cold-chain aggregates per shipment, updated incrementally from telemetry"""
+    __tablename__ = "shipment_temperature_compliance"
+    
+    shipment_id = Column(Integer, ForeignKey("shipments.id"), primary_key=True)
+    truck_id = Column(Integer, ForeignKey("trucks.id"), nullable=True)
+    cargo_type = Column(String(100), nullable=True)
+    min_temperature = Column(Float, nullable=True)  # Limits applied, degrees Celsius
+    max_temperature = Column(Float, nullable=True)
+    monitored_seconds = Column(Float, nullable=False, default=0.0)
+    in_range_seconds = Column(Float, nullable=False, default=0.0)
+    excursion_count = Column(Integer, nullable=False, default=0)
+    excursion_seconds = Column(Float, nullable=False, default=0.0)
+    peak_deviation = Column(Float, nullable=False, default=0.0)  # Furthest reading outside the limits
+    in_excursion = Column(Boolean, nullable=False, default=False)
+    last_reading_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class Geofence(Base):
+    """Circle or polygon around an origin, destination or depot, matched against truck telemetry"""
+    __tablename__ = "geofences"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), nullable=False)
+    kind = Column(String(20), nullable=False)  # origin, destination, depot
+    shape = Column(String(20), nullable=False, default="circle")  # circle, polygon
+    center_lat = Column(Float, nullable=True)  # circle
+    center_lng = Column(Float, nullable=True)
+    radius_m = Column(Float, nullable=True)
+    polygon = Column(JSON, nullable=True)  # [[lat, lng], ...] for polygons
+    location = Column(String(255), nullable=True)  # Matches Shipment.origin/destination when not bound to a shipment
+    shipment_id = Column(Integer, ForeignKey("shipments.id"), nullable=True, index=True)  # Fence for one shipment only
+    active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class NotificationLogEntry(Base):
+    """Append-only notification log; id is the sequence number clients resume from"""
+    __tablename__ = "notification_log"
+    
+    id = Column(Integer, primary_key=True)
+    type = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+class WebhookDelivery(Base):
+    """Outbound webhook queue: one row per event per destination until delivered; failed rows stay as dead letters"""
+    __tablename__ = "webhook_deliveries"
+    
+    id = Column(Integer, primary_key=True)
+    destination = Column(String(500), nullable=False)
+    event_type = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, dead
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False)
+    claim = Column(String(36), nullable=True)  # Delivery pass currently holding the row
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_webhook_deliveries_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+class Job(Base):
+    """Background job queue; finished rows keep their result until pruned"""
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    priority = Column(Integer, nullable=False, default=0)  # Higher runs first
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, succeeded, failed, cancelled
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_at = Column(DateTime(timezone=True), nullable=False)  # Not before; pushed back between retries
+    locked_by = Column(String(100), nullable=True)
+    lease_until = Column(DateTime(timezone=True), nullable=True)
+    result = Column(JSON, nullable=True)
+    result_data = Column(LargeBinary, nullable=True)  # File results (PDFs, images)
+    result_type = Column(String(100), nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    
+    __table_args__ = (
+        Index("ix_jobs_dequeue", "status", "priority", "run_at"),
+        Index("ix_jobs_finished_at", "finished_at"),
+    )
@@ -0,0 +1,210 @@
+"""
+Bulk import helpers for EDI-sized batches of shipments and trucks.
+Parses JSON arrays or NDJSON streams in chunks and writes each chunk with
+one lookup query, one multi-row INSERT ... ON CONFLICT DO NOTHING and
+grouped executemany UPDATEs, so keys created concurrently are reported
+as conflicts (or updated) instead of failing the request.
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Type
+
+from fastapi import HTTPException, Request, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import bindparam, func, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models.base import upsert_insert
+
+DEFAULT_CHUNK_SIZE = 1000
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+
+
+class InvalidLine:
+    """Placeholder for an NDJSON line that could not be decoded"""
+
+    def __init__(self, error: str):
+        self.error = error
+
+
+async def iter_payload_chunks(request: Request, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[List[Any]]:
+    """Yield the request payload in chunks of raw row dicts.
+
+    NDJSON bodies are consumed incrementally so the whole upload never sits in memory twice.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_CONTENT_TYPES:
+        chunk: List[Any] = []
+        buffer = b""
+        async for data in request.stream():
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    chunk.append(_decode_line(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if buffer.strip():
+            chunk.append(_decode_line(buffer))
+        if chunk:
+            yield chunk
+        return
+
+    try:
+        payload = json.loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid JSON body: {e}")
+    if not isinstance(payload, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Bulk endpoints expect a JSON array or an NDJSON stream"
+        )
+    for offset in range(0, len(payload), chunk_size):
+        yield payload[offset:offset + chunk_size]
+
+
+def _decode_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return InvalidLine(f"Invalid JSON line: {e}")
+
+
+class BulkWriter:
+    """Validates and writes chunks of rows for one model keyed by a unique column"""
+
+    def __init__(
+        self,
+        db: Session,
+        model: Type[Any],
+        key_field: str,
+        schema: Type[BaseModel],
+        upsert: bool = False,
+        insert_overrides: Optional[Dict[str, Any]] = None,
+    ):
+        self.db = db
+        self.table = model.__table__
+        self.key_field = key_field
+        self.key_column = self.table.c[key_field]
+        self.schema = schema
+        self.upsert = upsert
+        self.insert_overrides = insert_overrides or {}
+        self.seen: Set[Any] = set()
+        self.index = 0
+        self.counts = {"created": 0, "updated": 0, "errors": 0}
+
+    def write_chunk(self, items: List[Any]) -> List[Dict[str, Any]]:
+        """Validate, dedupe and persist one chunk; returns a result per input row"""
+        results: List[Dict[str, Any]] = []
+        pending: List[tuple] = []
+
+        for item in items:
+            index = self.index
+            self.index += 1
+            if isinstance(item, InvalidLine):
+                results.append(self._error(index, item.error))
+                continue
+            if not isinstance(item, dict):
+                results.append(self._error(index, "Row must be a JSON object"))
+                continue
+            try:
+                row = self.schema(**item)
+            except ValidationError as e:
+                results.append(self._error(index, e.errors(include_url=False, include_input=False, include_context=False)))
+                continue
+            key = getattr(row, self.key_field)
+            if key in self.seen:
+                results.append(self._error(index, f"Duplicate {self.key_field} {key} in this batch"))
+                continue
+            self.seen.add(key)
+            pending.append((index, key, row))
+
+        if not pending:
+            return results
+
+        try:
+            written = self._write_pending(pending)
+        except IntegrityError as e:
+            # Some other constraint failed: nothing in this chunk was written, report it per row
+            self.db.rollback()
+            error = f"Chunk rolled back: {e.orig}"
+            written = [self._error_result(index, error) for index, _, _ in pending]
+        for result in written:
+            self.counts["errors" if result["status"] == "error" else result["status"]] += 1
+        results.extend(written)
+        results.sort(key=lambda result: result["index"])
+        return results
+
+    def _write_pending(self, pending: List[tuple]) -> List[Dict[str, Any]]:
+        """INSERT new keys (ON CONFLICT DO NOTHING), then update or reject existing ones; commits"""
+        if self.db.get_bind().dialect.name == "postgresql":
+            # Keep bulk imports out of the change feed triggers (one notification per row)
+            self.db.execute(text("SELECT set_config('smarthaul.change_feed', 'off', true)"))
+        existing = self._existing_ids([key for _, key, _ in pending])
+
+        results: List[Dict[str, Any]] = []
+        inserts = [(index, key, row) for index, key, row in pending if key not in existing]
+        conflicts = [(index, key, row) for index, key, row in pending if key in existing]
+        if inserts:
+            statement = upsert_insert(self.db.connection(), self.table).on_conflict_do_nothing(
+                index_elements=[self.key_field]
+            )
+            created = dict(self.db.execute(
+                statement.returning(self.key_column, self.table.c.id),
+                [{**row.model_dump(), **self.insert_overrides} for _, _, row in inserts],
+            ).all())
+            for index, key, row in inserts:
+                if key in created:
+                    results.append({"index": index, "status": "created", "id": created[key], self.key_field: key})
+                else:
+                    conflicts.append((index, key, row))  # Inserted by a concurrent request since the lookup
+            if len(created) < len(inserts):
+                existing.update(self._existing_ids([key for _, key, _ in conflicts if key not in existing]))
+
+        updates: Dict[frozenset, List[Dict[str, Any]]] = {}
+        for index, key, row in conflicts:
+            if self.upsert:
+                values = row.model_dump(exclude_unset=True)
+                values.pop(self.key_field, None)
+                updates.setdefault(frozenset(values), []).append(
+                    {"_pk": existing[key], **{f"_{column}": value for column, value in values.items()}}
+                )
+                results.append({"index": index, "status": "updated", "id": existing[key], self.key_field: key})
+            else:
+                results.append(self._error_result(index, f"{self.key_field} {key} already exists", existing[key]))
+
+        for columns, rows in updates.items():
+            values = {column: bindparam(f"_{column}") for column in columns}
+            values.update(version=self.table.c.version + 1, updated_at=func.now())
+            statement = update(self.table).where(self.table.c.id == bindparam("_pk")).values(values)
+            self.db.execute(statement, rows)
+
+        self.db.commit()
+        return results
+
+    def _existing_ids(self, keys: List[Any]) -> Dict[Any, int]:
+        if not keys:
+            return {}
+        return dict(self.db.execute(
+            self.table.select().with_only_columns(self.key_column, self.table.c.id).where(self.key_column.in_(keys))
+        ).all())
+
+    def _error(self, index: int, error: Any, row_id: Optional[int] = None) -> Dict[str, Any]:
+        self.counts["errors"] += 1
+        return self._error_result(index, error, row_id)
+
+    @staticmethod
+    def _error_result(index: int, error: Any, row_id: Optional[int] = None) -> Dict[str, Any]:
+        result = {"index": index, "status": "error", "error": error}
+        if row_id is not None:
+            result["id"] = row_id
+        return result
+
+    async def write_request(self, request: Request, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+        """Stream a bulk request through write_chunk and summarise the outcome"""
+        results: List[Dict[str, Any]] = []
+        async for chunk in iter_payload_chunks(request, chunk_size):
+            results.extend(self.write_chunk(chunk))
+        return {**self.counts, "total": self.index, "results": results}
@@ -0,0 +1,277 @@
+"""
+Change-data-capture feed for shipments, trucks and delivery events.
+Row-level diffs of the watched columns become notifications (published
+through broadcast_notification, so they are logged, sent to every worker
+over the bus and routed by subscription) as soon as the writing
+transaction commits, replacing polling of the database.
+
+Two sources:
+- "orm" (default): Session after_flush/after_commit hooks pick up ORM
+  writes; Core UPDATE ... RETURNING paths (update_with_changes) call
+  record_change() themselves.
+- "postgres": AFTER triggers (see the change_feed_v1 migration) NOTIFY on
+  every write including ones from outside the app; one worker, holding an
+  advisory lock, LISTENs and publishes.
+"""
+
+import asyncio
+import json
+import logging
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.tables import DeliveryEvent, Shipment, Truck
+
+try:
+    import psycopg
+    PSYCOPG_AVAILABLE = True
+except ImportError:
+    PSYCOPG_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_MODES = ("off", "orm", "postgres")
+CHANGES_CHANNEL = "smarthaul_changes"  # Must match the change_feed_v1 trigger function
+LISTENER_LOCK_KEY = 72_110_046  # pg advisory lock held by the worker that LISTENs
+STANDBY_SECONDS = 5.0
+
+# Table -> columns whose changes are published; the trigger migration mirrors this
+WATCHED_COLUMNS = {
+    "shipments": (
+        "status", "priority", "assigned_truck_id", "assigned_driver_id",
+        "pickup_time", "delivery_deadline", "actual_delivery_time",
+    ),
+    "trucks": ("status", "driver_id", "last_maintenance", "next_maintenance"),
+    "delivery_events": ("shipment_id", "event_type", "location", "timestamp"),
+}
+MODELS = {Shipment: "shipments", Truck: "trucks", DeliveryEvent: "delivery_events"}
+NOTIFICATION_TYPES = {"shipments": "shipment_update", "trucks": "truck_update", "delivery_events": "delivery_event"}
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def change_notification(table: str, op: str, row: Mapping[str, Any], changes: Dict[str, list]) -> Dict[str, Any]:
+    """Notification for one row change; `changes` maps column -> [old, new] (old is None when unknown)"""
+    row_id = row.get("id")
+    changes = {column: [_json_value(old), _json_value(new)] for column, (old, new) in changes.items()}
+    notification = {
+        "type": NOTIFICATION_TYPES[table],
+        "operation": op,
+        "table": table,
+        "row_id": row_id,
+        "changes": changes,
+        "timestamp": datetime.now().isoformat(),
+        "severity": "info",
+    }
+    if table == "delivery_events":
+        notification["shipment_id"] = row.get("shipment_id")
+        notification["message"] = (f"{row.get('event_type') or 'Delivery event'} recorded for "
+                                   f"shipment {row.get('shipment_id')}")
+        return notification
+    if table == "shipments":
+        notification["shipment_id"] = row_id
+        notification["truck_id"] = row.get("assigned_truck_id")
+        label = "Shipment"
+    else:
+        notification["truck_id"] = row_id
+        label = "Truck"
+    if op == "delete":
+        notification["message"] = f"{label} {row_id} deleted"
+    elif op == "insert":
+        notification["message"] = f"{label} {row_id} created"
+    elif "status" in changes:
+        notification["message"] = f"{label} {row_id} is now {changes['status'][1]}"
+    else:
+        notification["message"] = f"{label} {row_id} updated: {', '.join(changes)}"
+    return notification
+
+
+def record_change(db: Session, table: str, op: str, row: Mapping[str, Any], changes: Optional[Dict[str, list]] = None):
+    """Queue a change made outside the ORM unit of work; published once the session commits.
+
+    Without `changes`, every non-null watched column of `row` is reported as new (an insert).
+    """
+    if change_feed.mode != "orm" or not change_feed.started:
+        return
+    watched = WATCHED_COLUMNS[table]
+    if changes is None:
+        changes = {column: [None, row[column]] for column in watched if row.get(column) is not None}
+    changes = {column: diff for column, diff in changes.items() if column in watched}
+    if op == "update" and not changes:
+        return
+    db.info.setdefault("change_feed", []).append(change_notification(table, op, row, changes))
+
+
+def update_with_changes(
+    db: Session, model, row_id: int, values: Dict[str, Any], extra: Optional[Dict[str, Any]] = None
+) -> Tuple[Optional[Mapping[str, Any]], Dict[str, list]]:
+    """UPDATE one row by id; returns the new row and {column: [old, new]} for the `values` that changed.
+
+    On PostgreSQL the old values come from the same statement
+    (UPDATE ... FROM (SELECT ... FOR UPDATE) old RETURNING old.*, new.*);
+    elsewhere they are read just before the UPDATE in the same transaction.
+    Raises IntegrityError like a plain UPDATE; the row is None when the id does not exist.
+    """
+    table = model.__table__
+    columns = list(values)
+    statement = update(table).values(**values, **(extra or {}))
+    if db.get_bind().dialect.name == "postgresql":
+        old = select(table.c.id, *[table.c[column].label(f"old_{column}") for column in columns]).where(
+            table.c.id == row_id
+        ).with_for_update().subquery("old")
+        result = db.execute(
+            statement.where(table.c.id == old.c.id).returning(*table.c, *[old.c[f"old_{column}"] for column in columns])
+        ).mappings().first()
+        if result is None:
+            return None, {}
+        row = {column.name: result[column.name] for column in table.c}
+        previous = {column: result[f"old_{column}"] for column in columns}
+    else:
+        previous = db.execute(
+            select(table.c.id, *[table.c[column] for column in columns]).where(table.c.id == row_id)
+        ).mappings().first()
+        if previous is None:
+            return None, {}
+        row = db.execute(statement.where(table.c.id == row_id).returning(*table.c)).mappings().first()
+    changes = {column: [previous[column], row[column]] for column in columns if previous[column] != row[column]}
+    return row, changes
+
+
+class ChangeFeed:
+    """Publishes watched row changes as notifications after commit"""
+
+    def __init__(self, mode: str = "orm"):
+        if mode not in CHANGE_FEED_MODES:
+            raise ValueError(f"Change feed mode must be one of {', '.join(CHANGE_FEED_MODES)}")
+        self.mode = mode
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.started = False
+        self.listener: Optional[asyncio.Task] = None
+        self.stats = {"published": 0, "errors": 0}
+        self.listening = False
+
+    # ORM hooks
+
+    def _after_flush(self, session: Session, flush_context):
+        changes = session.info.setdefault("change_feed", [])
+        for operation, objects in (("insert", session.new), ("update", session.dirty), ("delete", session.deleted)):
+            for obj in objects:
+                table = MODELS.get(type(obj))
+                if table is None:
+                    continue
+                state = inspect(obj)
+                # state.dict only: nothing here may lazy-load inside a flush
+                row = {column: state.dict.get(column) for column in ("id", "assigned_truck_id", "shipment_id", "event_type")}
+                diff = {}
+                for column in WATCHED_COLUMNS[table]:
+                    if operation == "insert":
+                        if state.dict.get(column) is not None:
+                            diff[column] = [None, state.dict[column]]
+                    elif operation == "update":
+                        history = state.attrs[column].history
+                        if history.has_changes():
+                            diff[column] = [
+                                history.deleted[0] if history.deleted else None,
+                                history.added[0] if history.added else None,
+                            ]
+                if operation == "update" and not diff:
+                    continue
+                changes.append(change_notification(table, operation, row, diff))
+
+    def _after_commit(self, session: Session):
+        notifications = session.info.pop("change_feed", None)
+        if notifications and self.loop is not None:
+            self.loop.call_soon_threadsafe(self._schedule, notifications)
+
+    def _after_rollback(self, session: Session):
+        session.info.pop("change_feed", None)
+
+    def _schedule(self, notifications: List[Dict[str, Any]]):
+        asyncio.ensure_future(self.publish(notifications))
+
+    async def publish(self, notifications: List[Dict[str, Any]]):
+        from ..api.notifications import broadcast_notification
+
+        for notification in notifications:
+            try:
+                await broadcast_notification(notification)
+                self.stats["published"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Change feed publish failed: {e}")
+
+    # Postgres triggers
+
+    def _dispatch(self, payload: str):
+        try:
+            change = json.loads(payload)
+            row = {"id": change["id"], **change.get("row", {})}
+            notification = change_notification(change["table"], change["op"], row, change.get("changes", {}))
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Change feed payload dropped: {e}")
+            return
+        self._schedule([notification])
+
+    async def _listen(self):
+        dsn = re.sub(r"^postgresql\+\w+://", "postgresql://", settings.database_url)
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(dsn, autocommit=True) as conn:
+                    # Only one worker publishes trigger notifications; the others stand by
+                    while not (await (await conn.execute(
+                        "SELECT pg_try_advisory_lock(%s)", (LISTENER_LOCK_KEY,)
+                    )).fetchone())[0]:
+                        await asyncio.sleep(STANDBY_SECONDS)
+                    await conn.execute(f'LISTEN "{CHANGES_CHANNEL}"')
+                    self.listening = True
+                    logger.info("Change feed listening for database triggers")
+                    async for notify in conn.notifies():
+                        self._dispatch(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Change feed listener failed: {e}")
+            finally:
+                self.listening = False
+            await asyncio.sleep(STANDBY_SECONDS)
+
+    async def start(self):
+        if self.started or self.mode == "off":
+            return
+        self.loop = asyncio.get_running_loop()
+        if self.mode == "orm":
+            event.listen(Session, "after_flush", self._after_flush)
+            event.listen(Session, "after_commit", self._after_commit)
+            event.listen(Session, "after_soft_rollback", self._after_rollback)
+        else:
+            if not PSYCOPG_AVAILABLE:
+                raise ImportError("psycopg is required for the postgres change feed")
+            self.listener = asyncio.create_task(self._listen())
+        self.started = True
+
+    async def stop(self):
+        if not self.started:
+            return
+        if self.mode == "orm":
+            event.remove(Session, "after_flush", self._after_flush)
+            event.remove(Session, "after_commit", self._after_commit)
+            event.remove(Session, "after_soft_rollback", self._after_rollback)
+        elif self.listener is not None:
+            self.listener.cancel()
+        self.started = False
+
+    def status(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "started": self.started, "listening": self.listening, **self.stats}
+
+
+change_feed = ChangeFeed(settings.change_feed)
@@ -0,0 +1,466 @@
+"""
+Cold-chain temperature compliance engine.
+Evaluates flushed telemetry samples against the temperature limits of the
+refrigerated shipments riding on each truck. Every shipment runs a small
+state machine (in range -> out of range -> excursion -> recovered);
+confirmed excursions become DeliveryEvent exceptions and notifications, and
+time-in-range aggregates are kept incrementally per shipment and cargo type.
+
+Each API worker evaluates only the pings it ingested. Aggregates are
+persisted as deltas (SET x = x + :delta), so workers never overwrite each
+other's totals, but an excursion state machine needs a truck's whole
+stream: with several workers, send all telemetry to one of them (or route
+each truck to a fixed worker), otherwise excursions are missed or
+reported twice.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+from ..models.base import SessionLocal, upsert_insert
+from ..models.tables import DeliveryEvent, Shipment, ShipmentTemperatureCompliance
+
+logger = logging.getLogger(__name__)
+
+# Allowed cargo temperature range per cargo_type, degrees Celsius
+TEMPERATURE_LIMITS = {
+    "refrigerated": (2.0, 8.0),
+    "pharmaceuticals": (2.0, 8.0),
+    "perishable": (0.0, 10.0),
+    "frozen": (-30.0, -15.0),
+}
+EXCURSION_GRACE_SECONDS = 300.0  # Door-open spikes shorter than this are not excursions
+RECOVERY_MARGIN = 0.5  # Degrees back inside the limits before an excursion ends (hysteresis)
+MAX_SAMPLE_GAP = 600.0  # Silences longer than this are not counted as monitored time
+ACTIVE_STATUSES = ("assigned", "in_transit")
+MAX_UNRECORDED = 10000  # Transitions kept for retry while DeliveryEvent writes fail
+
+IN_RANGE, OUT_OF_RANGE, EXCURSION = "in_range", "out_of_range", "excursion"
+AGGREGATES = ("monitored_seconds", "in_range_seconds", "excursion_count", "excursion_seconds")
+
+
+def limits_for(cargo_type: Optional[str]) -> Optional[tuple]:
+    if not cargo_type:
+        return None
+    return TEMPERATURE_LIMITS.get(cargo_type.strip().lower())
+
+
+def _epoch(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _iso(epoch: Optional[float]) -> Optional[str]:
+    return None if epoch is None else datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+def compliance_percent(monitored_seconds: float, in_range_seconds: float) -> Optional[float]:
+    return round(100.0 * in_range_seconds / monitored_seconds, 2) if monitored_seconds > 0 else None
+
+
+class ShipmentMonitor:
+    """Excursion state machine and running aggregates for one shipment"""
+
+    def __init__(self, shipment_id: int, truck_id: int, cargo_type: str,
+                 row: Optional[ShipmentTemperatureCompliance] = None):
+        self.shipment_id = shipment_id
+        self.truck_id = truck_id
+        self.cargo_type = cargo_type.strip().lower()
+        self.low, self.high = TEMPERATURE_LIMITS[self.cargo_type]
+        self.monitored_seconds = row.monitored_seconds if row else 0.0
+        self.in_range_seconds = row.in_range_seconds if row else 0.0
+        self.excursion_count = row.excursion_count if row else 0
+        self.excursion_seconds = row.excursion_seconds if row else 0.0
+        self.peak_deviation = row.peak_deviation if row else 0.0
+        self.last_t = _epoch(row.last_reading_at) if row and row.last_reading_at else None
+        self.last_in_range = not (row and row.in_excursion)
+        self.state = EXCURSION if row and row.in_excursion else IN_RANGE
+        # Current out-of-range spell (also restored for an excursion in progress)
+        self.out_since = self.last_t if self.state == EXCURSION else None
+        self.spell_peak: Optional[float] = None
+        self.dirty = False
+        self.persisted = {name: getattr(self, name) for name in AGGREGATES}  # Totals already in the table
+
+    def deviation(self, temperature: float) -> float:
+        return max(self.low - temperature, temperature - self.high, 0.0)
+
+    def _track_peak(self, temperature: float):
+        if self.spell_peak is None or self.deviation(temperature) > self.deviation(self.spell_peak):
+            self.spell_peak = temperature
+
+    def observe(self, t: float, temperature: float) -> Optional[str]:
+        """Apply one reading; returns "start" or "end" when an excursion begins or ends"""
+        # The interval since the previous reading is credited to that reading's state
+        if self.last_t is not None:
+            dt = min(t - self.last_t, MAX_SAMPLE_GAP)
+            self.monitored_seconds += dt
+            if self.last_in_range:
+                self.in_range_seconds += dt
+            if self.state == EXCURSION:
+                self.excursion_seconds += dt
+        self.last_t = t
+        deviation = self.deviation(temperature)
+        self.last_in_range = deviation == 0.0
+        self.peak_deviation = max(self.peak_deviation, deviation)
+        self.dirty = True
+
+        if self.state == IN_RANGE:
+            if deviation == 0.0:
+                return None
+            self.state, self.out_since, self.spell_peak = OUT_OF_RANGE, t, temperature
+        elif self.state == OUT_OF_RANGE:
+            if deviation == 0.0:
+                self.state, self.out_since, self.spell_peak = IN_RANGE, None, None
+                return None
+            self._track_peak(temperature)
+        else:
+            self._track_peak(temperature)
+            if self.low + RECOVERY_MARGIN <= temperature <= self.high - RECOVERY_MARGIN:
+                self.state = IN_RANGE
+                return "end"
+            return None
+
+        if t - self.out_since >= EXCURSION_GRACE_SECONDS:
+            self.state = EXCURSION
+            self.excursion_count += 1
+            self.excursion_seconds += t - self.out_since
+            return "start"
+        return None
+
+    def event(self, transition: str, t: float, temperature: float,
+              lat: Optional[float], lng: Optional[float]) -> Dict[str, Any]:
+        limit = self.high if (self.spell_peak if self.spell_peak is not None else temperature) > self.high else self.low
+        event = {
+            "transition": transition,
+            "shipment_id": self.shipment_id,
+            "truck_id": self.truck_id,
+            "cargo_type": self.cargo_type,
+            "temperature": temperature,
+            "peak_temperature": self.spell_peak,
+            "limit": limit,
+            "started_at": self.out_since,
+            "at": t,
+            "duration_seconds": None if self.out_since is None else round(t - self.out_since, 1),
+            "location": f"{lat:.5f},{lng:.5f}" if lat is not None and lng is not None else None,
+        }
+        if transition == "end":
+            self.out_since, self.spell_peak = None, None
+        return event
+
+    def deltas(self) -> Dict[str, float]:
+        return {name: getattr(self, name) - self.persisted[name] for name in AGGREGATES}
+
+    def as_row(self) -> Dict[str, Any]:
+        return {
+            "shipment_id": self.shipment_id,
+            "truck_id": self.truck_id,
+            "cargo_type": self.cargo_type,
+            "min_temperature": self.low,
+            "max_temperature": self.high,
+            "monitored_seconds": self.monitored_seconds,
+            "in_range_seconds": self.in_range_seconds,
+            "excursion_count": self.excursion_count,
+            "excursion_seconds": self.excursion_seconds,
+            "peak_deviation": self.peak_deviation,
+            "in_excursion": self.state == EXCURSION,
+            "last_reading_at": None if self.last_t is None else datetime.fromtimestamp(self.last_t, timezone.utc),
+        }
+
+    def view(self) -> Dict[str, Any]:
+        return {
+            "shipment_id": self.shipment_id,
+            "truck_id": self.truck_id,
+            "cargo_type": self.cargo_type,
+            "limits": [self.low, self.high],
+            "state": self.state,
+            "compliance_percent": compliance_percent(self.monitored_seconds, self.in_range_seconds),
+            "monitored_hours": round(self.monitored_seconds / 3600, 2),
+            "excursion_count": self.excursion_count,
+            "excursion_minutes": round(self.excursion_seconds / 60, 1),
+            "peak_deviation": round(self.peak_deviation, 2),
+            "out_of_range_since": _iso(self.out_since),
+            "last_reading_at": _iso(self.last_t),
+        }
+
+
+class ColdChainMonitor:
+    """Per-truck shipment monitors fed by the telemetry pipeline"""
+
+    def __init__(self, refresh_interval: float = 30.0):
+        self.refresh_interval = refresh_interval
+        self.trucks: Dict[int, Dict[int, ShipmentMonitor]] = {}
+        self.shipments: Dict[int, ShipmentMonitor] = {}
+        # Aggregates of shipments that are no longer being monitored, per cargo type
+        self.closed_totals: Dict[str, Dict[str, float]] = {}
+        self.loaded_at = 0.0
+        self.stats = {"samples_evaluated": 0, "excursions_started": 0, "excursions_ended": 0, "record_errors": 0}
+        # Transitions already applied to the monitors whose DeliveryEvent write failed, oldest first
+        self.unrecorded: List[Dict[str, Any]] = []
+        self._lock = threading.RLock()
+
+    def refresh(self):
+        """Sync the truck -> active cold-chain shipment map and persist changed aggregates"""
+        with self._lock:
+            db = SessionLocal()
+            written = []
+            try:
+                if not self.loaded_at:
+                    self._load_closed_totals(db)
+                active = {
+                    row[0]: row for row in db.query(
+                        Shipment.id, Shipment.assigned_truck_id, Shipment.cargo_type
+                    ).filter(
+                        Shipment.status.in_(ACTIVE_STATUSES),
+                        Shipment.assigned_truck_id.isnot(None),
+                        func.lower(Shipment.cargo_type).in_(list(TEMPERATURE_LIMITS)),
+                    ).all()
+                }
+                new_ids = [shipment_id for shipment_id in active if shipment_id not in self.shipments]
+                saved = {
+                    row.shipment_id: row for row in db.query(ShipmentTemperatureCompliance).filter(
+                        ShipmentTemperatureCompliance.shipment_id.in_(new_ids)
+                    ).all()
+                } if new_ids else {}
+
+                for shipment_id, monitor in list(self.shipments.items()):
+                    if shipment_id not in active:
+                        # Delivered, cancelled or unassigned: fold its totals into the closed aggregates
+                        monitor.dirty = True
+                        written.append((monitor, self._persist(db, monitor)))
+                        totals = self.closed_totals.setdefault(monitor.cargo_type, dict.fromkeys(AGGREGATES, 0.0))
+                        for name in AGGREGATES:
+                            totals[name] += getattr(monitor, name)
+                        del self.shipments[shipment_id]
+                    else:
+                        monitor.truck_id = active[shipment_id][1]
+                for shipment_id in new_ids:
+                    _, truck_id, cargo_type = active[shipment_id]
+                    self.shipments[shipment_id] = ShipmentMonitor(shipment_id, truck_id, cargo_type,
+                                                                  saved.get(shipment_id))
+
+                self.trucks = {}
+                for monitor in self.shipments.values():
+                    self.trucks.setdefault(monitor.truck_id, {})[monitor.shipment_id] = monitor
+                for monitor in self.shipments.values():
+                    totals = self._persist(db, monitor)
+                    if totals is not None:
+                        written.append((monitor, totals))
+                db.commit()
+                for monitor, totals in written:
+                    monitor.persisted, monitor.dirty = totals, False
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+            self.loaded_at = time.time()
+
+    def _load_closed_totals(self, db):
+        rows = db.query(
+            ShipmentTemperatureCompliance.cargo_type,
+            *[func.coalesce(func.sum(getattr(ShipmentTemperatureCompliance, name)), 0) for name in AGGREGATES]
+        ).join(Shipment, Shipment.id == ShipmentTemperatureCompliance.shipment_id).filter(
+            Shipment.status.notin_(ACTIVE_STATUSES)
+        ).group_by(ShipmentTemperatureCompliance.cargo_type).all()
+        self.closed_totals = {row[0]: dict(zip(AGGREGATES, map(float, row[1:]))) for row in rows}
+
+    @staticmethod
+    def _persist(db, monitor: ShipmentMonitor) -> Optional[Dict[str, float]]:
+        """Add this worker's aggregates since the last persist to the shipment's row.
+
+        Returns the totals written; they become the monitor's baseline (and it clean) once the transaction commits.
+        """
+        if not monitor.dirty:
+            return None
+        table = ShipmentTemperatureCompliance.__table__
+        row, deltas = monitor.as_row(), monitor.deltas()
+        reading_at = row["last_reading_at"]
+        newest = or_(table.c.last_reading_at.is_(None), table.c.last_reading_at <= reading_at)
+        statement = upsert_insert(db.connection(), table).values(
+            {**row, **deltas, "updated_at": func.now()}
+        ).on_conflict_do_update(index_elements=["shipment_id"], set_={
+            "truck_id": row["truck_id"],
+            "cargo_type": row["cargo_type"],
+            "min_temperature": row["min_temperature"],
+            "max_temperature": row["max_temperature"],
+            **{name: table.c[name] + delta for name, delta in deltas.items()},
+            "peak_deviation": case(
+                (table.c.peak_deviation < row["peak_deviation"], row["peak_deviation"]), else_=table.c.peak_deviation
+            ),
+            # State and last reading come from whichever worker saw the newest reading
+            "in_excursion": table.c.in_excursion if reading_at is None
+            else case((newest, row["in_excursion"]), else_=table.c.in_excursion),
+            "last_reading_at": table.c.last_reading_at if reading_at is None
+            else case((newest, reading_at), else_=table.c.last_reading_at),
+            "updated_at": func.now(),
+        })
+        db.execute(statement)
+        return {name: getattr(monitor, name) for name in AGGREGATES}
+
+    def process(self, samples: List[tuple]) -> List[Dict[str, Any]]:
+        """Run flushed (truck_id, recorded_at, lat, lng, temperature) samples through the monitors"""
+        if not self.loaded_at:
+            self.refresh()
+        events = []
+        with self._lock:
+            trucks = self.trucks
+            relevant = sorted(
+                (s for s in samples if s[4] is not None and s[0] in trucks),
+                key=lambda s: (s[0], s[1]),
+            )
+            for truck_id, recorded_at, lat, lng, temperature in relevant:
+                t = _epoch(recorded_at)
+                for monitor in trucks[truck_id].values():
+                    if monitor.last_t is not None and t <= monitor.last_t:
+                        continue  # Late or repeated reading
+                    transition = monitor.observe(t, temperature)
+                    if transition:
+                        events.append(monitor.event(transition, t, temperature, lat, lng))
+            self.stats["samples_evaluated"] += len(relevant)
+        for event in events:
+            self.stats["excursions_started" if event["transition"] == "start" else "excursions_ended"] += 1
+        return events
+
+    def record(self, events: List[Dict[str, Any]]):
+        """Write excursion transitions as DeliveryEvent exceptions"""
+        db = SessionLocal()
+        try:
+            db.add_all([
+                DeliveryEvent(
+                    shipment_id=event["shipment_id"],
+                    event_type="exception",
+                    timestamp=datetime.fromtimestamp(event["at"], timezone.utc),
+                    location=event["location"],
+                    notes=excursion_message(event),
+                )
+                for event in events
+            ])
+            db.commit()
+        finally:
+            db.close()
+
+    def record_each(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Write events one at a time; returns those written, logging and dropping the rejected ones"""
+        written = []
+        for event in events:
+            try:
+                self.record([event])
+            except IntegrityError as e:
+                self.stats["record_errors"] += 1
+                logger.error(f"Cold-chain excursion event for shipment {event['shipment_id']} dropped: {e.orig}")
+                continue
+            written.append(event)
+        return written
+
+    async def notify(self, events: List[Dict[str, Any]]):
+        from ..api.notifications import broadcast_notification
+
+        for event in events:
+            started = event["transition"] == "start"
+            notification = {
+                "type": "temperature_excursion" if started else "temperature_recovered",
+                "message": excursion_message(event),
+                "shipment_id": event["shipment_id"],
+                "truck_id": event["truck_id"],
+                "timestamp": _iso(event["at"]),
+                "severity": "critical" if started else "info",
+            }
+            await broadcast_notification(notification)
+
+    async def deliver(self, events: List[Dict[str, Any]]):
+        """Record transitions, with any still unrecorded from earlier, then notify.
+
+        The monitors have already moved on, so transitions whose write fails are kept
+        and retried with the next batch (or the next refresh) rather than lost.
+        """
+        events, self.unrecorded = self.unrecorded + events, []
+        if not events:
+            return
+        try:
+            try:
+                await run_in_threadpool(self.record, events)
+            except IntegrityError as e:
+                # Retrying cannot fix a rejected row (e.g. the shipment was deleted): write the rest
+                logger.error(f"Cold-chain excursion write rejected, recording events one by one: {e}")
+                events = await run_in_threadpool(self.record_each, events)
+        except Exception as e:
+            self.stats["record_errors"] += 1
+            pending = events + self.unrecorded
+            self.unrecorded = pending[-MAX_UNRECORDED:]
+            dropped = len(pending) - len(self.unrecorded)
+            logger.error(f"Cold-chain excursion write of {len(events)} events failed, will retry: {e}"
+                         + (f" ({dropped} oldest dropped)" if dropped else ""))
+            return
+        await self.notify(events)
+
+    async def on_samples(self, samples: List[tuple]):
+        """Telemetry pipeline listener"""
+        events = await run_in_threadpool(self.process, samples)
+        await self.deliver(events)
+
+    def summary(self) -> Dict[str, Any]:
+        """Fleet temperature compliance % overall and per cargo type, plus open excursions"""
+        with self._lock:
+            by_type = {cargo_type: dict(totals) for cargo_type, totals in self.closed_totals.items()}
+            for monitor in self.shipments.values():
+                totals = by_type.setdefault(monitor.cargo_type, dict.fromkeys(AGGREGATES, 0.0))
+                for name in AGGREGATES:
+                    totals[name] += getattr(monitor, name)
+            excursions = [m.view() for m in self.shipments.values() if m.state == EXCURSION]
+            monitored = len(self.shipments)
+
+        overall = {name: sum(t[name] for t in by_type.values()) for name in AGGREGATES}
+        return {
+            "compliance_percent": compliance_percent(overall["monitored_seconds"], overall["in_range_seconds"]),
+            "monitored_hours": round(overall["monitored_seconds"] / 3600, 2),
+            "excursion_count": int(overall["excursion_count"]),
+            "by_cargo_type": {
+                cargo_type: {
+                    "compliance_percent": compliance_percent(t["monitored_seconds"], t["in_range_seconds"]),
+                    "monitored_hours": round(t["monitored_seconds"] / 3600, 2),
+                    "excursion_count": int(t["excursion_count"]),
+                    "excursion_minutes": round(t["excursion_seconds"] / 60, 1),
+                }
+                for cargo_type, t in sorted(by_type.items())
+            },
+            "monitored_shipments": monitored,
+            "active_excursions": excursions,
+        }
+
+    def shipment_view(self, shipment_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            monitor = self.shipments.get(shipment_id)
+            return monitor.view() if monitor else None
+
+    async def run(self):
+        """Background loop keeping assignments current and aggregates persisted"""
+        while True:
+            try:
+                await run_in_threadpool(self.refresh)
+                await self.deliver([])
+            except Exception as e:
+                logger.error(f"Cold-chain monitor refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+
+def excursion_message(event: Dict[str, Any]) -> str:
+    peak = event["peak_temperature"] if event["peak_temperature"] is not None else event["temperature"]
+    direction = "above" if peak > event["limit"] else "below"
+    if event["transition"] == "start":
+        return (f"Temperature excursion on {event['cargo_type']} cargo: {event['temperature']:.1f}°C, "
+                f"{direction} the {event['limit']:.1f}°C limit since {_iso(event['started_at'])}")
+    minutes = (event["duration_seconds"] or 0) / 60
+    return (f"Temperature back in range ({event['temperature']:.1f}°C) after {minutes:.0f} min; "
+            f"peak {peak:.1f}°C {direction} the {event['limit']:.1f}°C limit")
+
+
+cold_chain_monitor = ColdChainMonitor()
@@ -0,0 +1,272 @@
+"""
+Load consolidation engine for partial-truckload shipments.
+Groups compatible pending shipments and bin-packs them into trucks.
+"""
+
+import bisect
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Cargo types that may share a trailer. Anything not listed travels as general freight.
+CARGO_COMPATIBILITY = {
+    "refrigerated": "refrigerated",
+    "frozen": "refrigerated",
+    "perishable": "refrigerated",
+    "pharmaceuticals": "refrigerated",
+    "hazardous": "hazardous",
+    "hazmat": "hazardous",
+}
+
+OPEN_WINDOW = (-math.inf, math.inf)
+
+
+def cargo_class(cargo_type: Optional[str]) -> str:
+    """Map a shipment cargo_type to its compatibility class"""
+    if not cargo_type:
+        return "general"
+    return CARGO_COMPATIBILITY.get(cargo_type.strip().lower(), "general")
+
+
+def lane_region(location: Optional[str]) -> str:
+    """Reduce a location such as 'Chicago, IL' to its region ('IL')"""
+    if not location:
+        return ""
+    parts = location.rsplit(",", 1)
+    return parts[-1].strip().upper() if len(parts) == 2 else location.strip().upper()
+
+
+def _timestamp(value: Any, default: float) -> float:
+    if value is None:
+        return default
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+class _Item:
+    __slots__ = ("id", "weight", "volume", "start", "end", "size")
+
+    def __init__(self, shipment_id: int, weight: float, volume: float, start: float, end: float):
+        self.id = shipment_id
+        self.weight = weight
+        self.volume = volume
+        self.start = start
+        self.end = end
+        self.size = 0.0
+
+
+class _Bin:
+    __slots__ = ("truck", "items", "weight", "volume")
+
+    def __init__(self, truck: Tuple[float, float, int, str]):
+        self.truck = truck
+        self.items: List[_Item] = []
+        self.weight = 0.0
+        self.volume = 0.0
+
+    def fits(self, item: _Item) -> bool:
+        return (self.weight + item.weight <= self.truck[0]
+                and self.volume + item.volume <= self.truck[1])
+
+    def add(self, item: _Item):
+        self.items.append(item)
+        self.weight += item.weight
+        self.volume += item.volume
+
+    def utilization(self) -> float:
+        return max(self.weight / self.truck[0], self.volume / self.truck[1])
+
+
+class _TruckPool:
+    """Free trucks kept sorted by (capacity_weight, capacity_volume)"""
+
+    def __init__(self, trucks: Iterable[Tuple[float, float, int, str]]):
+        self.trucks = sorted(trucks)
+
+    def __len__(self):
+        return len(self.trucks)
+
+    def take_largest(self) -> Optional[Tuple[float, float, int, str]]:
+        return self.trucks.pop() if self.trucks else None
+
+    def take_smallest_fitting(self, weight: float, volume: float) -> Optional[Tuple[float, float, int, str]]:
+        index = bisect.bisect_left(self.trucks, (weight,))
+        while index < len(self.trucks):
+            if self.trucks[index][1] >= volume:
+                return self.trucks.pop(index)
+            index += 1
+        return None
+
+    def release(self, truck: Tuple[float, float, int, str]):
+        bisect.insort(self.trucks, truck)
+
+
+class ConsolidationService:
+    """Builds consolidated truck plans from pending shipments and available trucks"""
+
+    def __init__(self, max_cluster_size: int = 500):
+        self.max_cluster_size = max_cluster_size
+
+    def plan(self, shipments: Iterable[Any], trucks: Iterable[Any]) -> Dict[str, Any]:
+        """Group compatible shipments and pack them into the available trucks.
+
+        Shipments and trucks may be ORM rows or dicts exposing the same field names.
+        """
+        started = time.perf_counter()
+
+        pool = _TruckPool(
+            (float(t["capacity_weight"]), float(t["capacity_volume"]), t["id"], t.get("plate_number") or "")
+            for t in map(_as_dict, trucks)
+            if t.get("capacity_weight") and t.get("capacity_volume")
+        )
+        total_trucks = len(pool)
+
+        buckets: Dict[Tuple[str, str, str], List[_Item]] = {}
+        for shipment in map(_as_dict, shipments):
+            key = (
+                lane_region(shipment.get("origin")),
+                lane_region(shipment.get("destination")),
+                cargo_class(shipment.get("cargo_type")),
+            )
+            buckets.setdefault(key, []).append(_Item(
+                shipment["id"],
+                float(shipment.get("cargo_weight") or 0.0),
+                float(shipment.get("cargo_volume") or 0.0),
+                _timestamp(shipment.get("pickup_time"), OPEN_WINDOW[0]),
+                _timestamp(shipment.get("delivery_deadline"), OPEN_WINDOW[1]),
+            ))
+
+        # Largest trucks normalise item sizes so FFD sorts on the binding dimension.
+        max_weight = max((t[0] for t in pool.trucks), default=1.0)
+        max_volume = max((t[1] for t in pool.trucks), default=1.0)
+
+        plans: List[Dict[str, Any]] = []
+        unassigned: List[int] = []
+        for (origin, destination, klass), items in sorted(buckets.items(), key=lambda kv: -len(kv[1])):
+            for cluster in self._time_clusters(items):
+                for item in cluster:
+                    item.size = max(item.weight / max_weight, item.volume / max_volume)
+                bins, leftover = self._pack(cluster, pool)
+                unassigned.extend(item.id for item in leftover)
+                for packed in bins:
+                    plans.append(self._describe(packed, origin, destination, klass))
+
+        consolidated = sum(len(p["shipment_ids"]) for p in plans)
+        return {
+            "plans": plans,
+            "unassigned_shipment_ids": unassigned,
+            "summary": {
+                "shipments_considered": consolidated + len(unassigned),
+                "shipments_consolidated": consolidated,
+                "trucks_available": total_trucks,
+                "trucks_used": len(plans),
+                "avg_utilization": round(
+                    sum(p["utilization"] for p in plans) / len(plans), 4) if plans else 0,
+                "solve_time_ms": round((time.perf_counter() - started) * 1000, 2),
+            },
+        }
+
+    def _time_clusters(self, items: List[_Item]) -> Iterable[List[_Item]]:
+        """Sweep shipments by pickup time; a cluster keeps a non-empty common window"""
+        items.sort(key=lambda item: (item.start, item.end))
+        cluster: List[_Item] = []
+        low, high = OPEN_WINDOW
+        for item in items:
+            new_low, new_high = max(low, item.start), min(high, item.end)
+            if cluster and (new_low > new_high or len(cluster) >= self.max_cluster_size):
+                yield cluster
+                cluster = []
+                new_low, new_high = item.start, item.end
+            cluster.append(item)
+            low, high = new_low, new_high
+        if cluster:
+            yield cluster
+
+    def _pack(self, items: List[_Item], pool: _TruckPool) -> Tuple[List[_Bin], List[_Item]]:
+        """First-fit decreasing followed by bin elimination and truck downsizing"""
+        bins: List[_Bin] = []
+        leftover: List[_Item] = []
+        for item in sorted(items, key=lambda item: item.size, reverse=True):
+            for packed in bins:
+                if packed.fits(item):
+                    packed.add(item)
+                    break
+            else:
+                truck = pool.take_largest()
+                if truck is None or item.weight > truck[0] or item.volume > truck[1]:
+                    if truck is not None:
+                        pool.release(truck)
+                    leftover.append(item)
+                    continue
+                packed = _Bin(truck)
+                packed.add(item)
+                bins.append(packed)
+
+        # Try to empty the least utilized trucks into the others.
+        bins.sort(key=_Bin.utilization)
+        index = 0
+        while index < len(bins) and len(bins) > 1:
+            candidate = bins[index]
+            others = bins[:index] + bins[index + 1:]
+            moves = []
+            for item in sorted(candidate.items, key=lambda item: item.size, reverse=True):
+                target = next((b for b in others if b.fits(item)), None)
+                if target is None:
+                    break
+                target.add(item)
+                moves.append((target, item))
+            if len(moves) == len(candidate.items):
+                pool.release(candidate.truck)
+                bins.pop(index)
+                continue
+            for target, item in moves:
+                target.items.remove(item)
+                target.weight -= item.weight
+                target.volume -= item.volume
+            index += 1
+
+        # Swap each load onto the smallest free truck that still carries it.
+        for packed in bins:
+            smaller = pool.take_smallest_fitting(packed.weight, packed.volume)
+            if smaller is None:
+                continue
+            if smaller < packed.truck:
+                pool.release(packed.truck)
+                packed.truck = smaller
+            else:
+                pool.release(smaller)
+
+        return bins, leftover
+
+    @staticmethod
+    def _describe(packed: _Bin, origin: str, destination: str, klass: str) -> Dict[str, Any]:
+        capacity_weight, capacity_volume, truck_id, plate_number = packed.truck
+        start = max(item.start for item in packed.items)
+        end = min(item.end for item in packed.items)
+        return {
+            "truck_id": truck_id,
+            "plate_number": plate_number,
+            "lane": f"{origin} -> {destination}",
+            "cargo_class": klass,
+            "shipment_ids": [item.id for item in packed.items],
+            "total_weight": round(packed.weight, 2),
+            "total_volume": round(packed.volume, 2),
+            "weight_utilization": round(packed.weight / capacity_weight, 4),
+            "volume_utilization": round(packed.volume / capacity_volume, 4),
+            "utilization": round(packed.utilization(), 4),
+            "window_start": datetime.fromtimestamp(start).isoformat() if start != OPEN_WINDOW[0] else None,
+            "window_end": datetime.fromtimestamp(end).isoformat() if end != OPEN_WINDOW[1] else None,
+        }
+
+
+def _as_dict(row: Any) -> Dict[str, Any]:
+    if isinstance(row, dict):
+        return row
+    return {column: getattr(row, column, None) for column in (
+        "id", "plate_number", "capacity_weight", "capacity_volume", "origin", "destination",
+        "cargo_type", "cargo_weight", "cargo_volume", "pickup_time", "delivery_deadline",
+    )}
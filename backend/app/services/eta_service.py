@@ -0,0 +1,499 @@
+"""
+Delivery delay prediction engine.
+A CPU-only linear model on NumPy features (lane, driver and hour-of-week
+history from the feature store, schedule slack, distance remaining, deadline
+time of day/week, priority, cargo class):
+ridge regression for the delay in minutes and L2 logistic regression for the
+probability of arriving more than LATE_THRESHOLD_MINUTES late. All active
+shipments are scored in one vectorized batch on a schedule; predictions are
+upserted and Shipment.eta is moved when it changes.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import bindparam, func, update
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..core.performance import cache
+from ..models.base import SessionLocal, upsert_insert
+from ..models.tables import Prediction, Shipment
+from .consolidation_service import cargo_class
+from .feature_store import epoch, feature_store, lane_key
+
+logger = logging.getLogger(__name__)
+
+AVERAGE_SPEED_MPH = 50.0  # Planning speed for remaining distance
+DEFAULT_DISTANCE_MILES = 300.0  # Used when a shipment has no route_distance
+LATE_THRESHOLD_MINUTES = 30.0
+MIN_TRAINING_ROWS = 30
+DELAY_CLIP_MINUTES = (-1440.0, 2880.0)
+ETA_CHANGE_MINUTES = 2.0  # Smaller ETA moves are not written back to shipments
+MODEL_CHECK_SECONDS = 30.0  # How often a worker checks the model file for a newer version
+ACTIVE_STATUSES = ("pending", "assigned", "in_transit")
+
+FEATURE_NAMES = (
+    "lane_mean_delay", "distance_remaining", "slack_hours",
+    "hour_sin", "hour_cos", "dow_sin", "dow_cos",
+    "priority_urgent", "priority_high", "priority_low", "temperature_controlled",
+    "lane_on_time_rate", "driver_on_time_rate", "week_mean_delay",
+)
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+def remaining_miles(columns: Dict[str, np.ndarray], at: np.ndarray) -> np.ndarray:
+    """Distance left at `at`, assuming in-transit shipments progress at planning speed since pickup"""
+    distance = np.where(np.isnan(columns["distance"]) | (columns["distance"] <= 0),
+                        DEFAULT_DISTANCE_MILES, columns["distance"])
+    expected_hours = distance / AVERAGE_SPEED_MPH
+    elapsed_hours = np.maximum((at - columns["start"]) / 3600.0, 0.0)
+    progress = np.where(columns["in_transit"], np.clip(elapsed_hours / expected_hours, 0.0, 1.0), 0.0)
+    return distance * (1.0 - progress)
+
+
+def build_features(columns: Dict[str, np.ndarray], at: np.ndarray, history: Dict[str, np.ndarray]) -> np.ndarray:
+    """Feature matrix (rows x FEATURE_NAMES) for shipments evaluated at epoch times `at`.
+    `history` holds the feature store aggregates for the same rows."""
+    remaining = remaining_miles(columns, at)
+    # Negative slack: already behind schedule at planning speed ("current delay")
+    slack_hours = (columns["deadline"] - at) / 3600.0 - remaining / AVERAGE_SPEED_MPH
+
+    deadline = columns["deadline"]
+    hour = (deadline % 86400.0) / 3600.0
+    dow = (np.floor(deadline / 86400.0) + 3) % 7  # Epoch day 0 was a Thursday; Monday = 0
+    priority = columns["priority"]
+    return np.column_stack([
+        history["lane_mean_delay"],
+        remaining,
+        np.clip(slack_hours, -72.0, 168.0),
+        np.sin(2 * np.pi * hour / 24), np.cos(2 * np.pi * hour / 24),
+        np.sin(2 * np.pi * dow / 7), np.cos(2 * np.pi * dow / 7),
+        priority == "urgent", priority == "high", priority == "low",
+        columns["temperature_controlled"],
+        history["lane_on_time_rate"], history["driver_on_time_rate"], history["week_mean_delay"],
+    ]).astype(float)
+
+
+class DelayModel:
+    """Standardized ridge regression (delay minutes) plus L2 logistic regression (late risk)"""
+
+    def __init__(self):
+        self.mean = np.zeros(len(FEATURE_NAMES))
+        self.scale = np.ones(len(FEATURE_NAMES))
+        self.delay_weights = np.zeros(len(FEATURE_NAMES))
+        self.delay_bias = 0.0
+        self.risk_weights = np.zeros(len(FEATURE_NAMES))
+        self.risk_bias = 0.0
+        self.fitted = False
+        self.risk_fitted = False
+        self.version = "heuristic"
+        self.metrics: Dict[str, Any] = {}
+
+    def fit(self, X: np.ndarray, y: np.ndarray, l2: float = 1.0, iterations: int = 25) -> "DelayModel":
+        self.mean = X.mean(axis=0)
+        self.scale = np.where(X.std(axis=0) > 1e-9, X.std(axis=0), 1.0)
+        Z = (X - self.mean) / self.scale
+        n, k = Z.shape
+
+        self.delay_bias = float(y.mean())
+        self.delay_weights = np.linalg.solve(Z.T @ Z + l2 * np.eye(k), Z.T @ (y - self.delay_bias))
+
+        late = (y > LATE_THRESHOLD_MINUTES).astype(float)
+        self.risk_fitted = bool(0 < late.sum() < n)
+        if self.risk_fitted:
+            # Newton-Raphson on the penalized log-likelihood; the bias is not penalized
+            A = np.column_stack([np.ones(n), Z])
+            w = np.zeros(k + 1)
+            penalty = l2 * np.eye(k + 1)
+            penalty[0, 0] = 0.0
+            for _ in range(iterations):
+                p = _sigmoid(A @ w)
+                gradient = A.T @ (p - late) + penalty @ w
+                hessian = (A * (p * (1 - p))[:, None]).T @ A + penalty
+                step = np.linalg.solve(hessian + 1e-9 * np.eye(k + 1), gradient)
+                w -= step
+                if np.abs(step).max() < 1e-6:
+                    break
+            self.risk_bias, self.risk_weights = float(w[0]), w[1:]
+
+        predicted = self.delay_bias + Z @ self.delay_weights
+        self.metrics = {
+            "training_rows": int(n),
+            "mae_minutes": round(float(np.abs(predicted - y).mean()), 2),
+            "late_share": round(float(late.mean()), 3),
+        }
+        self.fitted = True
+        self.version = f"linear-{datetime.now(timezone.utc):%Y%m%d%H%M}-{n}"
+        return self
+
+    def predict(self, X: np.ndarray) -> tuple:
+        """(delay minutes, late probability, per-feature contributions in minutes)"""
+        if not self.fitted:
+            # Before there is delivery history: lane mean plus how far behind schedule the shipment is
+            delay = X[:, 0] + np.maximum(-X[:, 2], 0.0) * 60.0
+            return delay, _sigmoid((delay - LATE_THRESHOLD_MINUTES) / 20.0), np.zeros_like(X)
+        Z = (X - self.mean) / self.scale
+        contributions = Z * self.delay_weights
+        delay = self.delay_bias + contributions.sum(axis=1)
+        if self.risk_fitted:
+            risk = _sigmoid(self.risk_bias + Z @ self.risk_weights)
+        else:
+            risk = _sigmoid((delay - LATE_THRESHOLD_MINUTES) / 20.0)
+        return delay, risk, contributions
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        staging = f"{path}.tmp.npz"
+        np.savez(
+            staging,
+            mean=self.mean, scale=self.scale,
+            delay_weights=self.delay_weights, risk_weights=self.risk_weights,
+            meta=np.array(json.dumps({
+                "delay_bias": self.delay_bias, "risk_bias": self.risk_bias, "risk_fitted": self.risk_fitted,
+                "version": self.version, "metrics": self.metrics, "features": FEATURE_NAMES,
+            })),
+        )
+        os.replace(staging, path)
+
+    @classmethod
+    def load(cls, path: str) -> "DelayModel":
+        model = cls()
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if tuple(meta["features"]) != FEATURE_NAMES:
+                raise ValueError(f"Model at {path} was trained on a different feature set")
+            model.mean, model.scale = data["mean"], data["scale"]
+            model.delay_weights, model.risk_weights = data["delay_weights"], data["risk_weights"]
+        model.delay_bias, model.risk_bias = meta["delay_bias"], meta["risk_bias"]
+        model.risk_fitted, model.version, model.metrics = meta["risk_fitted"], meta["version"], meta["metrics"]
+        model.fitted = True
+        return model
+
+
+def shipment_columns(rows: List[Any]) -> Dict[str, np.ndarray]:
+    """Query rows (SHIPMENT_FIELDS, in any order) -> feature input columns"""
+    return {
+        "id": np.array([r.id for r in rows], dtype=np.int64),
+        "lane": np.array([lane_key(r.origin, r.destination) for r in rows], dtype=object),
+        "driver": np.array([r.assigned_driver_id for r in rows], dtype=object),
+        "in_transit": np.array([r.status == "in_transit" for r in rows], dtype=bool),
+        "priority": np.array([(r.priority or "normal").lower() for r in rows], dtype=object),
+        "temperature_controlled": np.array([cargo_class(r.cargo_type) == "refrigerated" for r in rows], dtype=bool),
+        "distance": np.array([np.nan if r.route_distance is None else r.route_distance for r in rows], dtype=float),
+        "start": np.array([epoch(r.pickup_time or r.created_at) for r in rows], dtype=float),
+        "deadline": np.array([epoch(r.delivery_deadline) for r in rows], dtype=float),
+    }
+
+
+SHIPMENT_FIELDS = (
+    Shipment.id, Shipment.origin, Shipment.destination, Shipment.status, Shipment.priority, Shipment.cargo_type,
+    Shipment.route_distance, Shipment.pickup_time, Shipment.created_at, Shipment.delivery_deadline,
+    Shipment.assigned_driver_id,
+)
+
+
+class ETAEngine:
+    """Trains the delay model and batch-scores active shipments on a schedule"""
+
+    def __init__(self, model_path: str, interval: float = 300.0, retrain_interval: float = 86400.0):
+        self.model_path = model_path
+        self.interval = interval
+        self.retrain_interval = retrain_interval
+        self.model: Optional[DelayModel] = None
+        self.loaded_mtime: Optional[float] = None
+        self.checked_at = 0.0
+        self.trained_at = 0.0
+        self.last_run: Dict[str, Any] = {}
+
+    def get_model(self) -> DelayModel:
+        """The current model, loaded lazily on first use and reloaded when another worker retrains it"""
+        now = time.time()
+        if self.model is not None and now - self.checked_at < MODEL_CHECK_SECONDS:
+            return self.model
+        self.checked_at = now
+        mtime = os.path.getmtime(self.model_path) if os.path.exists(self.model_path) else None
+        if mtime is not None and mtime != self.loaded_mtime:
+            try:
+                self.model = DelayModel.load(self.model_path)
+                self.loaded_mtime = self.trained_at = mtime
+            except Exception as e:
+                logger.warning(f"Could not load delay model from {self.model_path}: {e}")
+        if self.model is None:
+            self.model = DelayModel()
+        return self.model
+
+    def train(self) -> Dict[str, Any]:
+        """Fit on delivered shipments with point-in-time history features (no look-ahead)"""
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            rows, history, labels = feature_store.training_set(
+                db, Shipment.status, Shipment.priority, Shipment.cargo_type, Shipment.route_distance
+            )
+        finally:
+            db.close()
+
+        keep = ~np.isnan(labels["delay_minutes"])
+        rows = [r for r, k in zip(rows, keep) if k]
+        history = {name: values[keep] for name, values in history.items()}
+        delay = np.clip(labels["delay_minutes"][keep], *DELAY_CLIP_MINUTES)
+        columns = shipment_columns(rows)
+        columns["in_transit"][:] = False
+        self.trained_at = time.time()
+        if len(rows) < MIN_TRAINING_ROWS:
+            self.model = DelayModel()
+            return {"model_version": self.model.version, "training_rows": len(rows),
+                    "note": f"Need {MIN_TRAINING_ROWS} delivered shipments with deadlines to fit; using heuristic"}
+
+        X = build_features(columns, columns["start"], history)
+        model = DelayModel().fit(X, delay)
+        model.save(self.model_path)
+        self.model = model
+        self.loaded_mtime = os.path.getmtime(self.model_path)
+        logger.info(f"Delay model {model.version} trained on {len(rows)} shipments")
+        return {"model_version": model.version, **model.metrics,
+                "training_seconds": round(time.perf_counter() - started, 3)}
+
+    def predict_rows(self, rows: List[Any], now: float) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """Vectorized inference for SHIPMENT_FIELDS rows: prediction dicts plus ETAs (epoch seconds)"""
+        model = self.get_model()
+        columns = shipment_columns(rows)
+        history = feature_store.lookup(columns["lane"].tolist(), columns["driver"].tolist(), columns["deadline"])
+        X = build_features(columns, np.full(len(rows), now), history)
+        delay, risk, contributions = model.predict(X)
+
+        remaining_hours = X[:, 1] / AVERAGE_SPEED_MPH
+        eta = np.maximum(columns["deadline"] + delay * 60.0, now + remaining_hours * 3600.0)
+        late_minutes = np.maximum((eta - columns["deadline"]) / 60.0, 0.0)
+        predictions = [
+            {
+                "shipment_id": int(shipment_id),
+                "predicted_delay": int(round(late_minutes[i])),
+                "risk_score": round(float(risk[i]), 4),
+                "factors": self._factors(X[i], contributions[i]),
+                "model_version": model.version,
+            }
+            for i, shipment_id in enumerate(columns["id"])
+        ]
+        return predictions, eta
+
+    def score(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Predict every active shipment in one batch; upsert predictions and move ETAs"""
+        now = now or time.time()
+        started = time.perf_counter()
+        model = self.get_model()
+        db = SessionLocal()
+        try:
+            rows = db.query(*SHIPMENT_FIELDS, Shipment.eta).filter(
+                Shipment.status.in_(ACTIVE_STATUSES), Shipment.delivery_deadline.isnot(None)
+            ).all()
+            if not rows:
+                return {"scored": 0}
+            predictions, eta = self.predict_rows(rows, now)
+            risk = np.array([p["risk_score"] for p in predictions])
+            written = self._upsert_predictions(db, predictions)
+
+            current_eta = np.array([epoch(r.eta) for r in rows], dtype=float)
+            moved = np.isnan(current_eta) | (np.abs(current_eta - eta) > ETA_CHANGE_MINUTES * 60.0)
+            eta_updates = [
+                {"_id": rows[i].id, "_eta": datetime.fromtimestamp(eta[i], timezone.utc)}
+                for i in np.flatnonzero(moved)
+            ]
+            if eta_updates:
+                shipments = Shipment.__table__
+                # No version bump: eta is machine-maintained, and bumping would fail concurrent user edits
+                # with spurious conflicts and invalidate cached predictions (eta is not a model input)
+                db.execute(
+                    update(shipments).where(shipments.c.id == bindparam("_id")).values(
+                        eta=bindparam("_eta"), updated_at=func.now()
+                    ),
+                    eta_updates,
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        elapsed = time.perf_counter() - started
+        return {
+            "scored": len(rows),
+            "predictions_written": written,
+            "etas_updated": len(eta_updates),
+            "at_risk": int((risk >= 0.5).sum()),
+            "model_version": model.version,
+            "seconds": round(elapsed, 3),
+        }
+
+    @staticmethod
+    def _factors(features: np.ndarray, contributions: np.ndarray) -> Dict[str, Any]:
+        top = np.argsort(-np.abs(contributions))[:3]
+        return {
+            "lane_mean_delay_minutes": round(float(features[0]), 1),
+            "distance_remaining_miles": round(float(features[1]), 1),
+            "schedule_slack_hours": round(float(features[2]), 2),
+            "top_factors": [
+                {"feature": FEATURE_NAMES[j], "minutes": round(float(contributions[j]), 1)}
+                for j in top if contributions[j] != 0
+            ],
+        }
+
+    @staticmethod
+    def _upsert_predictions(db, predictions: List[Dict[str, Any]]) -> int:
+        """One executemany INSERT ... ON CONFLICT (shipment_id) DO UPDATE; safe with concurrent scorers"""
+        table = Prediction.__table__
+        statement = upsert_insert(db.connection(), table)
+        statement = statement.on_conflict_do_update(
+            index_elements=["shipment_id"],
+            set_={
+                "predicted_delay": statement.excluded.predicted_delay,
+                "risk_score": statement.excluded.risk_score,
+                "factors": statement.excluded.factors,
+                "model_version": statement.excluded.model_version,
+                "created_at": func.now(),
+            },
+        )
+        db.execute(statement, predictions)
+        return len(predictions)
+
+    def run_once(self, retrain: bool = False) -> Dict[str, Any]:
+        result = {}
+        if retrain or time.time() - self.trained_at >= self.retrain_interval:
+            result["training"] = self.train()
+        else:
+            feature_store.refresh()
+        result["scoring"] = self.score()
+        self.last_run = {"at": datetime.now(timezone.utc).isoformat(), **result}
+        return result
+
+    def info(self) -> Dict[str, Any]:
+        model = self.get_model()
+        return {
+            "model_version": model.version,
+            "fitted": model.fitted,
+            "features": list(FEATURE_NAMES),
+            "metrics": model.metrics,
+            "trained_at": datetime.fromtimestamp(self.trained_at, timezone.utc).isoformat() if self.trained_at else None,
+            "last_run": self.last_run,
+            "feature_store": feature_store.status(),
+        }
+
+    async def run(self):
+        """Background loop: retrain daily, score every interval"""
+        while True:
+            try:
+                result = await run_in_threadpool(self.run_once)
+                logger.info(f"Delay predictions refreshed: {result['scoring']}")
+            except Exception as e:
+                logger.error(f"Delay prediction run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+class PredictionBatcher:
+    """Coalesces concurrent single-shipment prediction requests into one vectorized model call.
+
+    Requests arriving within `window` seconds (or until `max_batch` distinct shipments) share
+    one shipment query and one inference pass. Results are cached per shipment version, so
+    any update to the shipment, or a new model, yields a fresh prediction.
+    """
+
+    def __init__(self, engine: ETAEngine, window: float = 0.005, max_batch: int = 256, ttl: int = 60):
+        self.engine = engine
+        self.window = window
+        self.max_batch = max_batch
+        self.ttl = ttl
+        self.pending: Dict[int, List[asyncio.Future]] = {}
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {"requests": 0, "batches": 0, "cache_hits": 0, "scored": 0}
+
+    async def predict(self, shipment_id: int) -> Tuple[Optional[Any], Optional[Dict[str, Any]]]:
+        """(shipment row or None if missing, prediction or None if the shipment is not predictable)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.setdefault(shipment_id, []).append(future)
+        self.stats["requests"] += 1
+        if len(self.pending) >= self.max_batch:
+            self._dispatch()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, {}
+        if batch:
+            asyncio.ensure_future(self._flush(batch))
+
+    @staticmethod
+    def _load(shipment_ids: List[int]) -> List[Any]:
+        db = SessionLocal()
+        try:
+            return db.query(*SHIPMENT_FIELDS, Shipment.version).filter(Shipment.id.in_(shipment_ids)).all()
+        finally:
+            db.close()
+
+    async def _flush(self, batch: Dict[int, List[asyncio.Future]]):
+        try:
+            self.stats["batches"] += 1
+            rows = {row.id: row for row in await run_in_threadpool(self._load, list(batch))}
+            model_version = self.engine.get_model().version
+            keys = {
+                shipment_id: f"prediction:{shipment_id}:{row.version}:{model_version}"
+                for shipment_id, row in rows.items()
+            }
+
+            results: Dict[int, Dict[str, Any]] = {}
+            misses = []
+            for shipment_id, row in rows.items():
+                if row.status not in ACTIVE_STATUSES or row.delivery_deadline is None:
+                    continue
+                cached = await cache.get(keys[shipment_id])
+                if cached:
+                    results[shipment_id] = {**json.loads(cached), "cached": True}
+                    self.stats["cache_hits"] += 1
+                else:
+                    misses.append(row)
+
+            if misses:
+                predictions, eta = await run_in_threadpool(self.engine.predict_rows, misses, time.time())
+                self.stats["scored"] += len(misses)
+                for row, prediction, row_eta in zip(misses, predictions, eta):
+                    prediction["eta"] = datetime.fromtimestamp(row_eta, timezone.utc).isoformat()
+                    await cache.set(keys[row.id], json.dumps(prediction), self.ttl)
+                    results[row.id] = {**prediction, "cached": False}
+
+            for shipment_id, futures in batch.items():
+                for future in futures:
+                    if not future.done():
+                        future.set_result((rows.get(shipment_id), results.get(shipment_id)))
+        except Exception as e:
+            logger.error(f"Online prediction batch failed: {e}")
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+eta_engine = ETAEngine(
+    model_path=os.path.join(settings.model_dir, "delay_model.npz"),
+    interval=settings.prediction_interval,
+    retrain_interval=settings.model_retrain_interval,
+)
+prediction_batcher = PredictionBatcher(
+    eta_engine,
+    window=settings.prediction_batch_window_ms / 1000.0,
+    ttl=settings.prediction_cache_ttl,
+)
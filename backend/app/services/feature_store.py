@@ -0,0 +1,379 @@
+"""
+Delivery-intelligence feature store.
+Keeps a compact log of completed shipments (lane, driver, delivery time,
+lateness, transit hours) and per-lane / per-driver / hour-of-week aggregates
+derived from it. Aggregates are updated incrementally as shipments are
+delivered and served as arrays for online lookup; the log answers
+point-in-time queries for building leakage-free training sets.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..models.base import SessionLocal
+from ..models.tables import Shipment
+
+logger = logging.getLogger(__name__)
+
+PRIOR_WEIGHT = 5.0  # Pseudo-deliveries shrinking sparse groups toward the fleet average
+ON_TIME_GRACE_MINUTES = 15.0
+WEEK_HOURS = 168
+REFRESH_OVERLAP = 300.0  # Seconds re-read for transactions committed out of order
+
+# Per-event value columns summed into every aggregate
+STAT_COLUMNS = ("deliveries", "with_deadline", "on_time", "delay_minutes", "transit_hours")
+DELIVERIES, WITH_DEADLINE, ON_TIME, DELAY, TRANSIT = range(len(STAT_COLUMNS))
+
+FEATURE_NAMES = (
+    "lane_mean_delay", "lane_on_time_rate", "lane_transit_hours", "lane_deliveries",
+    "driver_mean_delay", "driver_on_time_rate", "driver_deliveries",
+    "week_mean_delay", "week_on_time_rate",
+)
+
+LOG_FIELDS = (
+    Shipment.id, Shipment.origin, Shipment.destination, Shipment.assigned_driver_id,
+    Shipment.pickup_time, Shipment.created_at, Shipment.delivery_deadline, Shipment.actual_delivery_time,
+)
+
+
+def lane_key(origin: Optional[str], destination: Optional[str]) -> str:
+    return f"{(origin or '').strip().lower()}|{(destination or '').strip().lower()}"
+
+
+def epoch(value) -> float:
+    if value is None:
+        return np.nan
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def week_hour(t: np.ndarray) -> np.ndarray:
+    """Hour of week (Monday 00:00 UTC = 0); -1 where t is missing"""
+    hours = np.floor(np.nan_to_num(t, nan=-1.0) / 3600.0)
+    return np.where(np.isnan(t), -1, (hours + 72) % WEEK_HOURS).astype(np.int64)  # Epoch day 0 was a Thursday
+
+
+def event_values(delay: np.ndarray, transit: np.ndarray) -> np.ndarray:
+    """Stat rows (n x STAT_COLUMNS) for delivered shipments; delay is NaN without a deadline"""
+    has_deadline = ~np.isnan(delay)
+    values = np.zeros((len(delay), len(STAT_COLUMNS)))
+    values[:, DELIVERIES] = 1.0
+    values[:, WITH_DEADLINE] = has_deadline
+    values[:, ON_TIME] = has_deadline & (np.nan_to_num(delay, nan=np.inf) <= ON_TIME_GRACE_MINUTES)
+    values[:, DELAY] = np.nan_to_num(delay)
+    values[:, TRANSIT] = np.nan_to_num(transit)
+    return values
+
+
+def derive(stats: np.ndarray, totals: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Smoothed (mean delay, on-time rate, transit hours) for stat rows given fleet totals rows"""
+    deadline_n = np.maximum(totals[:, WITH_DEADLINE], 1.0)
+    fleet_delay = totals[:, DELAY] / deadline_n
+    fleet_on_time = np.where(totals[:, WITH_DEADLINE] > 0, totals[:, ON_TIME] / deadline_n, 1.0)
+    fleet_transit = totals[:, TRANSIT] / np.maximum(totals[:, DELIVERIES], 1.0)
+    mean_delay = (stats[:, DELAY] + PRIOR_WEIGHT * fleet_delay) / (stats[:, WITH_DEADLINE] + PRIOR_WEIGHT)
+    on_time = (stats[:, ON_TIME] + PRIOR_WEIGHT * fleet_on_time) / (stats[:, WITH_DEADLINE] + PRIOR_WEIGHT)
+    transit = (stats[:, TRANSIT] + PRIOR_WEIGHT * fleet_transit) / (stats[:, DELIVERIES] + PRIOR_WEIGHT)
+    return mean_delay, on_time, transit
+
+
+def prefix_stats(keys: np.ndarray, times: np.ndarray, values: np.ndarray,
+                 query_keys: np.ndarray, query_times: np.ndarray) -> np.ndarray:
+    """Per query, the summed values of events with the same key recorded strictly before the query time"""
+    out = np.zeros((len(query_keys), values.shape[1]))
+    if not len(keys) or not len(query_keys):
+        return out
+    order = np.lexsort((times, keys))
+    keys, times, values = keys[order], times[order], values[order]
+    cumulative = np.vstack([np.zeros(values.shape[1]), np.cumsum(values, axis=0)])
+
+    # Sorting by (key, time) lets one searchsorted over key * span + offset find both group start and cutoff
+    origin, span = times.min(), times.max() - times.min() + 2.0
+    composite = keys * span + (times - origin)
+    offsets = np.clip(np.nan_to_num(query_times - origin, nan=0.0), 0.0, span - 1.0)
+    group_start = np.searchsorted(keys, query_keys, side="left")
+    cutoff = np.searchsorted(composite, query_keys * span + offsets, side="left")
+    sums = cumulative[cutoff] - cumulative[group_start]
+    sums[query_keys < 0] = 0.0  # Unknown driver / missing deadline: fall back to the fleet prior
+    return sums
+
+
+class FeatureStore:
+    """Incrementally maintained delivery aggregates with a point-in-time event log"""
+
+    def __init__(self, snapshot_path: Optional[str] = None):
+        self.snapshot_path = snapshot_path
+        self.lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.lane_index: Dict[str, int] = {}
+        self.driver_index: Dict[int, int] = {}
+        # Event log, one entry per delivered shipment
+        self.log: Dict[str, np.ndarray] = {
+            "shipment_id": np.zeros(0, dtype=np.int64),
+            "lane": np.zeros(0, dtype=np.int32),
+            "driver": np.zeros(0, dtype=np.int32),
+            "delivered_at": np.zeros(0),
+            "week_hour": np.zeros(0, dtype=np.int16),
+            "delay": np.zeros(0, dtype=np.float32),
+            "transit": np.zeros(0, dtype=np.float32),
+        }
+        self.lane_stats = np.zeros((0, len(STAT_COLUMNS)))
+        self.driver_stats = np.zeros((0, len(STAT_COLUMNS)))
+        self.week_stats = np.zeros((WEEK_HOURS, len(STAT_COLUMNS)))
+        self.totals = np.zeros(len(STAT_COLUMNS))
+        self.watermark: Optional[float] = None  # Latest updated_at seen, as epoch seconds
+        self.refreshed_at = 0.0
+        self.loaded = False
+
+    # Writes
+
+    def _key_ids(self, index: Dict[Any, int], keys: List[Any]) -> np.ndarray:
+        ids = np.empty(len(keys), dtype=np.int32)
+        for i, key in enumerate(keys):
+            if key is None:
+                ids[i] = -1
+                continue
+            if key not in index:
+                index[key] = len(index)
+            ids[i] = index[key]
+        return ids
+
+    def add(self, rows: List[Any]) -> int:
+        """Fold newly delivered shipments (LOG_FIELDS rows) into the log and aggregates"""
+        with self.lock:
+            ids = np.array([r.id for r in rows], dtype=np.int64)
+            fresh = ~np.isin(ids, self.log["shipment_id"])
+            rows = [r for r, keep in zip(rows, fresh) if keep]
+            if not rows:
+                return 0
+
+            delivered = np.array([epoch(r.actual_delivery_time) for r in rows])
+            deadline = np.array([epoch(r.delivery_deadline) for r in rows])
+            start = np.array([epoch(r.pickup_time or r.created_at) for r in rows])
+            entries = {
+                "shipment_id": ids[fresh],
+                "lane": self._key_ids(self.lane_index, [lane_key(r.origin, r.destination) for r in rows]),
+                "driver": self._key_ids(self.driver_index, [r.assigned_driver_id for r in rows]),
+                "delivered_at": delivered,
+                "week_hour": week_hour(deadline).astype(np.int16),
+                "delay": ((delivered - deadline) / 60.0).astype(np.float32),
+                "transit": np.maximum((delivered - start) / 3600.0, 0.0).astype(np.float32),
+            }
+            self._append(entries)
+            return len(rows)
+
+    def _append(self, entries: Dict[str, np.ndarray]):
+        self.log = {name: np.concatenate([self.log[name], entries[name]]) for name in self.log}
+        self._accumulate(entries)
+
+    def _accumulate(self, entries: Dict[str, np.ndarray]):
+        values = event_values(entries["delay"].astype(float), entries["transit"].astype(float))
+        # Build new arrays and swap them in so concurrent readers never see a half-applied batch
+        lane_stats = np.zeros((len(self.lane_index), len(STAT_COLUMNS)))
+        lane_stats[:len(self.lane_stats)] = self.lane_stats
+        np.add.at(lane_stats, entries["lane"], values)
+        driver_stats = np.zeros((len(self.driver_index), len(STAT_COLUMNS)))
+        driver_stats[:len(self.driver_stats)] = self.driver_stats
+        known = entries["driver"] >= 0
+        np.add.at(driver_stats, entries["driver"][known], values[known])
+        week_stats = self.week_stats.copy()
+        timed = entries["week_hour"] >= 0
+        np.add.at(week_stats, entries["week_hour"][timed].astype(np.int64), values[timed])
+        self.lane_stats, self.driver_stats, self.week_stats = lane_stats, driver_stats, week_stats
+        self.totals = self.totals + values.sum(axis=0)
+
+    def refresh(self) -> int:
+        """Pull shipments delivered since the last refresh; the first call scans all history"""
+        self.load()
+        db = SessionLocal()
+        try:
+            query = db.query(*LOG_FIELDS, Shipment.updated_at).filter(
+                Shipment.status == "delivered", Shipment.actual_delivery_time.isnot(None)
+            )
+            if self.watermark is not None:
+                since = datetime.fromtimestamp(self.watermark - REFRESH_OVERLAP, timezone.utc)
+                query = query.filter(Shipment.updated_at >= since)
+            rows = query.all()
+        finally:
+            db.close()
+
+        added = self.add(rows)
+        stamps = [epoch(r.updated_at) for r in rows if r.updated_at is not None]
+        if stamps:
+            self.watermark = max(stamps + [self.watermark or 0.0])
+        self.refreshed_at = time.time()
+        if added:
+            self.save()
+        return added
+
+    # Online lookup
+
+    def lookup(self, lanes: List[str], driver_ids: List[Optional[int]], deadlines: np.ndarray) -> Dict[str, np.ndarray]:
+        """Current aggregate features for shipments, one row per input"""
+        lane_ids = np.array([self.lane_index.get(lane, -1) for lane in lanes], dtype=np.int64)
+        driver_ids = np.array([-1 if d is None else self.driver_index.get(d, -1) for d in driver_ids], dtype=np.int64)
+        return self._features(
+            self._rows(self.lane_stats, lane_ids),
+            self._rows(self.driver_stats, driver_ids),
+            self._rows(self.week_stats, week_hour(np.asarray(deadlines, dtype=float))),
+            np.tile(self.totals, (len(lane_ids), 1)),
+        )
+
+    @staticmethod
+    def _rows(stats: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        out = np.zeros((len(ids), len(STAT_COLUMNS)))
+        known = (ids >= 0) & (ids < len(stats))
+        out[known] = stats[ids[known]]
+        return out
+
+    @staticmethod
+    def _features(lane: np.ndarray, driver: np.ndarray, week: np.ndarray, totals: np.ndarray) -> Dict[str, np.ndarray]:
+        lane_delay, lane_on_time, lane_transit = derive(lane, totals)
+        driver_delay, driver_on_time, _ = derive(driver, totals)
+        week_delay, week_on_time, _ = derive(week, totals)
+        return {
+            "lane_mean_delay": lane_delay,
+            "lane_on_time_rate": lane_on_time,
+            "lane_transit_hours": lane_transit,
+            "lane_deliveries": lane[:, DELIVERIES],
+            "driver_mean_delay": driver_delay,
+            "driver_on_time_rate": driver_on_time,
+            "driver_deliveries": driver[:, DELIVERIES],
+            "week_mean_delay": week_delay,
+            "week_on_time_rate": week_on_time,
+        }
+
+    # Offline / point-in-time
+
+    def as_of(self, lanes: List[str], driver_ids: List[Optional[int]], deadlines: np.ndarray,
+              at: np.ndarray) -> Dict[str, np.ndarray]:
+        """Features as they were at each time in `at`, using only shipments delivered before it"""
+        log = self.log
+        values = event_values(log["delay"].astype(float), log["transit"].astype(float))
+        at = np.asarray(at, dtype=float)
+        lane_ids = np.array([self.lane_index.get(lane, -1) for lane in lanes], dtype=np.int64)
+        driver_ids = np.array([-1 if d is None else self.driver_index.get(d, -1) for d in driver_ids], dtype=np.int64)
+        week_ids = week_hour(np.asarray(deadlines, dtype=float))
+        none = np.full(len(at), -1, dtype=np.int64)
+        return self._features(
+            prefix_stats(log["lane"].astype(np.int64), log["delivered_at"], values, lane_ids, at),
+            prefix_stats(log["driver"].astype(np.int64), log["delivered_at"], values, driver_ids, at),
+            prefix_stats(log["week_hour"].astype(np.int64), log["delivered_at"], values, week_ids, at),
+            prefix_stats(np.zeros(len(values), dtype=np.int64), log["delivered_at"], values, np.zeros_like(none), at),
+        )
+
+    def training_set(self, db, *columns) -> Tuple[List[Any], Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """Delivered shipments with point-in-time features and labels.
+
+        Features are evaluated at each shipment's start (pickup, else creation) so no
+        outcome that was unknown at prediction time leaks into its row. Extra ORM
+        columns are returned on the rows for model-specific features.
+        """
+        self.refresh()
+        rows = db.query(*LOG_FIELDS, *columns).filter(
+            Shipment.status == "delivered", Shipment.actual_delivery_time.isnot(None)
+        ).order_by(Shipment.id).all()
+        start = np.array([epoch(r.pickup_time or r.created_at) for r in rows])
+        deadline = np.array([epoch(r.delivery_deadline) for r in rows])
+        delivered = np.array([epoch(r.actual_delivery_time) for r in rows])
+        features = self.as_of(
+            [lane_key(r.origin, r.destination) for r in rows], [r.assigned_driver_id for r in rows], deadline, start
+        )
+        labels = {
+            "delay_minutes": (delivered - deadline) / 60.0,
+            "on_time": (delivered - deadline) / 60.0 <= ON_TIME_GRACE_MINUTES,
+            "transit_hours": (delivered - start) / 3600.0,
+        }
+        return rows, features, labels
+
+    # Persistence
+
+    def save(self):
+        if not self.snapshot_path:
+            return
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        staging = f"{self.snapshot_path}.tmp.npz"
+        with self.lock:
+            lanes = sorted(self.lane_index, key=self.lane_index.get)
+            drivers = sorted(self.driver_index, key=self.driver_index.get)
+            np.savez(
+                staging,
+                lanes=np.array(lanes, dtype=str),
+                drivers=np.array(drivers, dtype=np.int64),
+                watermark=np.array(np.nan if self.watermark is None else self.watermark),
+                **{f"log_{name}": column for name, column in self.log.items()},
+            )
+        os.replace(staging, self.snapshot_path)
+
+    def load(self):
+        """Restore the event log from the last snapshot and rebuild aggregates (once).
+
+        Concurrent callers wait for the restore, so none of them refreshes on top of a half-loaded store.
+        """
+        if self.loaded:
+            return
+        with self._load_lock:
+            if self.loaded:
+                return
+            try:
+                self._restore()
+            finally:
+                self.loaded = True
+
+    def _restore(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with np.load(self.snapshot_path) as data:
+                lanes, drivers = data["lanes"].tolist(), data["drivers"].tolist()
+                log = {name: data[f"log_{name}"] for name in self.log}
+                watermark = float(data["watermark"])
+        except Exception as e:
+            logger.warning(f"Could not load feature store snapshot {self.snapshot_path}: {e}")
+            return
+        with self.lock:
+            self.lane_index = {lane: i for i, lane in enumerate(lanes)}
+            self.driver_index = {driver: i for i, driver in enumerate(drivers)}
+            self.log = log
+            # Aggregates from the restored log alone, never on top of whatever is in memory
+            self.lane_stats = np.zeros((0, len(STAT_COLUMNS)))
+            self.driver_stats = np.zeros((0, len(STAT_COLUMNS)))
+            self.week_stats = np.zeros((WEEK_HOURS, len(STAT_COLUMNS)))
+            self.totals = np.zeros(len(STAT_COLUMNS))
+            self._accumulate(log)
+            self.watermark = None if np.isnan(watermark) else watermark
+        logger.info(f"Feature store restored {len(log['shipment_id'])} deliveries from snapshot")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "deliveries": int(len(self.log["shipment_id"])),
+            "lanes": len(self.lane_index),
+            "drivers": len(self.driver_index),
+            "fleet_on_time_rate": round(float(self.totals[ON_TIME] / self.totals[WITH_DEADLINE]), 3)
+            if self.totals[WITH_DEADLINE] else None,
+            "refreshed_at": self.refreshed_at or None,
+        }
+
+    async def run(self, interval: float):
+        """Background loop: catch up on newly delivered shipments"""
+        while True:
+            try:
+                added = await run_in_threadpool(self.refresh)
+                if added:
+                    logger.info(f"Feature store added {added} delivered shipments")
+            except Exception as e:
+                logger.error(f"Feature store refresh failed: {e}")
+            await asyncio.sleep(interval)
+
+
+feature_store = FeatureStore(os.path.join(settings.model_dir, "feature_store.npz"))
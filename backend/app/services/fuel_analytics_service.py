@@ -0,0 +1,303 @@
+"""
+Fuel efficiency analytics for the fleet.
+Keeps fuel records in per-truck NumPy columns that are extended incrementally
+as new FuelRecord rows arrive, and derives MPG, rolling MPG, cost per mile,
+monthly cost trends and outlier fill-ups from them.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from sqlalchemy import or_
+
+from ..models.base import SessionLocal
+from ..models.tables import FuelRecord
+
+logger = logging.getLogger(__name__)
+
+ROLLING_WINDOW = 5  # Fill-ups in the rolling MPG average
+MIN_FILLS_FOR_OUTLIERS = 5
+OUTLIER_Z = 3.5  # Modified z-score threshold (Iglewicz and Hoaglin)
+GAP_RECHECK_SECONDS = 300.0  # How long ids skipped below the high-water mark are re-read (uncommitted inserts)
+MAX_TRACKED_GAPS = 10000
+
+
+def _epoch(value: Optional[datetime]) -> float:
+    if value is None:
+        return np.nan
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _iso(epoch: float) -> Optional[str]:
+    return None if np.isnan(epoch) else datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+def _round(value: float, digits: int = 2) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+class TruckFuelSeries:
+    """Columnar fuel history of one truck plus the metrics derived from it"""
+
+    COLUMNS = ("record_id", "fueled_at", "mileage", "gallons", "total_cost")
+
+    def __init__(self, truck_id: int):
+        self.truck_id = truck_id
+        self.data = {name: np.zeros(0) for name in self.COLUMNS}
+        self.summary: Dict[str, Any] = {}
+
+    def extended(self, rows: np.ndarray) -> "TruckFuelSeries":
+        """New series with records (shape [n, 5] in COLUMNS order) appended; this one is left untouched"""
+        series = TruckFuelSeries(self.truck_id)
+        series.data = {name: np.concatenate([self.data[name], rows[:, i]]) for i, name in enumerate(self.COLUMNS)}
+        # Late-arriving fills with earlier timestamps keep the series time ordered
+        order = np.lexsort((series.data["record_id"], series.data["fueled_at"]))
+        if not np.array_equal(order, np.arange(len(order))):
+            series.data = {name: column[order] for name, column in series.data.items()}
+        series._recompute()
+        return series
+
+    def _recompute(self):
+        d = self.data
+        n = len(d["record_id"])
+        miles = np.full(n, np.nan)
+        if n > 1:
+            miles[1:] = np.diff(d["mileage"])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            valid = (miles > 0) & (d["gallons"] > 0)
+            self.mpg = np.where(valid, miles / d["gallons"], np.nan)
+            self.cost_per_mile = np.where(valid, d["total_cost"] / miles, np.nan)
+        self.miles = miles
+
+        # Rolling mean over the last ROLLING_WINDOW valid MPG readings, via cumulative sums
+        filled = np.nan_to_num(self.mpg)
+        counts = np.cumsum(valid)
+        sums = np.cumsum(filled)
+        valid_positions = np.flatnonzero(valid)
+        rolling = np.full(n, np.nan)
+        if len(valid_positions):
+            k = np.minimum(counts[valid_positions], ROLLING_WINDOW)
+            start_rank = counts[valid_positions] - k  # number of valid readings before the window
+            window_start = np.where(start_rank > 0, valid_positions[np.maximum(start_rank - 1, 0)], -1)
+            prior = np.where(window_start >= 0, sums[np.maximum(window_start, 0)], 0.0)
+            rolling[valid_positions] = (sums[valid_positions] - prior) / k
+        self.rolling_mpg = rolling
+
+        self.flags = self._detect_outliers(valid, miles)
+
+        total_miles = np.nansum(np.where(valid, miles, np.nan))
+        valid_gallons = float(d["gallons"][valid].sum())
+        recent = rolling[valid_positions[-1]] if len(valid_positions) else np.nan
+        self.summary = {
+            "truck_id": self.truck_id,
+            "fill_ups": n,
+            "total_gallons": _round(d["gallons"].sum()),
+            "total_cost": _round(d["total_cost"].sum()),
+            "miles_tracked": _round(total_miles, 1),
+            "avg_mpg": _round(total_miles / valid_gallons) if valid_gallons > 0 else None,
+            "rolling_mpg": _round(recent),
+            "cost_per_mile": _round(np.nansum(np.where(valid, d["total_cost"], 0.0)) / total_miles, 3)
+            if total_miles > 0 else None,
+            "anomalies": int(sum(1 for flag in self.flags if flag)),
+            "last_fueled_at": _iso(d["fueled_at"][-1]) if n else None,
+        }
+
+    def _detect_outliers(self, valid: np.ndarray, miles: np.ndarray) -> List[Optional[str]]:
+        flags: List[Optional[str]] = [None] * len(valid)
+        # Fuel bought while the odometer did not move
+        for i in np.flatnonzero((miles <= 0) & (self.data["gallons"] > 0)):
+            flags[i] = "fuel_without_mileage"
+
+        if valid.sum() >= MIN_FILLS_FOR_OUTLIERS:
+            readings = self.mpg[valid]
+            median = np.median(readings)
+            deviation = np.abs(readings - median)
+            mad = np.median(deviation)
+            # Fall back to the mean absolute deviation when most readings are identical
+            scale = 0.6745 / mad if mad > 0 else 1 / (1.253314 * deviation.mean()) if deviation.any() else 0.0
+            if scale:
+                z = (self.mpg - median) * scale
+                with np.errstate(invalid="ignore"):
+                    for i in np.flatnonzero(z < -OUTLIER_Z):
+                        flags[i] = "low_mpg_possible_leak_or_theft"
+                    for i in np.flatnonzero(z > OUTLIER_Z):
+                        flags[i] = "high_mpg_check_odometer"
+        return flags
+
+    def anomalies(self) -> List[Dict[str, Any]]:
+        d = self.data
+        return [
+            {
+                "truck_id": self.truck_id,
+                "fuel_record_id": int(d["record_id"][i]),
+                "fueled_at": _iso(d["fueled_at"][i]),
+                "gallons": _round(d["gallons"][i]),
+                "miles": _round(self.miles[i], 1),
+                "mpg": _round(self.mpg[i]),
+                "rolling_mpg": _round(self.rolling_mpg[i - 1]) if i > 0 else None,
+                "reason": flag,
+            }
+            for i, flag in enumerate(self.flags) if flag
+        ]
+
+    def series(self) -> Dict[str, Any]:
+        """Compact column arrays for charting one truck"""
+        d = self.data
+        return {
+            "truck_id": self.truck_id,
+            "fuel_record_id": d["record_id"].astype(int).tolist(),
+            "fueled_at": [_iso(t) for t in d["fueled_at"]],
+            "mpg": [_round(v) for v in self.mpg],
+            "rolling_mpg": [_round(v) for v in self.rolling_mpg],
+            "cost_per_mile": [_round(v, 3) for v in self.cost_per_mile],
+            "flags": self.flags,
+        }
+
+
+class FuelAnalyticsCache:
+    """Fleet fuel analytics kept up to date from a FuelRecord.id high-water mark.
+
+    Ids are assigned before commit, so a record can become visible after a higher id was read.
+    Ids skipped below the mark are remembered and re-read for GAP_RECHECK_SECONDS.
+
+    sync() runs in a worker thread while requests read on the event loop, so it builds new
+    series and a new trucks dict and swaps them in; readers take self.trucks once and never
+    see a series whose data and metrics disagree.
+    """
+
+    def __init__(self, sync_interval: float = 5.0):
+        self.sync_interval = sync_interval
+        self.trucks: Dict[int, TruckFuelSeries] = {}
+        self.last_record_id = 0
+        self.gaps: Dict[int, float] = {}  # Unseen id below last_record_id -> when it was first skipped
+        self.last_sync = 0.0
+        self._ranked: Optional[Dict[tuple, List[Dict[str, Any]]]] = None
+        self._thread_lock = threading.Lock()
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        """Force a sync on the next read, e.g. right after a fuel record is created"""
+        self.last_sync = 0.0
+
+    def sync(self) -> int:
+        """Load fuel records newer than the high-water mark; returns how many arrived"""
+        with self._thread_lock:
+            db = SessionLocal()
+            try:
+                newer = FuelRecord.id > self.last_record_id
+                rows = db.query(
+                    FuelRecord.truck_id, FuelRecord.id, FuelRecord.fueled_at, FuelRecord.mileage_at_fueling,
+                    FuelRecord.fuel_amount, FuelRecord.total_cost
+                ).filter(or_(newer, FuelRecord.id.in_(list(self.gaps))) if self.gaps else newer).order_by(FuelRecord.id).all()
+            finally:
+                db.close()
+            now = time.time()
+            self._track_gaps([r[1] for r in rows], now)
+            if not rows:
+                self.last_sync = now
+                return 0
+
+            truck_ids = np.array([r[0] for r in rows], dtype=np.int64)
+            values = np.array([
+                (r[1], _epoch(r[2]), np.nan if r[3] is None else r[3], r[4], r[5]) for r in rows
+            ], dtype=float)
+            order = np.argsort(truck_ids, kind="stable")
+            truck_ids, values = truck_ids[order], values[order]
+            boundaries = np.flatnonzero(np.diff(truck_ids)) + 1
+            trucks = dict(self.trucks)
+            for group in np.split(np.arange(len(truck_ids)), boundaries):
+                truck_id = int(truck_ids[group[0]])
+                trucks[truck_id] = (trucks.get(truck_id) or TruckFuelSeries(truck_id)).extended(values[group])
+
+            self.trucks = trucks
+            self._ranked = None
+            self.last_sync = now
+            return len(rows)
+
+    def _track_gaps(self, ids: List[int], now: float):
+        """Forget gaps that were filled or are too old (rolled back), record new ones, advance the mark"""
+        for record_id in ids:
+            self.gaps.pop(record_id, None)
+        self.gaps = {record_id: seen for record_id, seen in self.gaps.items() if now - seen < GAP_RECHECK_SECONDS}
+        if not ids or ids[-1] <= self.last_record_id:
+            return
+        found = set(ids)
+        lowest = max(self.last_record_id + 1, ids[-1] - MAX_TRACKED_GAPS - len(ids))
+        skipped = [i for i in range(lowest, ids[-1]) if i not in found][-MAX_TRACKED_GAPS:]
+        for record_id in skipped:
+            self.gaps[record_id] = now
+        self.last_record_id = ids[-1]
+
+    async def ensure_fresh(self):
+        if time.time() - self.last_sync < self.sync_interval:
+            return
+        async with self._lock:
+            if time.time() - self.last_sync >= self.sync_interval:
+                added = await run_in_threadpool(self.sync)
+                if added:
+                    logger.info(f"Fuel analytics absorbed {added} new fuel records")
+
+    def fleet_summary(
+        self, skip: int = 0, limit: int = 100, sort: str = "cost_per_mile", descending: bool = True
+    ) -> Dict[str, Any]:
+        """Per-truck summaries, sorted by one metric with missing values last"""
+        # Cache first, then trucks: a sync swapping both in between only leaves a result in a discarded cache
+        cache = self._ranked
+        if cache is None:
+            cache = self._ranked = {}
+        trucks = self.trucks
+        ranked = cache.get((sort, descending))
+        if ranked is None:
+            sign = -1 if descending else 1
+            ranked = cache[(sort, descending)] = sorted(
+                (series.summary for series in trucks.values()),
+                key=lambda s: (s[sort] is None, sign * (s[sort] or 0)),
+            )
+        return {"trucks": ranked[skip:skip + limit], "total": len(ranked)}
+
+    def truck_series(self, truck_id: int) -> Optional[Dict[str, Any]]:
+        series = self.trucks.get(truck_id)
+        if series is None:
+            return None
+        return {"summary": series.summary, "series": series.series(), "anomalies": series.anomalies()}
+
+    def anomalies(self, skip: int = 0, limit: int = 100) -> Dict[str, Any]:
+        found = [a for series in self.trucks.values() if series.summary["anomalies"] for a in series.anomalies()]
+        found.sort(key=lambda a: a["fueled_at"] or "", reverse=True)
+        return {"anomalies": found[skip:skip + limit], "total": len(found)}
+
+    def cost_trend(self) -> Dict[str, Any]:
+        """Fleet fuel spend, gallons and average price per calendar month"""
+        trucks = list(self.trucks.values())
+        if not trucks:
+            return {"months": [], "total_cost": [], "gallons": [], "avg_price_per_gallon": []}
+        fueled_at = np.concatenate([s.data["fueled_at"] for s in trucks])
+        cost = np.concatenate([s.data["total_cost"] for s in trucks])
+        gallons = np.concatenate([s.data["gallons"] for s in trucks])
+        known = ~np.isnan(fueled_at)
+        months = fueled_at[known].astype("datetime64[s]").astype("datetime64[M]")
+        labels, index = np.unique(months, return_inverse=True)
+        month_cost = np.bincount(index, weights=cost[known])
+        month_gallons = np.bincount(index, weights=gallons[known])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            price = np.where(month_gallons > 0, month_cost / month_gallons, np.nan)
+        return {
+            "months": [str(label) for label in labels],
+            "total_cost": [_round(v) for v in month_cost],
+            "gallons": [_round(v) for v in month_gallons],
+            "avg_price_per_gallon": [_round(v, 3) for v in price],
+        }
+
+
+SORTABLE_FIELDS = ("cost_per_mile", "avg_mpg", "rolling_mpg", "total_cost", "total_gallons", "anomalies")
+
+fuel_analytics = FuelAnalyticsCache()
@@ -0,0 +1,387 @@
+"""
+Geofence engine for automatic delivery events.
+Circle and polygon fences around origins, destinations and depots are held in
+an in-memory grid index. Each flushed telemetry batch is matched against it
+with NumPy (grid lookup, then exact circle/polygon tests), per-truck
+enter/exit transitions are debounced, and confirmed transitions become
+DeliveryEvent rows for the shipments on that truck.
+"""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from sqlalchemy.exc import IntegrityError
+
+from ..models.base import SessionLocal
+from ..models.tables import DeliveryEvent, Geofence, Shipment
+
+logger = logging.getLogger(__name__)
+
+GRID_DEGREES = 0.1  # Index cell size (~11 km of latitude)
+DEBOUNCE_SECONDS = 60.0  # A crossing must hold this long before it counts
+METERS_PER_DEGREE = 111320.0
+ACTIVE_STATUSES = ("assigned", "in_transit")
+FENCE_KINDS = ("origin", "destination", "depot")
+MAX_UNRECORDED = 10000  # DeliveryEvent rows kept for retry while writes fail
+
+# DeliveryEvent.event_type written for each fence kind and transition
+EVENT_TYPES = {
+    ("origin", "enter"): "pickup",
+    ("origin", "exit"): "in_transit",
+    ("destination", "enter"): "arrival",
+    ("destination", "exit"): "departure",
+    ("depot", "enter"): "depot_arrival",
+    ("depot", "exit"): "depot_departure",
+}
+
+
+def _cell_key(iy, ix):
+    """Grid cell id; works on scalars and NumPy arrays"""
+    return (iy + 1000) * 10000 + (ix + 2000)
+
+
+def fence_bounds(fence: Dict[str, Any]) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lng, max_lat, max_lng) of a fence"""
+    if fence["shape"] == "polygon":
+        lats = [p[0] for p in fence["polygon"]]
+        lngs = [p[1] for p in fence["polygon"]]
+        return min(lats), min(lngs), max(lats), max(lngs)
+    dlat = fence["radius_m"] / METERS_PER_DEGREE
+    dlng = fence["radius_m"] / (METERS_PER_DEGREE * max(math.cos(math.radians(fence["center_lat"])), 0.01))
+    return fence["center_lat"] - dlat, fence["center_lng"] - dlng, fence["center_lat"] + dlat, fence["center_lng"] + dlng
+
+
+def points_in_polygon(lat: np.ndarray, lng: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """Vectorized even-odd ray casting in the lat/lng plane (fine at geofence scale)"""
+    inside = np.zeros(len(lat), dtype=bool)
+    y1, x1 = polygon[-1]
+    for y2, x2 in polygon:
+        crosses = (y1 > lat) != (y2 > lat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at = x1 + (lat - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (lng < x_at)
+        y1, x1 = y2, x2
+    return inside
+
+
+class GeofenceIndex:
+    """Immutable grid index over a set of fences"""
+
+    def __init__(self, fences: List[Dict[str, Any]], shipment_trucks: Optional[Dict[int, int]] = None):
+        shipment_trucks = shipment_trucks or {}
+        self.fences = fences
+        n = len(fences)
+        self.ids = np.array([f["id"] for f in fences], dtype=np.int64)
+        self.is_circle = np.array([f["shape"] != "polygon" for f in fences], dtype=bool)
+        self.center_lat = np.array([f.get("center_lat") or 0.0 for f in fences], dtype=float)
+        self.center_lng = np.array([f.get("center_lng") or 0.0 for f in fences], dtype=float)
+        self.radius = np.array([f.get("radius_m") or 0.0 for f in fences], dtype=float)
+        self.polygons = {
+            row: np.asarray(f["polygon"], dtype=float) for row, f in enumerate(fences) if f["shape"] == "polygon"
+        }
+        # Shipment-bound fences only apply to the truck carrying that shipment (-2: not on a truck yet)
+        self.truck_filter = np.array([
+            -1 if not f.get("shipment_id") else shipment_trucks.get(f["shipment_id"], -2) for f in fences
+        ], dtype=np.int64)
+
+        keys, rows = [], []
+        for row, fence in enumerate(fences):
+            min_lat, min_lng, max_lat, max_lng = fence_bounds(fence)
+            for iy in range(math.floor(min_lat / GRID_DEGREES), math.floor(max_lat / GRID_DEGREES) + 1):
+                for ix in range(math.floor(min_lng / GRID_DEGREES), math.floor(max_lng / GRID_DEGREES) + 1):
+                    keys.append(_cell_key(iy, ix))
+                    rows.append(row)
+        order = np.argsort(np.array(keys, dtype=np.int64), kind="stable") if keys else np.zeros(0, dtype=np.int64)
+        self.cell_keys = np.array(keys, dtype=np.int64)[order]
+        self.cell_rows = np.array(rows, dtype=np.int64)[order]
+        self.size = n
+
+    def match(self, truck_ids: np.ndarray, lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(point index, fence row) for every point inside a fence that applies to its truck"""
+        if not self.size or not len(lat):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        keys = _cell_key(np.floor(lat / GRID_DEGREES).astype(np.int64), np.floor(lng / GRID_DEGREES).astype(np.int64))
+        lo = np.searchsorted(self.cell_keys, keys, side="left")
+        counts = np.searchsorted(self.cell_keys, keys, side="right") - lo
+        total = int(counts.sum())
+        if not total:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        points = np.repeat(np.arange(len(lat)), counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = self.cell_rows[np.repeat(lo, counts) + offsets]
+
+        applies = (self.truck_filter[rows] == -1) | (self.truck_filter[rows] == truck_ids[points])
+        points, rows = points[applies], rows[applies]
+
+        inside = np.zeros(len(points), dtype=bool)
+        circle = self.is_circle[rows]
+        if circle.any():
+            p, r = points[circle], rows[circle]
+            dy = (lat[p] - self.center_lat[r]) * METERS_PER_DEGREE
+            dx = (lng[p] - self.center_lng[r]) * METERS_PER_DEGREE * np.cos(np.radians(self.center_lat[r]))
+            inside[circle] = dx * dx + dy * dy <= self.radius[r] ** 2
+        if (~circle).any():
+            polygon_pairs = np.flatnonzero(~circle)
+            for row in np.unique(rows[polygon_pairs]):
+                pairs = polygon_pairs[rows[polygon_pairs] == row]
+                inside[pairs] = points_in_polygon(lat[points[pairs]], lng[points[pairs]], self.polygons[int(row)])
+        return points[inside], rows[inside]
+
+
+class TruckFenceState:
+    """Confirmed fences a truck is inside, plus crossings waiting out the debounce"""
+
+    __slots__ = ("inside", "pending", "last_t")
+
+    def __init__(self):
+        self.inside: Set[int] = set()
+        self.pending: Dict[int, Tuple[bool, float]] = {}  # fence id -> (entering?, first seen)
+        self.last_t = -math.inf
+
+    def update(self, t: float, current: Set[int], debounce: float) -> List[Tuple[int, str]]:
+        for fence_id in current - self.inside:
+            if self.pending.get(fence_id, (False,))[0] is not True:
+                self.pending[fence_id] = (True, t)
+        for fence_id in self.inside - current:
+            if self.pending.get(fence_id, (True,))[0] is not False:
+                self.pending[fence_id] = (False, t)
+        transitions = []
+        for fence_id, (entering, since) in list(self.pending.items()):
+            if (fence_id in current) != entering:
+                del self.pending[fence_id]  # Bounced back across the boundary
+            elif t - since >= debounce:
+                del self.pending[fence_id]
+                if entering:
+                    self.inside.add(fence_id)
+                else:
+                    self.inside.discard(fence_id)
+                transitions.append((fence_id, "enter" if entering else "exit"))
+        self.last_t = t
+        return transitions
+
+
+class GeofenceEngine:
+    """Matches telemetry against fences and emits debounced enter/exit events"""
+
+    def __init__(self, debounce_seconds: float = DEBOUNCE_SECONDS, refresh_interval: float = 60.0):
+        self.debounce_seconds = debounce_seconds
+        self.refresh_interval = refresh_interval
+        self.index = GeofenceIndex([])
+        self.fences_by_id: Dict[int, Dict[str, Any]] = {}
+        self.truck_shipments: Dict[int, List[Dict[str, Any]]] = {}
+        self.states: Dict[int, TruckFenceState] = {}
+        self.loaded_at = 0.0
+        self.stats = {"points_checked": 0, "fence_hits": 0, "transitions": 0, "events_written": 0,
+                      "record_errors": 0, "last_batch_ms": 0.0}
+        # Rows for transitions the fence states already applied whose write failed, oldest first
+        self.unrecorded: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Reload fences before the next batch, e.g. after fence CRUD"""
+        self.loaded_at = 0.0
+
+    def refresh(self):
+        """Rebuild the index from active fences and the truck -> active shipment map"""
+        db = SessionLocal()
+        try:
+            fences = [
+                {
+                    "id": f.id, "name": f.name, "kind": f.kind, "shape": f.shape,
+                    "center_lat": f.center_lat, "center_lng": f.center_lng, "radius_m": f.radius_m,
+                    "polygon": f.polygon, "location": f.location, "shipment_id": f.shipment_id,
+                }
+                for f in db.query(Geofence).filter(Geofence.active == True).all()  # noqa: E712
+            ]
+            shipments = db.query(
+                Shipment.id, Shipment.assigned_truck_id, Shipment.origin, Shipment.destination
+            ).filter(Shipment.status.in_(ACTIVE_STATUSES), Shipment.assigned_truck_id.isnot(None)).all()
+        finally:
+            db.close()
+
+        truck_shipments: Dict[int, List[Dict[str, Any]]] = {}
+        for shipment_id, truck_id, origin, destination in shipments:
+            truck_shipments.setdefault(truck_id, []).append({
+                "id": shipment_id,
+                "origin": (origin or "").strip().lower(),
+                "destination": (destination or "").strip().lower(),
+            })
+        index = GeofenceIndex(fences, {s[0]: s[1] for s in shipments})
+        with self._lock:
+            self.index = index
+            self.fences_by_id = {f["id"]: f for f in fences}
+            self.truck_shipments = truck_shipments
+            for state in self.states.values():
+                state.inside &= self.fences_by_id.keys()
+                for fence_id in [f for f in state.pending if f not in self.fences_by_id]:
+                    del state.pending[fence_id]
+            self.loaded_at = time.time()
+
+    def process(self, samples: List[tuple]) -> List[Dict[str, Any]]:
+        """Match (truck_id, recorded_at, lat, lng, temperature) samples; returns confirmed transitions"""
+        if time.time() - self.loaded_at >= self.refresh_interval:
+            self.refresh()
+        started = time.perf_counter()
+        positioned = [s for s in samples if s[2] is not None and s[3] is not None]
+        if not positioned:
+            return []
+        positioned.sort(key=lambda s: (s[0], s[1]))
+        truck_ids = np.fromiter((s[0] for s in positioned), dtype=np.int64, count=len(positioned))
+        lat = np.fromiter((s[2] for s in positioned), dtype=float, count=len(positioned))
+        lng = np.fromiter((s[3] for s in positioned), dtype=float, count=len(positioned))
+
+        events = []
+        with self._lock:
+            index = self.index
+            points, rows = index.match(truck_ids, lat, lng)
+            hits: Dict[int, Set[int]] = {}
+            for point, fence_id in zip(points.tolist(), index.ids[rows].tolist()):
+                hits.setdefault(point, set()).add(fence_id)
+
+            # Only trucks touching a fence now, or with fence state to resolve, need the sequential pass
+            hit_trucks = set(truck_ids[points].tolist())
+            busy = {truck_id for truck_id, state in self.states.items() if state.inside or state.pending}
+            relevant = hit_trucks | busy
+            empty: Set[int] = set()
+            for i, sample in enumerate(positioned):
+                truck_id = sample[0]
+                if truck_id not in relevant:
+                    continue
+                state = self.states.get(truck_id)
+                if state is None:
+                    state = self.states[truck_id] = TruckFenceState()
+                t = _epoch(sample[1])
+                if t <= state.last_t:
+                    continue  # Late or repeated reading
+                for fence_id, transition in state.update(t, hits.get(i, empty), self.debounce_seconds):
+                    events.append({
+                        "truck_id": truck_id, "fence_id": fence_id, "transition": transition,
+                        "at": t, "lat": sample[2], "lng": sample[3],
+                    })
+            for truck_id in [t for t in relevant if not (self.states[t].inside or self.states[t].pending)]:
+                del self.states[truck_id]
+
+            self.stats["points_checked"] += len(positioned)
+            self.stats["fence_hits"] += len(points)
+            self.stats["transitions"] += len(events)
+            self.stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return events
+
+    def delivery_events(self, transitions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Expand fence transitions into DeliveryEvent rows for the affected shipments"""
+        rows = []
+        for transition in transitions:
+            fence = self.fences_by_id.get(transition["fence_id"])
+            if fence is None:
+                continue
+            location = (fence["location"] or "").strip().lower()
+            for shipment in self.truck_shipments.get(transition["truck_id"], []):
+                if fence["shipment_id"]:
+                    applies = fence["shipment_id"] == shipment["id"]
+                elif fence["kind"] == "depot":
+                    applies = True
+                else:
+                    applies = bool(location) and shipment[fence["kind"]] == location
+                if not applies:
+                    continue
+                rows.append({
+                    "shipment_id": shipment["id"],
+                    "event_type": EVENT_TYPES[(fence["kind"], transition["transition"])],
+                    "timestamp": datetime.fromtimestamp(transition["at"], timezone.utc),
+                    "location": fence["location"] or fence["name"],
+                    "notes": (f"Geofence '{fence['name']}' {transition['transition']} by truck {transition['truck_id']} "
+                              f"at {transition['lat']:.5f},{transition['lng']:.5f}"),
+                })
+        return rows
+
+    def record(self, rows: List[Dict[str, Any]]) -> int:
+        """Write DeliveryEvent rows in one transaction"""
+        db = SessionLocal()
+        try:
+            db.add_all([DeliveryEvent(**row) for row in rows])
+            db.commit()
+        finally:
+            db.close()
+        self.stats["events_written"] += len(rows)
+        return len(rows)
+
+    def record_each(self, rows: List[Dict[str, Any]]) -> int:
+        """Write rows one at a time, logging and dropping the ones the database rejects"""
+        written = 0
+        for row in rows:
+            try:
+                written += self.record([row])
+            except IntegrityError as e:
+                self.stats["record_errors"] += 1
+                logger.error(f"Geofence {row['event_type']} event for shipment {row['shipment_id']} dropped: {e.orig}")
+        return written
+
+    async def deliver(self, rows: List[Dict[str, Any]]):
+        """Write rows, with any still unrecorded from earlier; failed writes are kept and retried.
+
+        The fence states have already moved on, so a lost write would never be produced again.
+        """
+        rows, self.unrecorded = self.unrecorded + rows, []
+        if not rows:
+            return
+        try:
+            try:
+                await run_in_threadpool(self.record, rows)
+            except IntegrityError as e:
+                # Retrying cannot fix a rejected row (e.g. the shipment was deleted): write the rest
+                logger.error(f"Geofence event write rejected, recording events one by one: {e}")
+                await run_in_threadpool(self.record_each, rows)
+        except Exception as e:
+            self.stats["record_errors"] += 1
+            pending = rows + self.unrecorded
+            self.unrecorded = pending[-MAX_UNRECORDED:]
+            dropped = len(pending) - len(self.unrecorded)
+            logger.error(f"Geofence event write of {len(rows)} events failed, will retry: {e}"
+                         + (f" ({dropped} oldest dropped)" if dropped else ""))
+
+    async def on_samples(self, samples: List[tuple]):
+        """Telemetry pipeline listener"""
+        transitions = await run_in_threadpool(self.process, samples)
+        await self.deliver(self.delivery_events(transitions) if transitions else [])
+
+    def truck_fences(self, truck_id: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            state = self.states.get(truck_id)
+            inside = sorted(state.inside) if state else []
+            return [self.fences_by_id[f] for f in inside if f in self.fences_by_id]
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "fences": self.index.size,
+            "index_cells": int(len(np.unique(self.index.cell_keys))),
+            "trucks_tracked": len(self.states),
+            "debounce_seconds": self.debounce_seconds,
+            **self.stats,
+        }
+
+    async def run(self):
+        """Background loop picking up fence and assignment changes"""
+        while True:
+            try:
+                await run_in_threadpool(self.refresh)
+                await self.deliver([])
+            except Exception as e:
+                logger.error(f"Geofence refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+
+def _epoch(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+geofence_engine = GeofenceEngine()
@@ -0,0 +1,431 @@
+"""
+Background jobs: PDF rendering, prediction refreshes and other slow work
+taken out of the request path.
+Jobs live in the jobs table, so no broker is needed: the API inserts a row
+and returns its id, worker processes claim the highest-priority due job
+(FOR UPDATE SKIP LOCKED on PostgreSQL; a conditional UPDATE keeps SQLite
+and concurrent claimers safe too), run its handler and store the result
+(JSON, or bytes for files) on the row. Payloads are checked against the
+job kind at submit. Failures are retried with backoff up to max_attempts,
+except InvalidPayload, which fails at once. Workers renew the lease of a
+running job, so only a job whose worker died is picked up again once its
+lease expires.
+
+The API starts job_workers worker processes and restarts them if they
+exit; run more elsewhere with `python -m app.services.job_queue`.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import defer
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..models.base import SessionLocal
+from ..models.tables import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+SUPERVISE_INTERVAL = 5.0
+PRUNE_INTERVAL = 3600.0
+
+_pdf_service = None
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _pdf():
+    global _pdf_service
+    if _pdf_service is None:
+        from .pdf_service import PDFService
+        _pdf_service = PDFService()
+    return _pdf_service
+
+
+class InvalidPayload(ValueError):
+    """The payload cannot be used for its job kind; raised at submit and by handlers, never retried"""
+
+
+# Handlers run in worker processes: they get the job payload and return a JSON-able
+# result, or (bytes, content_type) for a file
+
+def render_delivery_confirmation(payload: Dict[str, Any]):
+    return _pdf().generate_delivery_confirmation(payload["shipment_data"]), "application/pdf"
+
+
+def render_exception_report(payload: Dict[str, Any]):
+    return _pdf().generate_exception_report(payload["shipment_data"], payload["exception_details"]), "application/pdf"
+
+
+def render_chain_of_custody(payload: Dict[str, Any]):
+    if not all(isinstance(event, dict) for event in payload["custody_events"]):
+        raise InvalidPayload("custody_events must be a list of objects")
+    return _pdf().generate_chain_of_custody_report(payload["shipment_data"], payload["custody_events"]), "application/pdf"
+
+
+def render_qr_code(payload: Dict[str, Any]):
+    return _pdf().generate_qr_code(payload["data"]), "image/png"
+
+
+def refresh_predictions(payload: Dict[str, Any]):
+    from .eta_service import eta_engine
+    return eta_engine.run_once(bool(payload.get("retrain", False)))
+
+
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "pdf.delivery_confirmation": render_delivery_confirmation,
+    "pdf.exception_report": render_exception_report,
+    "pdf.chain_of_custody": render_chain_of_custody,
+    "pdf.qr_code": render_qr_code,
+    "predictions.refresh": refresh_predictions,
+}
+
+# Required payload keys and their types per job kind, checked at submit
+JOB_PAYLOADS: Dict[str, Dict[str, type]] = {
+    "pdf.delivery_confirmation": {"shipment_data": dict},
+    "pdf.exception_report": {"shipment_data": dict, "exception_details": dict},
+    "pdf.chain_of_custody": {"shipment_data": dict, "custody_events": list},
+    "pdf.qr_code": {"data": str},
+    "predictions.refresh": {},
+}
+
+
+def validate_payload(kind: str, payload: Dict[str, Any]):
+    """Raise InvalidPayload unless `payload` has every key the `kind` handler needs"""
+    if kind not in JOB_HANDLERS:
+        raise InvalidPayload(f"Unknown job kind {kind!r}; expected one of {', '.join(sorted(JOB_HANDLERS))}")
+    if not isinstance(payload, dict):
+        raise InvalidPayload(f"Payload for {kind} must be an object")
+    missing = [key for key in JOB_PAYLOADS[kind] if key not in payload]
+    if missing:
+        raise InvalidPayload(f"Payload for {kind} is missing {', '.join(missing)}")
+    for key, expected in JOB_PAYLOADS[kind].items():
+        if not isinstance(payload[key], expected):
+            raise InvalidPayload(f"Payload field {key!r} for {kind} must be a {expected.__name__}")
+
+
+def job_info(job: Job) -> Dict[str, Any]:
+    info = {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "priority": job.priority,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == "succeeded":
+        info["result_url"] = f"/api/jobs/{job.id}/result"
+        info["result_type"] = job.result_type or "application/json"
+    return info
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """Database-backed job queue and the worker loop that drains it"""
+
+    def __init__(self, workers: int = 1, poll_interval: float = 0.25, lease_seconds: float = 600.0,
+                 max_attempts: int = 3, retry_base: float = 5.0, retention_days: int = 7):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retention_days = retention_days
+        self.processes: List[multiprocessing.Process] = []
+        self.stats = {"submitted": 0, "restarted_workers": 0, "pruned": 0}
+
+    # API side
+
+    def submit(self, kind: str, payload: Dict[str, Any], priority: int = 0,
+               max_attempts: Optional[int] = None) -> Dict[str, Any]:
+        validate_payload(kind, payload)
+        now = _now()
+        db = SessionLocal()
+        try:
+            job = Job(
+                kind=kind, payload=payload, priority=priority, status="queued", attempts=0,
+                max_attempts=max_attempts or self.max_attempts, run_at=now, created_at=now,
+            )
+            db.add(job)
+            db.flush()
+            info = job_info(job)  # Before commit expires the attributes
+            db.commit()
+            self.stats["submitted"] += 1
+            return info
+        finally:
+            db.close()
+
+    def get(self, job_id: int, with_result: bool = False) -> Optional[Job]:
+        db = SessionLocal()
+        try:
+            query = db.query(Job)
+            if not with_result:
+                query = query.options(defer(Job.result), defer(Job.result_data))
+            job = query.filter(Job.id == job_id).first()
+            if job is not None:
+                db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    def list(self, status: Optional[str] = None, kind: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            # Listing should not pull PDFs out of the table
+            query = db.query(Job).options(defer(Job.result), defer(Job.result_data))
+            if status:
+                query = query.filter(Job.status == status)
+            if kind:
+                query = query.filter(Job.kind == kind)
+            return [job_info(job) for job in query.order_by(Job.id.desc()).limit(limit).all()]
+        finally:
+            db.close()
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a job that has not started; False when it is running or finished"""
+        db = SessionLocal()
+        try:
+            cancelled = db.query(Job).filter(Job.id == job_id, Job.status == "queued").update(
+                {"status": "cancelled", "finished_at": _now()}, synchronize_session=False
+            )
+            db.commit()
+            return bool(cancelled)
+        finally:
+            db.close()
+
+    # Worker side
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """Take the highest-priority due job (or one whose worker's lease ran out)"""
+        now = _now()
+        db = SessionLocal()
+        try:
+            candidate = db.query(Job.id, Job.status, Job.attempts, Job.max_attempts).filter(or_(
+                (Job.status == "queued") & (Job.run_at <= now),
+                (Job.status == "running") & (Job.lease_until < now),
+            )).order_by(Job.priority.desc(), Job.run_at, Job.id).limit(1).with_for_update(skip_locked=True).first()
+            if candidate is None:
+                db.rollback()
+                return None
+            # Conditional on the state just read: on SQLite (no row locks) a concurrent claimer loses here
+            current = db.query(Job).filter(
+                Job.id == candidate.id, Job.status == candidate.status, Job.attempts == candidate.attempts
+            )
+            if candidate.attempts >= candidate.max_attempts:
+                # Its worker died on the last attempt
+                current.update({
+                    "status": "failed", "error": "Worker lost while running the job", "finished_at": now,
+                    "locked_by": None, "lease_until": None,
+                }, synchronize_session=False)
+                db.commit()
+                return None
+            claimed = current.update({
+                "status": "running",
+                "attempts": candidate.attempts + 1,
+                "locked_by": worker,
+                "lease_until": now + timedelta(seconds=self.lease_seconds),
+                "started_at": now,
+            }, synchronize_session=False)
+            db.commit()
+            if not claimed:
+                return None
+            job = db.query(Job).filter(Job.id == candidate.id).first()
+            db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    def finish(self, job: Job, worker: str, values: Dict[str, Any]) -> bool:
+        """Record the outcome unless the lease was lost to another worker meanwhile"""
+        db = SessionLocal()
+        try:
+            updated = db.query(Job).filter(
+                Job.id == job.id, Job.status == "running", Job.locked_by == worker, Job.attempts == job.attempts
+            ).update({"locked_by": None, "lease_until": None, **values}, synchronize_session=False)
+            db.commit()
+            return bool(updated)
+        finally:
+            db.close()
+
+    def renew(self, job: Job, worker: str) -> bool:
+        """Extend the lease of a job this worker is still running"""
+        db = SessionLocal()
+        try:
+            renewed = db.query(Job).filter(
+                Job.id == job.id, Job.status == "running", Job.locked_by == worker, Job.attempts == job.attempts
+            ).update({"lease_until": _now() + timedelta(seconds=self.lease_seconds)}, synchronize_session=False)
+            db.commit()
+            return bool(renewed)
+        finally:
+            db.close()
+
+    def _heartbeat(self, job: Job, worker: str, stop: threading.Event):
+        # Renew at a third of the lease so one slow or failed renewal does not lose the job
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                if not self.renew(job, worker):
+                    logger.warning(f"Job {job.id} ({job.kind}) lease was lost while running")
+                    return
+            except Exception as e:
+                logger.error(f"Job {job.id} lease renewal failed: {e}")
+
+    def execute(self, job: Job, worker: str):
+        try:
+            validate_payload(job.kind, job.payload)
+        except InvalidPayload as e:
+            # Queued before validation existed, or written to the table directly
+            self.finish(job, worker, {"status": "failed", "error": f"Invalid job: {e}", "finished_at": _now()})
+            logger.error(f"Job {job.id} ({job.kind}) rejected: {e}")
+            return
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, worker, stop), daemon=True)
+        heartbeat.start()
+        try:
+            output, failure = JOB_HANDLERS[job.kind](job.payload), None
+        except Exception as e:
+            output, failure = None, e
+        finally:
+            stop.set()
+            heartbeat.join()
+        if failure is not None:
+            error = f"{type(failure).__name__}: {failure}"
+            if job.attempts < job.max_attempts and not isinstance(failure, InvalidPayload):
+                delay = self.retry_base * 2 ** (job.attempts - 1) * random.uniform(0.5, 1.5)
+                self.finish(job, worker, {"status": "queued", "error": error, "run_at": _now() + timedelta(seconds=delay)})
+                logger.warning(f"Job {job.id} ({job.kind}) failed, retrying in {delay:.1f}s: {error}")
+            else:
+                self.finish(job, worker, {"status": "failed", "error": error, "finished_at": _now()})
+                logger.error(f"Job {job.id} ({job.kind}) failed: {error}")
+            return
+        if isinstance(output, tuple):
+            data, content_type = output
+            values = {"result_data": data, "result_type": content_type, "result": {"size": len(data)}}
+        else:
+            values = {"result": output}
+        self.finish(job, worker, {"status": "succeeded", "error": None, "finished_at": _now(), **values})
+
+    def work(self, worker: Optional[str] = None, max_jobs: Optional[int] = None):
+        """Worker loop: claim and run jobs until max_jobs (forever by default)"""
+        worker = worker or worker_name()
+        done = 0
+        while max_jobs is None or done < max_jobs:
+            try:
+                job = self.claim(worker)
+            except Exception as e:
+                logger.error(f"Job claim failed: {e}")
+                time.sleep(self.poll_interval * 4)
+                continue
+            if job is None:
+                time.sleep(self.poll_interval)
+                continue
+            self.execute(job, worker)
+            done += 1
+
+    # Supervision
+
+    def start_worker(self) -> multiprocessing.Process:
+        # spawn: forking a server process with live threads and DB connections is unsafe
+        process = multiprocessing.get_context("spawn").Process(target=run_worker, daemon=True)
+        process.start()
+        return process
+
+    def prune(self) -> int:
+        """Delete finished jobs (and their results) past retention"""
+        cutoff = _now() - timedelta(days=self.retention_days)
+        db = SessionLocal()
+        try:
+            deleted = db.query(Job).filter(
+                Job.status.in_(("succeeded", "failed", "cancelled")), Job.finished_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        self.stats["pruned"] += deleted
+        return deleted
+
+    def counts(self) -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            by_status = dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+            oldest = db.query(func.min(Job.created_at)).filter(Job.status == "queued").scalar()
+        finally:
+            db.close()
+        if oldest is not None and oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=timezone.utc)
+        return {
+            **{status: by_status.get(status, 0) for status in JOB_STATUSES},
+            "oldest_queued_seconds": round((_now() - oldest).total_seconds(), 1) if oldest else None,
+        }
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "workers_alive": sum(process.is_alive() for process in self.processes),
+            "kinds": sorted(JOB_HANDLERS),
+            **self.stats,
+        }
+
+    async def run(self):
+        """Background loop: keep the worker processes running and prune old jobs hourly"""
+        self.processes = [self.start_worker() for _ in range(self.workers)]
+        pruned_at = 0.0
+        while True:
+            for i, process in enumerate(self.processes):
+                if not process.is_alive():
+                    logger.warning(f"Job worker {process.pid} exited with {process.exitcode}; restarting")
+                    self.processes[i] = self.start_worker()
+                    self.stats["restarted_workers"] += 1
+            if time.time() - pruned_at >= PRUNE_INTERVAL:
+                pruned_at = time.time()
+                try:
+                    pruned = await run_in_threadpool(self.prune)
+                    if pruned:
+                        logger.info(f"Job queue pruned {pruned} finished jobs")
+                except Exception as e:
+                    logger.error(f"Job queue prune failed: {e}")
+            await asyncio.sleep(SUPERVISE_INTERVAL)
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        self.processes = []
+
+
+job_queue = JobQueue(
+    workers=settings.job_workers,
+    poll_interval=settings.job_poll_interval,
+    lease_seconds=settings.job_lease_seconds,
+    max_attempts=settings.job_max_attempts,
+    retry_base=settings.job_retry_base,
+    retention_days=settings.job_retention_days,
+)
+
+
+def run_worker():
+    """Worker process entry point"""
+    logging.basicConfig(level=settings.log_level)
+    job_queue.work()
+
+
+if __name__ == "__main__":
+    run_worker()
@@ -0,0 +1,267 @@
+"""
+Predictive maintenance engine for the truck fleet.
+Derives per-truck maintenance risk from mileage since last service, fuel
+efficiency degradation and the scheduled service date, computed with
+NumPy across the whole fleet and cached between refreshes.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func
+from starlette.concurrency import run_in_threadpool
+
+from ..models.base import SessionLocal
+from ..models.tables import FuelRecord, MaintenanceRecord, Truck
+
+logger = logging.getLogger(__name__)
+
+SERVICE_INTERVAL_MILES = 25000.0  # Preventive service interval
+DEGRADATION_LIMIT = 0.15  # A 15% MPG drop from baseline counts as full risk
+SCHEDULE_HORIZON_DAYS = 30.0  # Trucks due within this window always raise an alert
+RECENT_FILLS = 3  # Fill-ups averaged for "current" MPG
+FUEL_LOOKBACK_DAYS = 180
+ALERT_THRESHOLD = 0.5
+
+
+def _epoch(value: Optional[datetime]) -> float:
+    if value is None:
+        return np.nan
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+URGENCY_LEVELS = ("info", "warning", "critical")
+URGENCY_RISK = {"info": ALERT_THRESHOLD, "warning": 0.7, "critical": 0.9}  # Minimum risk score per level
+URGENCY_DAYS = {"warning": 14, "critical": 7}  # Due within this many days is at least this urgent
+
+
+def urgency_levels(risk: np.ndarray, days_until: np.ndarray) -> np.ndarray:
+    """Index into URGENCY_LEVELS: the risk band, raised to the days-until-due floor"""
+    level = np.zeros(len(risk), dtype=np.int8)
+    with np.errstate(invalid="ignore"):
+        for index, name in enumerate(URGENCY_LEVELS):
+            level[(risk >= URGENCY_RISK[name]) | (days_until <= URGENCY_DAYS.get(name, -np.inf))] = index
+    return level
+
+
+class FleetSnapshot:
+    """Columnar per-truck maintenance state produced by one refresh"""
+
+    def __init__(self, columns: Dict[str, np.ndarray], plate_numbers: List[str], computed_at: float):
+        self.columns = columns
+        self.plate_numbers = plate_numbers
+        self.computed_at = computed_at
+        risk = columns["risk_score"]
+        self.urgency = urgency_levels(risk, columns["days_until_maintenance"])
+        # Alert rows ordered by urgency then descending risk, ready to slice for pagination
+        candidates = np.flatnonzero(risk >= ALERT_THRESHOLD)
+        self.alert_order = candidates[np.lexsort((-risk[candidates], -self.urgency[candidates]))]
+
+    def alerts(self, skip: int = 0, limit: int = 100, urgency: Optional[str] = None) -> Dict[str, Any]:
+        """Page through alerts, optionally restricted to one urgency level"""
+        rows = self.alert_order
+        if urgency:
+            rows = rows[self.urgency[rows] == URGENCY_LEVELS.index(urgency)]
+        return {
+            "maintenance_alerts": [self.alert(row) for row in rows[skip:skip + limit]],
+            "total": int(len(rows)),
+            "computed_at": datetime.fromtimestamp(self.computed_at, timezone.utc).isoformat(),
+        }
+
+    def alert(self, row: int) -> Dict[str, Any]:
+        c = self.columns
+        days = c["days_until_maintenance"][row]
+        reasons = []
+        if c["mileage_risk"][row] >= ALERT_THRESHOLD:
+            reasons.append(f"{c['miles_since_service'][row]:.0f} miles since last service")
+        if c["degradation"][row] > 0.05:
+            reasons.append(f"fuel efficiency down {c['degradation'][row]:.0%} from baseline")
+        if c["schedule_risk"][row] >= ALERT_THRESHOLD:
+            reasons.append(f"scheduled maintenance overdue by {-int(days)} days" if days < 0
+                           else f"scheduled maintenance in {int(days)} days")
+        risk = float(c["risk_score"][row])
+        return {
+            "truck_id": int(c["truck_id"][row]),
+            "plate_number": self.plate_numbers[row],
+            "days_until_maintenance": None if np.isnan(days) else int(days),
+            "miles_since_service": round(float(c["miles_since_service"][row]), 1),
+            "recent_mpg": None if np.isnan(c["recent_mpg"][row]) else round(float(c["recent_mpg"][row]), 2),
+            "baseline_mpg": None if np.isnan(c["baseline_mpg"][row]) else round(float(c["baseline_mpg"][row]), 2),
+            "risk_score": round(risk, 3),
+            "urgency": URGENCY_LEVELS[self.urgency[row]],
+            "reasons": reasons,
+        }
+
+
+def compute_risk(
+    truck_ids: np.ndarray,
+    total_miles: np.ndarray,
+    rated_mpg: np.ndarray,
+    next_maintenance: np.ndarray,
+    service_truck_ids: np.ndarray,
+    service_mileage: np.ndarray,
+    fuel_truck_ids: np.ndarray,
+    fuel_mileage: np.ndarray,
+    fuel_amount: np.ndarray,
+    now: float,
+) -> Dict[str, np.ndarray]:
+    """Vectorized risk model over the whole fleet.
+
+    Fuel arrays must be ordered by (truck_id, fueled_at). Truck ids map to rows via searchsorted,
+    so truck_ids must be sorted ascending.
+    """
+    n = len(truck_ids)
+    if n == 0:
+        empty = np.zeros(0)
+        return {name: empty for name in (
+            "truck_id", "miles_since_service", "mileage_risk", "baseline_mpg", "recent_mpg",
+            "degradation", "days_until_maintenance", "schedule_risk", "risk_score",
+        )}
+
+    # Mileage since the last recorded service; without service history, since the last interval
+    # the odometer passed (assumes service was kept up before the truck's records start)
+    last_service = np.floor(total_miles / SERVICE_INTERVAL_MILES) * SERVICE_INTERVAL_MILES
+    if len(service_truck_ids):
+        rows = np.searchsorted(truck_ids, service_truck_ids)
+        valid = (rows < n) & (truck_ids[np.minimum(rows, n - 1)] == service_truck_ids)
+        serviced = np.full(n, -np.inf)
+        np.maximum.at(serviced, rows[valid], service_mileage[valid])
+        last_service = np.where(np.isfinite(serviced), serviced, last_service)
+    miles_since = np.maximum(total_miles - last_service, 0.0)
+    mileage_risk = miles_since / SERVICE_INTERVAL_MILES
+
+    # MPG per fill-up from consecutive odometer readings of the same truck
+    baseline = rated_mpg.copy()
+    recent = np.full(n, np.nan)
+    if len(fuel_truck_ids) > 1:
+        same_truck = fuel_truck_ids[1:] == fuel_truck_ids[:-1]
+        miles = np.diff(fuel_mileage)
+        gallons = fuel_amount[1:]
+        with np.errstate(invalid="ignore"):
+            valid = same_truck & (miles > 0) & (gallons > 0)
+        mpg = np.where(valid, np.nan_to_num(miles) / np.where(gallons > 0, gallons, 1.0), 0.0)
+        rows = np.searchsorted(truck_ids, fuel_truck_ids[1:])
+        valid &= (rows < n) & (truck_ids[np.minimum(rows, n - 1)] == fuel_truck_ids[1:])
+
+        # Position of each fill counted back from the truck's latest fill
+        new_group = ~same_truck
+        new_group[0] = True
+        group_id = np.cumsum(new_group) - 1
+        starts = np.flatnonzero(new_group)
+        group_end = np.r_[starts[1:] - 1, len(same_truck) - 1]
+        from_end = group_end[group_id] - np.arange(len(same_truck))
+        is_recent = valid & (from_end < RECENT_FILLS)
+
+        recent_sum = np.bincount(rows[is_recent], weights=mpg[is_recent], minlength=n)
+        recent_count = np.bincount(rows[is_recent], minlength=n)
+        all_sum = np.bincount(rows[valid], weights=mpg[valid], minlength=n)
+        all_count = np.bincount(rows[valid], minlength=n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            recent = np.where(recent_count > 0, recent_sum / recent_count, np.nan)
+            historical = np.where(all_count > 0, all_sum / all_count, np.nan)
+        baseline = np.where(np.isnan(baseline) | (baseline <= 0), historical, baseline)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        degradation = np.clip((baseline - recent) / baseline, 0.0, 1.0)
+    degradation = np.nan_to_num(degradation, nan=0.0)
+
+    # Calendar schedule: due within the horizon maps to risk >= ALERT_THRESHOLD, overdue to 1.0
+    days_until = (next_maintenance - now) / 86400.0
+    schedule_risk = np.clip(1.0 - days_until * (1.0 - ALERT_THRESHOLD) / SCHEDULE_HORIZON_DAYS, 0.0, 1.0)
+    schedule_risk = np.nan_to_num(schedule_risk, nan=0.0)
+
+    risk = np.clip(np.maximum.reduce([mileage_risk, degradation / DEGRADATION_LIMIT, schedule_risk]), 0.0, 1.0)
+    return {
+        "truck_id": truck_ids,
+        "miles_since_service": miles_since,
+        "mileage_risk": mileage_risk,
+        "baseline_mpg": baseline,
+        "recent_mpg": recent,
+        "degradation": degradation,
+        "days_until_maintenance": np.floor(days_until),
+        "schedule_risk": schedule_risk,
+        "risk_score": risk,
+    }
+
+
+class MaintenanceRiskEngine:
+    """Caches the fleet risk snapshot and refreshes it on a schedule"""
+
+    def __init__(self, refresh_interval: float = 300.0):
+        self.refresh_interval = refresh_interval
+        self.snapshot: Optional[FleetSnapshot] = None
+        self._lock = asyncio.Lock()
+        self._stale = True
+
+    def invalidate(self):
+        """Mark the snapshot stale, e.g. after a new maintenance or fuel record"""
+        self._stale = True
+
+    def refresh(self) -> FleetSnapshot:
+        """Reload fleet columns from the database and recompute every truck's risk"""
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        db = SessionLocal()
+        try:
+            trucks = db.query(
+                Truck.id, Truck.plate_number, Truck.total_miles, Truck.fuel_efficiency, Truck.next_maintenance
+            ).filter(Truck.status != "out_of_service").order_by(Truck.id).all()
+            services = db.query(
+                MaintenanceRecord.truck_id, func.max(MaintenanceRecord.mileage_at_service)
+            ).filter(MaintenanceRecord.mileage_at_service.isnot(None)).group_by(MaintenanceRecord.truck_id).all()
+            fuel = db.query(
+                FuelRecord.truck_id, FuelRecord.mileage_at_fueling, FuelRecord.fuel_amount
+            ).filter(
+                FuelRecord.fueled_at >= now - timedelta(days=FUEL_LOOKBACK_DAYS)
+            ).order_by(FuelRecord.truck_id, FuelRecord.fueled_at).all()
+        finally:
+            db.close()
+
+        columns = compute_risk(
+            truck_ids=np.fromiter((t[0] for t in trucks), dtype=np.int64, count=len(trucks)),
+            total_miles=np.array([t[2] or 0.0 for t in trucks], dtype=float),
+            rated_mpg=np.array([np.nan if t[3] is None else t[3] for t in trucks], dtype=float),
+            next_maintenance=np.array([_epoch(t[4]) for t in trucks], dtype=float),
+            service_truck_ids=np.array([s[0] for s in services], dtype=np.int64),
+            service_mileage=np.array([s[1] for s in services], dtype=float),
+            fuel_truck_ids=np.array([f[0] for f in fuel], dtype=np.int64),
+            fuel_mileage=np.array([np.nan if f[1] is None else f[1] for f in fuel], dtype=float),
+            fuel_amount=np.array([f[2] for f in fuel], dtype=float),
+            now=now.timestamp(),
+        )
+        self.snapshot = FleetSnapshot(columns, [t[1] for t in trucks], time.time())
+        self._stale = False
+        logger.info(f"Maintenance risk refreshed for {len(trucks)} trucks in {time.perf_counter() - started:.3f}s")
+        return self.snapshot
+
+    async def get_snapshot(self) -> FleetSnapshot:
+        """Return the cached snapshot, refreshing it off the event loop when due"""
+        if not self._due():
+            return self.snapshot
+        async with self._lock:
+            if self._due():
+                await run_in_threadpool(self.refresh)
+        return self.snapshot
+
+    def _due(self) -> bool:
+        return (self.snapshot is None or self._stale
+                or time.time() - self.snapshot.computed_at >= self.refresh_interval)
+
+    async def run_schedule(self):
+        """Background loop that keeps the snapshot warm"""
+        while True:
+            try:
+                async with self._lock:
+                    await run_in_threadpool(self.refresh)
+            except Exception as e:
+                logger.error(f"Maintenance risk refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+
+maintenance_engine = MaintenanceRiskEngine()
@@ -0,0 +1,284 @@
+"""
+Cross-worker notification bus.
+Each uvicorn worker holds only its own WebSocket clients, so a notification
+POSTed to one worker is published once on a shared channel and every worker
+fans it out to its local clients. The originating worker delivers locally
+right away and ignores its own echo.
+
+Transports: "local" (single process, no bus), "socket" (Unix datagram
+sockets in a shared directory; one host, for development and tests),
+"redis" (pub/sub) and "postgres" (LISTEN/NOTIFY).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import socket
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from ..core.config import settings
+
+try:
+    import redis.asyncio as redis_asyncio
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+try:
+    import psycopg
+    PSYCOPG_AVAILABLE = True
+except ImportError:
+    PSYCOPG_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+BUS_BACKENDS = ("local", "socket", "redis", "postgres")
+POSTGRES_PAYLOAD_LIMIT = 7999  # NOTIFY payloads must be shorter than 8000 bytes
+RECONNECT_SECONDS = 2.0
+
+
+class Transport:
+    """Carries serialized envelopes between workers"""
+
+    name = "local"
+
+    async def start(self, receive: Callable[[str], None]):
+        pass
+
+    async def send(self, payload: str):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class SocketTransport(Transport):
+    """One Unix datagram socket per worker in a shared directory; send writes to every peer"""
+
+    name = "socket"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path: Optional[str] = None
+        self.sock: Optional[socket.socket] = None
+
+    async def start(self, receive: Callable[[str], None]):
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind(self.path)
+        self.sock.setblocking(False)
+
+        def readable():
+            while True:
+                try:
+                    data = self.sock.recv(262144)
+                except (BlockingIOError, InterruptedError):
+                    return
+                receive(data.decode())
+
+        asyncio.get_running_loop().add_reader(self.sock.fileno(), readable)
+
+    async def send(self, payload: str):
+        data = payload.encode()
+        for name in os.listdir(self.directory):
+            peer = os.path.join(self.directory, name)
+            if peer == self.path or not name.endswith(".sock"):
+                continue
+            try:
+                self.sock.sendto(data, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker exited without cleaning up
+                try:
+                    os.unlink(peer)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                logger.warning(f"Notification bus peer {name} is not keeping up; message dropped")
+
+    async def stop(self):
+        if self.sock is not None:
+            asyncio.get_running_loop().remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+class RedisTransport(Transport):
+    """Redis pub/sub on one channel"""
+
+    name = "redis"
+
+    def __init__(self, url: str, channel: str):
+        if not REDIS_AVAILABLE:
+            raise ImportError("redis is required for the redis notification bus")
+        self.url = url
+        self.channel = channel
+        self.client = None
+        self.listener: Optional[asyncio.Task] = None
+
+    async def start(self, receive: Callable[[str], None]):
+        self.client = redis_asyncio.from_url(self.url, decode_responses=True)
+        self.listener = asyncio.create_task(self._listen(receive))
+
+    async def _listen(self, receive: Callable[[str], None]):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    receive(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis notification bus listener failed: {e}")
+                await asyncio.sleep(RECONNECT_SECONDS)
+
+    async def send(self, payload: str):
+        await self.client.publish(self.channel, payload)
+
+    async def stop(self):
+        if self.listener is not None:
+            self.listener.cancel()
+        if self.client is not None:
+            await self.client.aclose()
+
+
+class PostgresTransport(Transport):
+    """LISTEN/NOTIFY on the application database"""
+
+    name = "postgres"
+
+    def __init__(self, url: str, channel: str):
+        if not PSYCOPG_AVAILABLE:
+            raise ImportError("psycopg is required for the postgres notification bus")
+        # SQLAlchemy URLs may name a driver ("postgresql+psycopg://"); libpq does not accept it
+        self.dsn = re.sub(r"^postgresql\+\w+://", "postgresql://", url)
+        self.channel = channel
+        self.publisher = None
+        self.publish_lock = asyncio.Lock()
+        self.listener: Optional[asyncio.Task] = None
+
+    async def start(self, receive: Callable[[str], None]):
+        self.listener = asyncio.create_task(self._listen(receive))
+
+    async def _listen(self, receive: Callable[[str], None]):
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.dsn, autocommit=True) as conn:
+                    await conn.execute(f'LISTEN "{self.channel}"')
+                    async for notify in conn.notifies():
+                        receive(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Postgres notification bus listener failed: {e}")
+                await asyncio.sleep(RECONNECT_SECONDS)
+
+    async def send(self, payload: str):
+        if len(payload.encode()) > POSTGRES_PAYLOAD_LIMIT:
+            raise ValueError(f"Notification exceeds the {POSTGRES_PAYLOAD_LIMIT} byte NOTIFY limit")
+        async with self.publish_lock:
+            if self.publisher is None or self.publisher.closed:
+                self.publisher = await psycopg.AsyncConnection.connect(self.dsn, autocommit=True)
+            try:
+                await self.publisher.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+            except Exception:
+                await self.publisher.close()
+                self.publisher = None
+                raise
+
+    async def stop(self):
+        if self.listener is not None:
+            self.listener.cancel()
+        if self.publisher is not None:
+            await self.publisher.close()
+
+
+class NotificationBus:
+    """Publishes notifications to every worker, delivering through the registered local handler"""
+
+    def __init__(self, transport: Transport):
+        self.transport = transport
+        self.worker_id: Optional[str] = None  # Set on start, after any fork into workers
+        self.handler: Optional[Callable[[Dict[str, Any]], None]] = None
+        self.started = False
+        self.stats = {"published": 0, "received": 0, "send_errors": 0, "receive_errors": 0}
+        self.last_latency_ms: Optional[float] = None
+
+    def on_message(self, handler: Callable[[Dict[str, Any]], None]):
+        """Register the local delivery function (history + WebSocket fan-out)"""
+        self.handler = handler
+
+    async def start(self):
+        if self.started:
+            return
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        await self.transport.start(self._receive)
+        self.started = True
+        logger.info(f"Notification bus started ({self.transport.name}) as {self.worker_id}")
+
+    async def stop(self):
+        if self.started:
+            self.started = False
+            await self.transport.stop()
+
+    async def publish(self, notification: Dict[str, Any]):
+        """Deliver locally, then send once on the bus for the other workers"""
+        self.stats["published"] += 1
+        if self.handler is not None:
+            self.handler(notification)
+        if not self.started:
+            return
+        payload = json.dumps({"origin": self.worker_id, "sent_at": time.time(), "notification": notification})
+        try:
+            await self.transport.send(payload)
+        except Exception as e:
+            self.stats["send_errors"] += 1
+            logger.error(f"Notification bus publish failed: {e}")
+
+    def _receive(self, payload: str):
+        try:
+            envelope = json.loads(payload)
+            if envelope.get("origin") == self.worker_id:
+                return
+            self.stats["received"] += 1
+            self.last_latency_ms = round((time.time() - envelope["sent_at"]) * 1000, 2)
+            if self.handler is not None:
+                self.handler(envelope["notification"])
+        except Exception as e:
+            self.stats["receive_errors"] += 1
+            logger.error(f"Notification bus message dropped: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "backend": self.transport.name,
+            "worker": self.worker_id,
+            "started": self.started,
+            "last_latency_ms": self.last_latency_ms,
+            **self.stats,
+        }
+
+
+def create_transport(backend: str) -> Transport:
+    if backend not in BUS_BACKENDS:
+        raise ValueError(f"Notification bus must be one of {', '.join(BUS_BACKENDS)}")
+    if backend == "socket":
+        return SocketTransport(settings.notification_socket_dir)
+    if backend == "redis":
+        return RedisTransport(settings.notification_bus_url or "redis://localhost:6379", settings.notification_bus_channel)
+    if backend == "postgres":
+        return PostgresTransport(settings.notification_bus_url or settings.database_url, settings.notification_bus_channel)
+    return Transport()
+
+
+notification_bus = NotificationBus(create_transport(settings.notification_bus))
@@ -0,0 +1,216 @@
+"""
+Notification history: an append-only log table plus a fixed-size ring buffer.
+The publishing worker writes each notification to notification_log and uses
+the row id as its sequence number. Notifications recorded within one batch
+window (or while the previous write is in flight) share one multi-row
+INSERT, so a notification storm costs one round trip per batch rather than
+one per notification. Every worker keeps the most recent
+entries in memory (bounded, loaded from the table on startup) so /history
+and WebSocket resume are served without touching the database unless a
+client asks for entries older than the buffer.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..models.base import SessionLocal
+from ..models.tables import NotificationLogEntry
+
+logger = logging.getLogger(__name__)
+
+PRUNE_INTERVAL = 3600.0
+MAX_BATCH = 500  # Notifications per INSERT
+
+
+def entry_notification(entry: NotificationLogEntry) -> Dict[str, Any]:
+    return {**entry.payload, "seq": entry.id}
+
+
+class NotificationLog:
+    """Sequenced notification history with a bounded in-memory tail"""
+
+    def __init__(self, capacity: int = 1000, retention_days: int = 30, batch_window: float = 0.0):
+        self.capacity = capacity
+        self.retention_days = retention_days
+        self.batch_window = batch_window
+        self.entries: deque = deque(maxlen=capacity)  # Notifications with "seq", ascending
+        self.loaded = False
+        self.pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []  # Waiting for the next INSERT
+        self.writer: Optional[asyncio.Task] = None
+        self.stats = {"appended": 0, "batches": 0, "write_errors": 0, "pruned": 0}
+
+    @property
+    def first_seq(self) -> Optional[int]:
+        return self.entries[0]["seq"] if self.entries else None
+
+    @property
+    def last_seq(self) -> int:
+        return self.entries[-1]["seq"] if self.entries else 0
+
+    def append(self, notifications: List[Dict[str, Any]]) -> List[int]:
+        """Write notifications to the log table in one INSERT; returns their sequence numbers, in order"""
+        table = NotificationLogEntry.__table__
+        db = SessionLocal()
+        try:
+            seqs = db.execute(
+                insert(table).returning(table.c.id, sort_by_parameter_order=True),
+                [{"type": notification.get("type") or "unknown", "payload": notification}
+                 for notification in notifications],
+            ).scalars().all()
+            db.commit()
+            return seqs
+        finally:
+            db.close()
+
+    async def record(self, notification: Dict[str, Any]) -> Dict[str, Any]:
+        """Persist and stamp the notification's sequence number (publishing worker only)"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((notification, future))
+        if self.writer is None or self.writer.done():
+            self.writer = asyncio.create_task(self._write_pending())
+        try:
+            notification["seq"] = await future
+            self.stats["appended"] += 1
+        except Exception as e:
+            # Still delivered live; it just cannot be replayed
+            self.stats["write_errors"] += 1
+            logger.error(f"Notification log write failed: {e}")
+        return notification
+
+    async def _write_pending(self):
+        if self.batch_window:
+            await asyncio.sleep(self.batch_window)
+        while self.pending:
+            batch, self.pending = self.pending[:MAX_BATCH], self.pending[MAX_BATCH:]
+            try:
+                seqs = await run_in_threadpool(self.append, [notification for notification, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.stats["batches"] += 1
+            for (_, future), seq in zip(batch, seqs):
+                if not future.done():
+                    future.set_result(seq)
+
+    def remember(self, notification: Dict[str, Any]):
+        """Add a delivered notification to the ring buffer, keeping sequence order"""
+        seq = notification.get("seq")
+        if seq is None:
+            return
+        if not self.entries or seq > self.entries[-1]["seq"]:
+            self.entries.append(notification)
+            return
+        # Bus messages from different workers can arrive slightly out of order
+        position = len(self.entries)
+        while position and self.entries[position - 1]["seq"] > seq:
+            position -= 1
+        if position and self.entries[position - 1]["seq"] == seq:
+            return
+        if len(self.entries) == self.capacity:
+            if position == 0:
+                return  # Older than everything kept
+            self.entries.popleft()
+            position -= 1
+        self.entries.insert(position, notification)
+
+    def tail(self, since: Optional[int], limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """Buffered entries after `since`, at most the newest `limit`; also whether older ones were left out"""
+        since = since or 0
+        newer = []
+        for notification in reversed(self.entries):
+            if notification["seq"] <= since:
+                break
+            newer.append(notification)
+        newer.reverse()
+        truncated = len(newer) > limit or (self.first_seq is not None and self.first_seq > since + 1)
+        return newer[-limit:], truncated
+
+    def read(self, since: int, limit: int) -> List[Dict[str, Any]]:
+        """Entries after `since` from the log table, oldest first"""
+        db = SessionLocal()
+        try:
+            entries = db.query(NotificationLogEntry).filter(
+                NotificationLogEntry.id > since
+            ).order_by(NotificationLogEntry.id).limit(limit).all()
+            return [entry_notification(entry) for entry in entries]
+        finally:
+            db.close()
+
+    async def history(self, since: Optional[int] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest `limit` entries, or the `limit` entries following `since` (paging forward)"""
+        if since is None:
+            return list(self.entries)[-limit:]
+        if self.first_seq is not None and since >= self.first_seq - 1:
+            return self.tail(since, len(self.entries))[0][:limit]
+        return await run_in_threadpool(self.read, since, limit)
+
+    def load(self):
+        """Fill the ring buffer with the newest logged notifications"""
+        db = SessionLocal()
+        try:
+            entries = db.query(NotificationLogEntry).order_by(
+                NotificationLogEntry.id.desc()
+            ).limit(self.capacity).all()
+        finally:
+            db.close()
+        for entry in reversed(entries):
+            self.remember(entry_notification(entry))
+        self.loaded = True
+        return len(entries)
+
+    def prune(self) -> int:
+        """Delete log rows past the retention window"""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+        db = SessionLocal()
+        try:
+            deleted = db.query(NotificationLogEntry).filter(
+                NotificationLogEntry.created_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        self.stats["pruned"] += deleted
+        return deleted
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self.entries),
+            "capacity": self.capacity,
+            "first_seq": self.first_seq,
+            "last_seq": self.last_seq,
+            **self.stats,
+        }
+
+    async def run(self):
+        """Background loop: load the buffer, then prune past retention hourly"""
+        while not self.loaded:
+            try:
+                loaded = await run_in_threadpool(self.load)
+                logger.info(f"Notification log loaded {loaded} recent notifications")
+            except Exception as e:
+                logger.error(f"Notification log load failed: {e}")
+                await asyncio.sleep(30)
+        while True:
+            try:
+                pruned = await run_in_threadpool(self.prune)
+                if pruned:
+                    logger.info(f"Notification log pruned {pruned} entries")
+            except Exception as e:
+                logger.error(f"Notification log prune failed: {e}")
+            await asyncio.sleep(PRUNE_INTERVAL)
+
+
+notification_log = NotificationLog(
+    capacity=settings.notification_history_size,
+    retention_days=settings.notification_retention_days,
+    batch_window=settings.ws_batch_window_ms / 1000,
+)
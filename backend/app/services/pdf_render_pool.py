@@ -0,0 +1,127 @@
+"""
+PDF and QR rendering off the event loop.
+ReportLab builds are CPU-bound; run inline in an async handler they stall
+every request and WebSocket on the worker. Renders go to a process pool
+whose workers build PDFService (styles, fonts) once at startup, and the
+number of renders queued or running is capped so overload is answered
+with 503 instead of an ever-growing queue.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+RENDER_METHODS = (
+    "generate_delivery_confirmation",
+    "generate_exception_report",
+    "generate_chain_of_custody_report",
+    "generate_qr_code",
+)
+
+_service = None
+
+
+def _init_worker():
+    """Pool initializer: build the styles and load fonts before the first real render"""
+    global _service
+    from .pdf_service import PDFService
+
+    _service = PDFService()
+    _service.generate_delivery_confirmation({})
+
+
+def _render(method: str, args: tuple) -> bytes:
+    return getattr(_service, method)(*args)
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+class PDFRenderBusy(Exception):
+    """The render queue is full"""
+
+
+class PDFRenderPool:
+    """Bounded, warm process pool for PDFService renders"""
+
+    def __init__(self, workers: int = 0, max_pending: int = 32):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.pending = 0
+        self.stats = {"rendered": 0, "rejected": 0, "errors": 0, "render_seconds": 0.0}
+
+    def get_pool(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            # spawn: forking a server process with live threads and DB connections is unsafe
+            self.pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+            )
+        return self.pool
+
+    async def start(self):
+        """Start every worker now so the first requests do not pay for interpreter and ReportLab startup"""
+        loop = asyncio.get_running_loop()
+        pool = self.get_pool()
+        try:
+            pids = await asyncio.gather(*[loop.run_in_executor(pool, _ready) for _ in range(self.workers)])
+            logger.info(f"PDF render pool ready with {len(set(pids))} workers")
+        except Exception as e:
+            logger.error(f"PDF render pool failed to start: {e}")
+            self.shutdown()
+
+    async def render(self, method: str, *args: Any) -> bytes:
+        """Run a PDFService method in the pool; raises PDFRenderBusy when max_pending renders are in flight"""
+        if method not in RENDER_METHODS:
+            raise ValueError(f"Unknown render method {method}")
+        if self.pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise PDFRenderBusy(f"{self.pending} renders already queued")
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.get_pool(), _render, method, args)
+            self.stats["rendered"] += 1
+            self.stats["render_seconds"] += time.perf_counter() - started
+            return result
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); the next render starts a fresh pool
+            self.stats["errors"] += 1
+            self.pool = None
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def status(self) -> Dict[str, Any]:
+        rendered = self.stats["rendered"]
+        return {
+            "workers": self.workers,
+            "started": self.pool is not None,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rendered": rendered,
+            "rejected": self.stats["rejected"],
+            "errors": self.stats["errors"],
+            "avg_render_ms": round(self.stats["render_seconds"] / rendered * 1000, 1) if rendered else None,
+        }
+
+
+pdf_render_pool = PDFRenderPool(settings.pdf_render_workers, settings.pdf_render_queue)
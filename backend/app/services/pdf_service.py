@@ -10,6 +10,15 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 import qrcode
 from PIL import Image as PILImage
 
+# Bump a template's version whenever its layout changes so cached renders of it are not reused.
+# Renders are cached by input (render_cache), so a served PDF's "Generated on" is its first render time.
+TEMPLATE_VERSIONS = {
+    "generate_delivery_confirmation": 1,
+    "generate_exception_report": 1,
+    "generate_chain_of_custody_report": 1,
+    "generate_qr_code": 1,
+}
+
 class PDFService:
     """Service for generating professional PDF documents for logistics operations"""
     
@@ -0,0 +1,259 @@
+"""
+Content-addressed cache for rendered PDFs and QR codes.
+A render is keyed by the SHA-256 of its template name, template version
+and canonical JSON input, so identical requests map to the same file under
+upload_dir/render-cache and the key doubles as a strong ETag (clients can
+revalidate without anything being rendered or read). Files are evicted
+least-recently-used once the directory passes render_cache_max_mb;
+concurrent misses for the same key share one render.
+
+A cached document is the first render of its input: the "Generated on"
+line and Last-Modified show when that was, not when it was downloaded.
+
+The LRU index is only touched on the event loop; threads only read and
+write files. Files being sent are pinned so eviction skips them. Each API
+process keeps its own index over the shared directory, so with several
+workers the size bound is approximate and another worker may remove a
+file before it is sent; the response then renders the document again.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, Response
+
+from ..core.config import settings
+from .pdf_service import TEMPLATE_VERSIONS
+
+Render = Callable[[], Awaitable[bytes]]
+RenderError = Callable[[Exception], Optional[Response]]  # Response for a failed re-render, None to re-raise
+
+
+def render_key(template: str, args: tuple) -> str:
+    """Hash of template, template version and input; key order and whitespace do not matter"""
+    canonical = json.dumps(
+        [template, TEMPLATE_VERSIONS[template], args],
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _scan(directory: str) -> List[Tuple[float, str, int]]:
+    """(atime, name, size) of every cached file, oldest use first"""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.startswith("."):
+                continue
+            stat_result = os.stat(os.path.join(root, name))
+            files.append((stat_result.st_atime, name, stat_result.st_size))
+    files.sort()
+    return files
+
+
+def _touch(path: str) -> int:
+    """Record a use in atime (kept across restarts; mtime stays the render time) and return the size"""
+    stat_result = os.stat(path)
+    os.utime(path, ns=(time.time_ns(), stat_result.st_mtime_ns))
+    return stat_result.st_size
+
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename, so readers never see a partial file
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def _remove(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class CachedFileResponse(FileResponse):
+    """FileResponse for a pinned cache file: unpins when done, re-renders if the file vanished.
+
+    The re-render runs after the endpoint returned, so its errors go through `on_error`
+    (e.g. a full render pool becomes a 503 rather than an unhandled 500).
+    """
+
+    def __init__(self, path: str, release: Callable[[], None], render: Render,
+                 on_error: Optional[RenderError] = None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.release = release
+        self.render = render
+        self.on_error = on_error
+
+    async def __call__(self, scope, receive, send):
+        try:
+            try:
+                self.stat_result = await run_in_threadpool(os.stat, self.path)
+                self.set_stat_headers(self.stat_result)
+            except FileNotFoundError:
+                await self.rerender(scope, receive, send)
+                return
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+    async def rerender(self, scope, receive, send):
+        try:
+            content = await self.render()
+        except Exception as e:
+            response = self.on_error(e) if self.on_error else None
+            if response is None:
+                raise
+        else:
+            headers = {k: v for k, v in self.headers.items() if k not in ("content-length", "last-modified")}
+            response = Response(content, media_type=self.media_type, headers=headers)
+        await response(scope, receive, send)
+
+
+class RenderCache:
+    """Size-bounded LRU of rendered files on disk"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, int]" = OrderedDict()  # File name -> size, least recently used first
+        self.size = 0
+        self.loaded = False
+        self.pinned: Dict[str, int] = {}  # File name -> responses still sending it
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evicted": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name[:2], name)
+
+    async def load(self):
+        """Index what earlier runs left on disk"""
+        files = await run_in_threadpool(_scan, self.directory)
+        if self.loaded:
+            return
+        for _, name, size in reversed(files):
+            if name not in self.entries:
+                self.entries[name] = size
+                self.size += size
+                self.entries.move_to_end(name, last=False)
+        self.loaded = True
+        await self.evict()
+
+    async def lookup(self, name: str) -> Optional[str]:
+        path = self.path(name)
+        try:
+            size = await run_in_threadpool(_touch, path)
+        except FileNotFoundError:
+            self.size -= self.entries.pop(name, 0)
+            return None
+        # Also picks up files written by another worker
+        self.size += size - self.entries.pop(name, 0)
+        self.entries[name] = size
+        return path
+
+    async def store(self, name: str, data: bytes) -> str:
+        path = self.path(name)
+        await run_in_threadpool(_write, path, data)
+        self.size += len(data) - self.entries.pop(name, 0)
+        self.entries[name] = len(data)
+        await self.evict()
+        return path
+
+    async def evict(self):
+        """Drop least recently used files until under max_bytes, skipping the newest and any being sent"""
+        victims = []
+        for name, size in list(self.entries.items())[:-1]:
+            if self.size <= self.max_bytes:
+                break
+            if name in self.pinned:
+                continue
+            del self.entries[name]
+            self.size -= size
+            victims.append(self.path(name))
+        if victims:
+            self.stats["evicted"] += len(victims)
+            await run_in_threadpool(_remove, victims)
+
+    def pin(self, name: str):
+        self.pinned[name] = self.pinned.get(name, 0) + 1
+
+    def unpin(self, name: str):
+        if self.pinned[name] == 1:
+            del self.pinned[name]
+        else:
+            self.pinned[name] -= 1
+
+    async def get(self, name: str, render: Render) -> str:
+        """Path of the cached file `name` (key + extension), rendering and storing it on a miss.
+
+        The file is pinned against eviction from the start; the caller must unpin it once it has been sent.
+        """
+        self.pin(name)
+        try:
+            if not self.loaded:
+                await self.load()
+            path = await self.lookup(name)
+            if path is not None:
+                self.stats["hits"] += 1
+                return path
+            if name in self.inflight:
+                self.stats["coalesced"] += 1
+                return await asyncio.shield(self.inflight[name])
+
+            future = asyncio.get_running_loop().create_future()
+            self.inflight[name] = future
+            try:
+                path = await self.store(name, await render())
+                future.set_result(path)
+            except Exception as e:
+                future.set_exception(e)
+                future.exception()  # Waiters (if any) re-raise it; no "never retrieved" warning otherwise
+                raise
+            finally:
+                del self.inflight[name]
+            self.stats["misses"] += 1
+            return path
+        except BaseException:
+            self.unpin(name)
+            raise
+
+    async def response(self, key: str, extension: str, render: Render, on_error: Optional[RenderError] = None,
+                       **kwargs) -> CachedFileResponse:
+        """FileResponse for the cached render; sent with sendfile where the server supports ASGI pathsend"""
+        name = key + extension
+        path = await self.get(name, render)
+        return CachedFileResponse(path, release=lambda: self.unpin(name), render=render, on_error=on_error, **kwargs)
+
+    def status(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            "enabled": self.enabled,
+            "files": len(self.entries),
+            "size_mb": round(self.size / 1048576, 2),
+            "max_mb": round(self.max_bytes / 1048576, 2),
+            "pinned": len(self.pinned),
+            "hit_rate": round((self.stats["hits"] + self.stats["coalesced"]) / lookups, 3) if lookups else None,
+            **self.stats,
+        }
+
+
+render_cache = RenderCache(os.path.join(settings.upload_dir, "render-cache"), settings.render_cache_max_mb * 1048576)
@@ -0,0 +1,302 @@
+"""
+What-if delay simulation.
+Monte Carlo over the active shipment book: remaining travel time is the
+planned time multiplied by a transit-time ratio drawn from historical
+pickup -> delivery DeliveryEvent timing (per distance band), and the
+scenario adds fixed delays to shipments on the chosen trucks. Each trial is
+scored with and without the scenario on the same draws, so the difference
+is paired. Trial chunks run in a process pool under a time budget and
+partial results are available as chunks complete.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..models.base import SessionLocal
+from ..models.tables import DeliveryEvent, Shipment
+from .eta_service import (
+    ACTIVE_STATUSES, AVERAGE_SPEED_MPH, DEFAULT_DISTANCE_MILES, SHIPMENT_FIELDS, remaining_miles, shipment_columns,
+)
+from .feature_store import epoch
+
+logger = logging.getLogger(__name__)
+
+DISTANCE_BANDS = (250.0, 750.0)  # Miles; short / medium / long haul transit ratios are sampled separately
+MIN_BAND_SAMPLES = 30
+RATIO_LIMITS = (0.3, 5.0)  # Actual / planned transit time outside this is treated as bad data
+HISTORY_TTL = 3600.0
+CHUNK_CELLS = 4_000_000  # Trials x shipments per vectorized block inside a worker
+AT_RISK_PROBABILITY = 0.5
+PROGRESS_INTERVAL = 0.25
+HISTOGRAM_BINS = np.linspace(0.0, 1.0, 21)
+START_EVENTS = ("pickup",)
+END_EVENTS = ("delivered", "arrival")
+
+
+def run_trials(state: Dict[str, np.ndarray], ratios: List[np.ndarray], trials: int, seed) -> Dict[str, np.ndarray]:
+    """One chunk of trials; runs in a worker process"""
+    rng = np.random.default_rng(seed)
+    n = len(state["travel_hours"])
+    base_on_time = np.empty(trials)
+    scenario_on_time = np.empty(trials)
+    base_late = np.zeros(n)
+    scenario_late = np.zeros(n)
+    scenario_lateness = np.zeros(n)
+    bands = [np.flatnonzero(state["band"] == b) for b in range(len(ratios))]
+
+    step = max(1, CHUNK_CELLS // max(n, 1))
+    for first in range(0, trials, step):
+        k = min(step, trials - first)
+        ratio = np.empty((k, n))
+        for band, columns in enumerate(bands):
+            if len(columns):
+                ratio[:, columns] = rng.choice(ratios[band], size=(k, len(columns)))
+        arrival = state["wait_hours"] + state["travel_hours"] * ratio
+        late = arrival > state["available_hours"]
+        scenario_arrival = arrival + state["extra_hours"]
+        scenario_is_late = scenario_arrival > state["available_hours"]
+
+        base_on_time[first:first + k] = 1.0 - late.mean(axis=1)
+        scenario_on_time[first:first + k] = 1.0 - scenario_is_late.mean(axis=1)
+        base_late += late.sum(axis=0)
+        scenario_late += scenario_is_late.sum(axis=0)
+        scenario_lateness += np.maximum(scenario_arrival - state["available_hours"], 0.0).sum(axis=0)
+    return {
+        "base_on_time": base_on_time,
+        "scenario_on_time": scenario_on_time,
+        "base_late": base_late,
+        "scenario_late": scenario_late,
+        "scenario_lateness": scenario_lateness,
+    }
+
+
+class TrialResults:
+    """Running merge of chunk outputs"""
+
+    def __init__(self, n: int):
+        self.base_on_time: List[np.ndarray] = []
+        self.scenario_on_time: List[np.ndarray] = []
+        self.base_late = np.zeros(n)
+        self.scenario_late = np.zeros(n)
+        self.scenario_lateness = np.zeros(n)
+        self.trials = 0
+
+    def merge(self, chunk: Dict[str, np.ndarray]):
+        self.base_on_time.append(chunk["base_on_time"])
+        self.scenario_on_time.append(chunk["scenario_on_time"])
+        self.base_late += chunk["base_late"]
+        self.scenario_late += chunk["scenario_late"]
+        self.scenario_lateness += chunk["scenario_lateness"]
+        self.trials += len(chunk["base_on_time"])
+
+
+def _distribution(rates: np.ndarray) -> Dict[str, Any]:
+    p5, p50, p95 = np.percentile(rates, [5, 50, 95])
+    return {
+        "mean_on_time_rate": round(float(rates.mean()), 4),
+        "p5": round(float(p5), 4),
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+    }
+
+
+class WhatIfSimulator:
+    """Runs delay scenarios against the current shipment book in a process pool"""
+
+    def __init__(self, workers: int = 0):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.ratios: Optional[List[np.ndarray]] = None
+        self.history_info: Dict[str, Any] = {}
+        self.history_loaded_at = 0.0
+
+    def get_pool(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            # spawn: forking a server process with live threads and DB connections is unsafe
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.pool
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def load_history(self) -> List[np.ndarray]:
+        """Actual / planned transit-time ratios per distance band, cached for HISTORY_TTL"""
+        if self.ratios is not None and time.time() - self.history_loaded_at < HISTORY_TTL:
+            return self.ratios
+        db = SessionLocal()
+        try:
+            events = db.query(
+                DeliveryEvent.shipment_id, DeliveryEvent.event_type, func.min(DeliveryEvent.timestamp)
+            ).filter(
+                DeliveryEvent.event_type.in_(START_EVENTS + END_EVENTS)
+            ).group_by(DeliveryEvent.shipment_id, DeliveryEvent.event_type).all()
+            shipments = db.query(
+                Shipment.id, Shipment.route_distance, Shipment.pickup_time, Shipment.actual_delivery_time
+            ).filter(Shipment.status == "delivered", Shipment.route_distance > 0).all()
+        finally:
+            db.close()
+
+        starts: Dict[int, float] = {}
+        ends: Dict[int, float] = {}
+        for shipment_id, event_type, timestamp in events:
+            target = starts if event_type in START_EVENTS else ends
+            target[shipment_id] = min(target.get(shipment_id, np.inf), epoch(timestamp))
+        from_events = 0
+        distance, ratio = [], []
+        for row in shipments:
+            start = starts.get(row.id, epoch(row.pickup_time))
+            end = ends.get(row.id, epoch(row.actual_delivery_time))
+            if np.isnan(start) or np.isnan(end) or end <= start:
+                continue
+            from_events += row.id in starts and row.id in ends
+            distance.append(row.route_distance)
+            ratio.append((end - start) / 3600.0 / (row.route_distance / AVERAGE_SPEED_MPH))
+        distance, ratio = np.array(distance), np.array(ratio)
+        valid = (ratio >= RATIO_LIMITS[0]) & (ratio <= RATIO_LIMITS[1])
+        distance, ratio = distance[valid], ratio[valid]
+
+        # Sparse bands borrow the pooled history; with no usable history assume +/-15% around plan
+        pooled = ratio if len(ratio) >= MIN_BAND_SAMPLES else np.random.default_rng(0).lognormal(0.05, 0.15, 2000)
+        band = np.digitize(distance, DISTANCE_BANDS)
+        self.ratios = [
+            ratio[band == b] if (band == b).sum() >= MIN_BAND_SAMPLES else pooled
+            for b in range(len(DISTANCE_BANDS) + 1)
+        ]
+        self.history_info = {
+            "samples": int(len(ratio)),
+            "from_delivery_events": int(from_events),
+            "source": "history" if len(ratio) >= MIN_BAND_SAMPLES else "default",
+            "median_transit_ratio": round(float(np.median(pooled)), 3),
+        }
+        self.history_loaded_at = time.time()
+        return self.ratios
+
+    def load_state(self, truck_ids: List[int], delay_hours: float, now: float) -> Dict[str, Any]:
+        """Active shipments with a deadline as simulation arrays"""
+        db = SessionLocal()
+        try:
+            rows = db.query(*SHIPMENT_FIELDS, Shipment.assigned_truck_id).filter(
+                Shipment.status.in_(ACTIVE_STATUSES), Shipment.delivery_deadline.isnot(None)
+            ).all()
+        finally:
+            db.close()
+        columns = shipment_columns(rows)
+        remaining = remaining_miles(columns, np.full(len(rows), now))
+        pickup = np.array([epoch(r.pickup_time) for r in rows])
+        affected = np.isin(np.array([r.assigned_truck_id or -1 for r in rows]), truck_ids)
+        return {
+            "rows": rows,
+            "affected": affected,
+            "arrays": {
+                "travel_hours": remaining / AVERAGE_SPEED_MPH,
+                "wait_hours": np.where(columns["in_transit"] | np.isnan(pickup), 0.0,
+                                       np.maximum((pickup - now) / 3600.0, 0.0)),
+                "available_hours": (columns["deadline"] - now) / 3600.0,
+                "band": np.digitize(np.nan_to_num(columns["distance"], nan=DEFAULT_DISTANCE_MILES), DISTANCE_BANDS),
+                "extra_hours": np.where(affected, delay_hours, 0.0),
+            },
+        }
+
+    def snapshot(self, state: Dict[str, Any], results: TrialResults, trials: int, started: float,
+                 complete: bool, top: int) -> Dict[str, Any]:
+        rows, affected = state["rows"], state["affected"]
+        summary = {
+            "complete": complete,
+            "trials_requested": trials,
+            "trials_completed": results.trials,
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+            "shipments": len(rows),
+            "affected_shipments": int(affected.sum()),
+            "history": self.history_info,
+        }
+        if not results.trials:
+            return summary
+        base = np.concatenate(results.base_on_time)
+        scenario = np.concatenate(results.scenario_on_time)
+        late_probability = results.scenario_late / results.trials
+        base_probability = results.base_late / results.trials
+        at_risk = np.flatnonzero(late_probability >= AT_RISK_PROBABILITY)
+        at_risk = at_risk[np.argsort(-(late_probability[at_risk] - base_probability[at_risk]), kind="stable")]
+        summary.update({
+            "baseline": _distribution(base),
+            "scenario": _distribution(scenario),
+            "on_time_rate_change": round(float((scenario - base).mean()), 4),
+            "histogram": {
+                "bin_edges": HISTOGRAM_BINS.round(2).tolist(),
+                "baseline": np.histogram(base, HISTOGRAM_BINS)[0].tolist(),
+                "scenario": np.histogram(scenario, HISTOGRAM_BINS)[0].tolist(),
+            },
+            "at_risk_count": int(len(at_risk)),
+            "newly_at_risk_count": int((base_probability[at_risk] < AT_RISK_PROBABILITY).sum()),
+            "at_risk_shipments": [
+                {
+                    "shipment_id": rows[i].id,
+                    "truck_id": rows[i].assigned_truck_id,
+                    "affected": bool(affected[i]),
+                    "late_probability": round(float(late_probability[i]), 3),
+                    "baseline_late_probability": round(float(base_probability[i]), 3),
+                    "expected_late_hours": round(float(results.scenario_lateness[i] / results.trials), 2),
+                }
+                for i in at_risk[:top]
+            ],
+        })
+        return summary
+
+    async def simulate(self, truck_ids: List[int], delay_hours: float, trials: int = 10_000,
+                       time_budget: float = 5.0, seed: Optional[int] = None,
+                       top: int = 50) -> AsyncIterator[Dict[str, Any]]:
+        """Yield progressively refined results; the last snapshot is the final answer"""
+        started = time.perf_counter()
+        deadline = started + time_budget
+        ratios = await run_in_threadpool(self.load_history)
+        state = await run_in_threadpool(self.load_state, truck_ids, delay_hours, time.time())
+        results = TrialResults(len(state["rows"]))
+        if not state["rows"]:
+            yield self.snapshot(state, results, trials, started, True, top)
+            return
+
+        # Several chunks per worker so progress arrives early and the budget can stop work between chunks
+        chunk = max(100, -(-trials // (self.workers * 4)))
+        sizes = [min(chunk, trials - first) for first in range(0, trials, chunk)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        loop = asyncio.get_running_loop()
+        pool = self.get_pool()
+        pending = {
+            loop.run_in_executor(pool, run_trials, state["arrays"], ratios, size, child)
+            for size, child in zip(sizes, seeds)
+        }
+        last_progress = time.perf_counter()
+        try:
+            while pending:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    results.merge(future.result())
+                if done and pending and time.perf_counter() - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = time.perf_counter()
+                    yield self.snapshot(state, results, trials, started, False, top)
+        except BrokenProcessPool:
+            self.pool = None
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+        yield self.snapshot(state, results, trials, started, not pending, top)
+
+
+what_if_simulator = WhatIfSimulator(settings.simulation_workers)
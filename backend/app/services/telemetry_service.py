@@ -0,0 +1,226 @@
+"""
+Truck telemetry ingestion pipeline.
+Buffers position/temperature samples in memory, coalesces them per truck and
+periodically writes the latest values to trucks with one executemany UPDATE
+and the full history to the telemetry history store (COPY into daily
+partitions on PostgreSQL). Batches that fail transiently are requeued;
+samples the database rejects outright are isolated and dead-lettered.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.exc import DataError, IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..models.base import SessionLocal
+from ..models.tables import Truck
+from .timeseries_service import telemetry_store
+
+logger = logging.getLogger(__name__)
+
+# (truck_id, recorded_at, lat, lng, temperature)
+Sample = Tuple[int, datetime, Optional[float], Optional[float], Optional[float]]
+
+DEAD_LETTER_LIMIT = 10000
+
+class BufferFullError(Exception):
+    """Raised when ingest would exceed the in-memory buffer; callers should back off"""
+
+
+class TelemetryPipeline:
+    """In-memory ingest buffer with periodic bulk flushes"""
+
+    def __init__(self, flush_interval: float = 1.0, max_buffered: int = 500000):
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.latest: Dict[int, Sample] = {}
+        self.history: List[Sample] = []
+        self.stats = {
+            "samples_received": 0,
+            "samples_written": 0,
+            "truck_updates_written": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "samples_dead_lettered": 0,
+            "last_flush_ms": 0.0,
+        }
+        self.dead_letters: deque = deque(maxlen=DEAD_LETTER_LIMIT)
+        self.listeners: List[Callable[[List[Sample]], Awaitable[None]]] = []
+        self._flush_lock = asyncio.Lock()
+        self._listeners_done: Optional[asyncio.Future] = None  # Listener run for the previous batch
+
+    def add_listener(self, listener: Callable[[List[Sample]], Awaitable[None]]):
+        """Register a coroutine that receives every successfully written batch, in order"""
+        self.listeners.append(listener)
+
+    def ingest(self, samples: Iterable[Sample]) -> int:
+        """Buffer samples and coalesce the newest one per truck; returns the count accepted"""
+        samples = list(samples)
+        if len(self.history) + len(samples) > self.max_buffered:
+            raise BufferFullError(f"Telemetry buffer full ({len(self.history)} samples pending)")
+        latest = self.latest
+        for sample in samples:
+            current = latest.get(sample[0])
+            if current is None:
+                latest[sample[0]] = sample
+            elif sample[1] >= current[1]:
+                latest[sample[0]] = _merge(sample, current)
+            else:
+                latest[sample[0]] = _merge(current, sample)
+        self.history.extend(samples)
+        self.stats["samples_received"] += len(samples)
+        return len(samples)
+
+    @property
+    def buffered(self) -> int:
+        return len(self.history)
+
+    async def flush(self) -> int:
+        """Swap out the buffers and write them off the event loop"""
+        async with self._flush_lock:
+            if not self.history:
+                return 0
+            latest, history = self.latest, self.history
+            self.latest, self.history = {}, []
+            started = time.perf_counter()
+            try:
+                try:
+                    await run_in_threadpool(self.write, latest, history)
+                except (IntegrityError, DataError) as e:
+                    # Retrying cannot fix a rejected row: write the rest, dead-letter what the database refuses
+                    self.stats["flush_errors"] += 1
+                    logger.error(f"Telemetry flush of {len(history)} samples rejected, isolating bad samples: {e}")
+                    rejected = await run_in_threadpool(self.write_valid, latest, history)
+                    self._dead_letter(rejected)
+                    bad = {id(sample) for sample, _ in rejected}
+                    history = [sample for sample in history if id(sample) not in bad]
+            except Exception as e:
+                # Transient (connection, lock timeout): safe to retry, already stored pings are skipped
+                self.stats["flush_errors"] += 1
+                logger.error(f"Telemetry flush of {len(history)} samples failed: {e}")
+                self._requeue(latest, history)
+                return 0
+            self.stats["flushes"] += 1
+            self.stats["samples_written"] += len(history)
+            self.stats["truck_updates_written"] += len(latest)
+            self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            # Listeners run outside the lock so a slow one does not hold up the next flush;
+            # chaining on the previous run keeps batches in order
+            done = asyncio.ensure_future(self._notify_listeners(history, self._listeners_done))
+            self._listeners_done = done
+        await asyncio.shield(done)
+        return len(history)
+
+    async def _notify_listeners(self, history: List[Sample], previous: Optional[asyncio.Future]):
+        if previous is not None:
+            await previous
+        for listener in self.listeners:
+            try:
+                await listener(history)
+            except Exception as e:
+                logger.error(f"Telemetry listener {getattr(listener, '__qualname__', listener)} failed: {e}")
+
+    def _requeue(self, latest: Dict[int, Sample], history: List[Sample]):
+        """Put a failed batch back in front of newer samples, as far as the buffer allows"""
+        room = max(self.max_buffered - len(self.history), 0)
+        if room < len(history):
+            logger.warning(f"Dropping {len(history) - room} telemetry samples after failed flush")
+        self.history = history[len(history) - room:] + self.history if room else self.history
+        for truck_id, sample in latest.items():
+            current = self.latest.get(truck_id)
+            self.latest[truck_id] = sample if current is None else _merge(current, sample)
+
+    def _dead_letter(self, rejected: List[Tuple[Sample, str]]):
+        for sample, error in rejected:
+            truck_id, recorded_at, lat, lng, temperature = sample
+            self.dead_letters.append({
+                "truck_id": truck_id, "recorded_at": recorded_at.isoformat(), "lat": lat, "lng": lng,
+                "temperature": temperature, "error": error,
+            })
+        self.stats["samples_dead_lettered"] += len(rejected)
+        if rejected:
+            logger.warning(f"Dead-lettered {len(rejected)} telemetry samples")
+
+    def write_valid(self, latest: Dict[int, Sample], history: List[Sample]) -> List[Tuple[Sample, str]]:
+        """Write a rejected batch in halves down to single samples; returns the samples that still fail"""
+        self.write(latest, [])
+        rejected: List[Tuple[Sample, str]] = []
+        parts = [history]
+        while parts:
+            part = parts.pop()
+            try:
+                self.write({}, part)
+            except (IntegrityError, DataError) as e:
+                if len(part) == 1:
+                    rejected.append((part[0], str(e.orig)))
+                else:
+                    middle = len(part) // 2
+                    parts.extend([part[middle:], part[:middle]])
+        return rejected
+
+    def write(self, latest: Dict[int, Sample], history: List[Sample]):
+        """Persist one flushed batch in a single transaction"""
+        # Retried pings can repeat (truck_id, recorded_at); keep the last copy
+        unique = list({(s[0], s[1]): s for s in history}.values())
+        db = SessionLocal()
+        try:
+            connection = db.connection()
+            trucks = Truck.__table__
+            if latest:
+                connection.execute(
+                    update(trucks).where(trucks.c.id == bindparam("_truck_id")).values(
+                        current_lat=func.coalesce(bindparam("_lat"), trucks.c.current_lat),
+                        current_lng=func.coalesce(bindparam("_lng"), trucks.c.current_lng),
+                        temperature=func.coalesce(bindparam("_temperature"), trucks.c.temperature),
+                    ),
+                    [
+                        {"_truck_id": s[0], "_lat": s[2], "_lng": s[3], "_temperature": s[4]}
+                        for s in latest.values()
+                    ],
+                )
+            telemetry_store.append(unique, connection)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def run(self):
+        """Background flush loop started with the application"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Telemetry flush loop error: {e}")
+
+
+def _merge(newer: Sample, older: Sample) -> Sample:
+    """Coalesce per field: a ping without a temperature keeps the last known one"""
+    if None not in newer:
+        return newer
+    return (
+        newer[0],
+        newer[1],
+        older[2] if newer[2] is None else newer[2],
+        older[3] if newer[3] is None else newer[3],
+        older[4] if newer[4] is None else newer[4],
+    )
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+telemetry_pipeline = TelemetryPipeline(
+    flush_interval=settings.telemetry_flush_interval,
+    max_buffered=settings.telemetry_max_buffered,
+)
@@ -0,0 +1,590 @@
+"""
+Truck telemetry history store.
+Raw position/temperature pings are appended in bulk by the telemetry pipeline
+and downsampled raw -> 1 minute -> 1 hour by a background job that also
+enforces per-level retention. Two backends share one interface: daily
+partitioned, BRIN-indexed tables in the database, or an append-only columnar
+file store for local mode. Track queries return column arrays.
+"""
+
+import asyncio
+import io
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import func, select, text
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..models.base import engine, upsert_insert
+from ..models.tables import TelemetryHourRollup, TelemetryMinuteRollup, TelemetrySample
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+RAW_COLUMNS = ("truck_id", "t", "lat", "lng", "temperature")
+ROLLUP_COLUMNS = RAW_COLUMNS + ("temperature_min", "temperature_max", "samples")
+HISTORY_COLUMNS = ("truck_id", "recorded_at", "lat", "lng", "temperature")
+
+SETTLE_SECONDS = 120  # Raw minutes are rolled up once pings for them stop arriving
+PARTITION_LOOKAHEAD_DAYS = 3
+RAW_MAX_SPAN = 6 * 3600  # Widest window served from raw pings by resolution=auto
+MINUTE_MAX_SPAN = 14 * DAY
+
+
+class Level:
+    """One resolution of the history: its table, bucket width and retention"""
+
+    def __init__(self, name: str, model, bucket_seconds: int, retention_days: int,
+                 source: Optional[str] = None, partitioned: bool = True, max_window: int = DAY):
+        self.name = name
+        self.table = model.__table__
+        self.bucket_seconds = bucket_seconds
+        self.retention_days = retention_days
+        self.source = source
+        self.partitioned = partitioned
+        self.max_window = max_window  # Largest source span downsampled in one pass
+        self.columns = RAW_COLUMNS if source is None else ROLLUP_COLUMNS
+
+
+LEVELS = {
+    "raw": Level("raw", TelemetrySample, 0, settings.telemetry_raw_retention_days),
+    "1m": Level("1m", TelemetryMinuteRollup, 60, settings.telemetry_minute_retention_days,
+                source="raw", max_window=3600),
+    "1h": Level("1h", TelemetryHourRollup, 3600, settings.telemetry_hour_retention_days,
+                source="1m", partitioned=False),
+}
+
+
+def _epoch(value: Optional[datetime]) -> float:
+    if value is None:
+        return np.nan
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _datetime(epoch: float) -> datetime:
+    return datetime.fromtimestamp(float(epoch), timezone.utc)
+
+
+def _dtype(column: str):
+    return np.int64 if column in ("truck_id", "samples") else np.float64
+
+
+def empty_columns(names: Iterable[str]) -> Dict[str, np.ndarray]:
+    return {name: np.zeros(0, dtype=_dtype(name)) for name in names}
+
+
+def samples_to_columns(samples: List[tuple]) -> Dict[str, np.ndarray]:
+    """(truck_id, recorded_at, lat, lng, temperature) tuples -> raw column arrays"""
+    return {
+        "truck_id": np.fromiter((s[0] for s in samples), dtype=np.int64, count=len(samples)),
+        "t": np.fromiter((_epoch(s[1]) for s in samples), dtype=np.float64, count=len(samples)),
+        "lat": np.array([s[2] for s in samples], dtype=np.float64),
+        "lng": np.array([s[3] for s in samples], dtype=np.float64),
+        "temperature": np.array([s[4] for s in samples], dtype=np.float64),
+    }
+
+
+def downsample(columns: Dict[str, np.ndarray], bucket_seconds: int) -> Dict[str, np.ndarray]:
+    """Aggregate raw or rollup columns into buckets per truck.
+
+    Position is the last known fix in the bucket; temperature is the sample-weighted mean
+    with min/max carried through, so 1h rows built from 1m rows match a direct rollup.
+    """
+    n = len(columns["t"])
+    if n == 0:
+        return empty_columns(ROLLUP_COLUMNS)
+    buckets = np.floor(columns["t"] / bucket_seconds) * bucket_seconds
+    order = np.lexsort((columns["t"], buckets, columns["truck_id"]))
+    truck, buckets = columns["truck_id"][order], buckets[order]
+    temperature = columns["temperature"][order]
+    if "samples" in columns:
+        weights = columns["samples"][order].astype(np.float64)
+        low, high = columns["temperature_min"][order], columns["temperature_max"][order]
+    else:
+        weights = np.ones(n)
+        low = high = temperature
+
+    starts = np.flatnonzero(np.r_[True, (truck[1:] != truck[:-1]) | (buckets[1:] != buckets[:-1])])
+    has_temperature = ~np.isnan(temperature)
+    weighted = np.add.reduceat(np.where(has_temperature, temperature * weights, 0.0), starts)
+    total_weight = np.add.reduceat(np.where(has_temperature, weights, 0.0), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(total_weight > 0, weighted / total_weight, np.nan)
+
+    result = {
+        "truck_id": truck[starts],
+        "t": buckets[starts],
+        "temperature": mean,
+        "temperature_min": np.fmin.reduceat(low, starts),
+        "temperature_max": np.fmax.reduceat(high, starts),
+        "samples": np.add.reduceat(weights, starts).astype(np.int64),
+    }
+    positions = np.arange(n)
+    for name in ("lat", "lng"):
+        values = columns[name][order]
+        last = np.maximum.reduceat(np.where(np.isnan(values), -1, positions), starts)
+        result[name] = np.where(last >= 0, values[np.maximum(last, 0)], np.nan)
+    return result
+
+
+def _compact(values: np.ndarray, digits: int) -> List[Optional[float]]:
+    return [None if v != v else v for v in np.round(values.astype(np.float64), digits).tolist()]
+
+
+class TelemetryStore:
+    """Backend-independent rollup, retention and track query logic"""
+
+    def __init__(self):
+        self.rolled_until: Dict[str, float] = {}  # Per rollup level: source time fully downsampled
+
+    # Backend primitives
+    def append(self, samples: List[tuple], connection=None):
+        raise NotImplementedError
+
+    def read(self, level: Level, start: float, end: float, truck_id: Optional[int] = None) -> Dict[str, np.ndarray]:
+        raise NotImplementedError
+
+    def write_rollup(self, level: Level, columns: Dict[str, np.ndarray]):
+        raise NotImplementedError
+
+    def bounds(self, level: Level) -> tuple:
+        """(earliest, latest) epoch stored at a level, or (None, None)"""
+        raise NotImplementedError
+
+    def expire(self, level: Level, cutoff: float):
+        raise NotImplementedError
+
+    def prepare(self, now: float):
+        """Housekeeping before rollups (partition creation, sealing closed days)"""
+
+    # Shared logic
+    def rollup(self, level: Level, start: float, end: float) -> int:
+        rolled = downsample(self.read(LEVELS[level.source], start, end), level.bucket_seconds)
+        if len(rolled["t"]):
+            self.write_rollup(level, rolled)
+        return len(rolled["t"])
+
+    def run_rollups(self, now: float) -> Dict[str, int]:
+        """Downsample every completed bucket since the last run, oldest level first"""
+        written = {}
+        for level in LEVELS.values():
+            if level.source is None:
+                continue
+            source = LEVELS[level.source]
+            ready = now - SETTLE_SECONDS if source.source is None else self.rolled_until.get(source.name)
+            if ready is None:
+                continue
+            start = self.rolled_until.get(level.name)
+            if start is None:
+                earliest, _ = self.bounds(source)
+                _, latest = self.bounds(level)
+                if latest is not None:
+                    start = latest + level.bucket_seconds
+                elif earliest is not None:
+                    start = np.floor(earliest / level.bucket_seconds) * level.bucket_seconds
+                else:
+                    continue
+            start = max(start, np.floor((now - source.retention_days * DAY) / level.bucket_seconds)
+                        * level.bucket_seconds)
+            end = np.floor(ready / level.bucket_seconds) * level.bucket_seconds
+            count = 0
+            while start < end:
+                window_end = min(end, start + level.max_window)
+                count += self.rollup(level, start, window_end)
+                start = window_end
+                self.rolled_until[level.name] = start
+            self.rolled_until.setdefault(level.name, start)
+            written[level.name] = count
+        return written
+
+    def run_maintenance(self, now: Optional[float] = None) -> Dict[str, int]:
+        now = now or time.time()
+        started = time.perf_counter()
+        self.prepare(now)
+        written = self.run_rollups(now)
+        for level in LEVELS.values():
+            self.expire(level, now - level.retention_days * DAY)
+        if any(written.values()):
+            logger.info(f"Telemetry rollups {written} in {time.perf_counter() - started:.3f}s")
+        return written
+
+    async def run(self, interval: float):
+        """Background downsampling/retention loop started with the application"""
+        while True:
+            try:
+                await run_in_threadpool(self.run_maintenance)
+            except Exception as e:
+                logger.error(f"Telemetry history maintenance failed: {e}")
+            await asyncio.sleep(interval)
+
+    @staticmethod
+    def choose_resolution(start: float, end: float, now: float) -> str:
+        for name, max_span in (("raw", RAW_MAX_SPAN), ("1m", MINUTE_MAX_SPAN)):
+            if end - start <= max_span and start >= now - LEVELS[name].retention_days * DAY:
+                return name
+        return "1h"
+
+    def track(self, truck_id: int, start: float, end: float, resolution: str = "auto") -> Dict[str, Any]:
+        """One truck's history in [start, end) as parallel arrays"""
+        if resolution == "auto":
+            resolution = self.choose_resolution(start, end, time.time())
+        level = LEVELS[resolution]
+        columns = self.read(level, start, end, truck_id)
+        order = np.argsort(columns["t"], kind="stable")
+        result = {
+            "truck_id": truck_id,
+            "resolution": resolution,
+            "start": _datetime(start).isoformat(),
+            "end": _datetime(end).isoformat(),
+            "points": int(len(order)),
+            "t": _compact(columns["t"][order], 3),
+            "lat": _compact(columns["lat"][order], 6),
+            "lng": _compact(columns["lng"][order], 6),
+            "temperature": _compact(columns["temperature"][order], 2),
+        }
+        if level.source is not None:
+            result["temperature_min"] = _compact(columns["temperature_min"][order], 2)
+            result["temperature_max"] = _compact(columns["temperature_max"][order], 2)
+            result["samples"] = columns["samples"][order].tolist()
+        return result
+
+
+class DatabaseTelemetryStore(TelemetryStore):
+    """History in truck_telemetry / _1m / _1h; daily range partitions on PostgreSQL"""
+
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+        self._partitioned: Dict[str, bool] = {}
+
+    @property
+    def is_postgres(self) -> bool:
+        return self.engine.dialect.name == "postgresql"
+
+    def append(self, samples: List[tuple], connection=None):
+        if not samples:
+            return
+        if connection is None:
+            with self.engine.begin() as connection:
+                return self.append(samples, connection)
+        # Pings already stored (a device re-sending after a lost ack) are skipped, not errors
+        if connection.dialect.name == "postgresql":
+            self._copy_history(connection, samples)
+        else:
+            connection.execute(
+                upsert_insert(connection, TelemetrySample.__table__).on_conflict_do_nothing(
+                    index_elements=["truck_id", "recorded_at"]
+                ),
+                [dict(zip(HISTORY_COLUMNS, s)) for s in samples],
+            )
+
+    @staticmethod
+    def _copy_history(connection, samples: List[tuple]):
+        """COPY into a session staging table (psycopg 3 or psycopg2), then insert what is new"""
+        columns = ", ".join(HISTORY_COLUMNS)
+        connection.execute(text(
+            "CREATE TEMP TABLE IF NOT EXISTS truck_telemetry_staging "
+            "(LIKE truck_telemetry INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        ))
+        statement = f"COPY truck_telemetry_staging ({columns}) FROM STDIN"
+        cursor = connection.connection.driver_connection.cursor()
+        try:
+            if hasattr(cursor, "copy"):
+                with cursor.copy(statement) as copy:
+                    for sample in samples:
+                        copy.write_row(sample)
+            else:
+                buffer = io.StringIO()
+                for truck_id, recorded_at, lat, lng, temperature in samples:
+                    buffer.write(f"{truck_id}\t{recorded_at.isoformat()}\t{_copy_value(lat)}\t"
+                                 f"{_copy_value(lng)}\t{_copy_value(temperature)}\n")
+                buffer.seek(0)
+                cursor.copy_expert(statement, buffer)
+        finally:
+            cursor.close()
+        connection.execute(text(
+            f"INSERT INTO truck_telemetry ({columns}) SELECT {columns} FROM truck_telemetry_staging "
+            "ON CONFLICT (truck_id, recorded_at) DO NOTHING"
+        ))
+
+    def read(self, level: Level, start: float, end: float, truck_id: Optional[int] = None) -> Dict[str, np.ndarray]:
+        table = level.table
+        names = [name for name in level.columns if name != "t"]
+        query = select(table.c.recorded_at, *[table.c[name] for name in names]).where(
+            table.c.recorded_at >= _datetime(start), table.c.recorded_at < _datetime(end)
+        )
+        if truck_id is not None:
+            query = query.where(table.c.truck_id == truck_id)
+        with self.engine.connect() as connection:
+            rows = connection.execute(query.order_by(table.c.truck_id, table.c.recorded_at)).all()
+        if not rows:
+            return empty_columns(level.columns)
+        columns = {"t": np.fromiter((_epoch(r[0]) for r in rows), dtype=np.float64, count=len(rows))}
+        for i, name in enumerate(names, 1):
+            columns[name] = np.array([np.nan if r[i] is None else r[i] for r in rows], dtype=_dtype(name))
+        return columns
+
+    def write_rollup(self, level: Level, columns: Dict[str, np.ndarray]):
+        rows = []
+        for i in range(len(columns["t"])):
+            row = {name: (None if np.isnan(columns[name][i]) else float(columns[name][i]))
+                   for name in ("lat", "lng", "temperature", "temperature_min", "temperature_max")}
+            row.update(truck_id=int(columns["truck_id"][i]), recorded_at=_datetime(columns["t"][i]),
+                       samples=int(columns["samples"][i]))
+            rows.append(row)
+        if not rows:
+            return
+        # A window another worker (or an overlapping run) already rolled up is skipped, like raw pings
+        with self.engine.begin() as connection:
+            connection.execute(
+                upsert_insert(connection, level.table).on_conflict_do_nothing(index_elements=["truck_id", "recorded_at"]),
+                rows,
+            )
+
+    def rollup(self, level: Level, start: float, end: float) -> int:
+        if not self.is_postgres:
+            return super().rollup(level, start, end)
+        # Aggregate inside PostgreSQL instead of pulling raw pings into Python
+        if level.source == "raw":
+            temperature = "avg(temperature), min(temperature), max(temperature), count(*)"
+        else:
+            temperature = (
+                "sum(temperature * samples) FILTER (WHERE temperature IS NOT NULL)"
+                " / nullif(sum(samples) FILTER (WHERE temperature IS NOT NULL), 0),"
+                " min(temperature_min), max(temperature_max), sum(samples)"
+            )
+        statement = text(f"""
+            INSERT INTO {level.table.name}
+                (truck_id, recorded_at, lat, lng, temperature, temperature_min, temperature_max, samples)
+            SELECT truck_id,
+                   to_timestamp(floor(extract(epoch FROM recorded_at) / :bucket) * :bucket) AS bucket,
+                   (array_agg(lat ORDER BY recorded_at DESC) FILTER (WHERE lat IS NOT NULL))[1],
+                   (array_agg(lng ORDER BY recorded_at DESC) FILTER (WHERE lng IS NOT NULL))[1],
+                   {temperature}
+            FROM {LEVELS[level.source].table.name}
+            WHERE recorded_at >= :start AND recorded_at < :end
+            GROUP BY truck_id, bucket
+            ON CONFLICT (truck_id, recorded_at) DO NOTHING
+        """)
+        with self.engine.begin() as connection:
+            result = connection.execute(statement, {
+                "bucket": level.bucket_seconds, "start": _datetime(start), "end": _datetime(end),
+            })
+        return result.rowcount
+
+    def bounds(self, level: Level) -> tuple:
+        table = level.table
+        with self.engine.connect() as connection:
+            earliest, latest = connection.execute(
+                select(func.min(table.c.recorded_at), func.max(table.c.recorded_at))
+            ).one()
+        if earliest is None:
+            return None, None
+        return _epoch(earliest), _epoch(latest)
+
+    def _is_partitioned(self, level: Level) -> bool:
+        if not (self.is_postgres and level.partitioned):
+            return False
+        if level.name not in self._partitioned:
+            with self.engine.connect() as connection:
+                self._partitioned[level.name] = connection.execute(
+                    text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name)"),
+                    {"name": level.table.name},
+                ).first() is not None
+        return self._partitioned[level.name]
+
+    def prepare(self, now: float):
+        """Create daily partitions ahead of time so COPY never lands in the default partition"""
+        today = datetime.fromtimestamp(now, timezone.utc).date()
+        for level in LEVELS.values():
+            if not self._is_partitioned(level):
+                continue
+            for offset in range(-1, PARTITION_LOOKAHEAD_DAYS + 1):
+                day = today + timedelta(days=offset)
+                try:
+                    with self.engine.begin() as connection:
+                        connection.execute(text(
+                            f"CREATE TABLE IF NOT EXISTS {level.table.name}_p{day:%Y%m%d} "
+                            f"PARTITION OF {level.table.name} "
+                            f"FOR VALUES FROM ('{day} 00:00:00+00') TO ('{day + timedelta(days=1)} 00:00:00+00')"
+                        ))
+                except Exception as e:
+                    logger.warning(f"Could not create partition {level.table.name}_p{day:%Y%m%d}: {e}")
+
+    def expire(self, level: Level, cutoff: float):
+        """Drop whole partitions past retention, then delete stragglers (default partition, 1h table)"""
+        table = level.table
+        with self.engine.begin() as connection:
+            if self._is_partitioned(level):
+                prefix = f"{table.name}_p"
+                cutoff_day = f"{_datetime(cutoff):%Y%m%d}"
+                partitions = connection.execute(text(
+                    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = to_regclass(:name)"
+                ), {"name": table.name}).scalars().all()
+                for name in partitions:
+                    suffix = name[len(prefix):]
+                    if name.startswith(prefix) and suffix.isdigit() and len(suffix) == 8 and suffix < cutoff_day:
+                        connection.execute(text(f"DROP TABLE {name}"))
+                        logger.info(f"Dropped expired telemetry partition {name}")
+            connection.execute(table.delete().where(table.c.recorded_at < _datetime(cutoff)))
+
+
+class FileTelemetryStore(TelemetryStore):
+    """Append-only columnar files: <root>/<level>/<YYYY-MM-DD>/<column>.bin
+
+    Each flush appends raw bytes to one file per column. Closed days are sealed: rewritten
+    sorted by (truck_id, t) with duplicate pings dropped, so track reads can binary search.
+    Intended for a single-process local deployment.
+    """
+
+    SEALED = "SEALED"
+
+    def __init__(self, root: str):
+        super().__init__()
+        self.root = root
+        self._lock = threading.RLock()
+
+    def _day_dir(self, level: Level, day: int) -> str:
+        return os.path.join(self.root, level.name, _datetime(day * DAY).strftime("%Y-%m-%d"))
+
+    def _days(self, level: Level) -> List[int]:
+        directory = os.path.join(self.root, level.name)
+        if not os.path.isdir(directory):
+            return []
+        days = []
+        for name in os.listdir(directory):
+            try:
+                days.append(int(datetime.strptime(name, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()) // DAY)
+            except ValueError:
+                continue
+        return sorted(days)
+
+    def append(self, samples: List[tuple], connection=None):
+        if samples:
+            self._append(LEVELS["raw"], samples_to_columns(samples))
+
+    def write_rollup(self, level: Level, columns: Dict[str, np.ndarray]):
+        self._append(level, columns)
+
+    def _append(self, level: Level, columns: Dict[str, np.ndarray]):
+        days = np.floor(columns["t"] / DAY).astype(np.int64)
+        with self._lock:
+            for day in np.unique(days):
+                mask = days == day
+                directory = self._day_dir(level, int(day))
+                os.makedirs(directory, exist_ok=True)
+                for name in level.columns:
+                    with open(os.path.join(directory, f"{name}.bin"), "ab") as f:
+                        f.write(columns[name][mask].astype(_dtype(name)).tobytes())
+                marker = os.path.join(directory, self.SEALED)
+                if os.path.exists(marker):
+                    os.remove(marker)  # Late data: the day is no longer sorted
+
+    def _load(self, level: Level, day: int) -> tuple:
+        directory = self._day_dir(level, day)
+        with self._lock:
+            columns = {}
+            for name in level.columns:
+                path = os.path.join(directory, f"{name}.bin")
+                # Memory-mapped so a sealed-day lookup only pages in the slice it needs
+                columns[name] = np.memmap(path, dtype=_dtype(name), mode="r") \
+                    if os.path.exists(path) and os.path.getsize(path) else np.zeros(0, dtype=_dtype(name))
+            sealed = os.path.exists(os.path.join(directory, self.SEALED))
+        # A crash mid-append can leave columns of unequal length; keep complete rows only
+        n = min(len(column) for column in columns.values())
+        return {name: column[:n] for name, column in columns.items()}, sealed
+
+    def read(self, level: Level, start: float, end: float, truck_id: Optional[int] = None) -> Dict[str, np.ndarray]:
+        parts = []
+        available = set(self._days(level))
+        for day in range(int(start // DAY), int(np.ceil(end / DAY))):
+            if day not in available:
+                continue
+            columns, sealed = self._load(level, day)
+            if truck_id is not None and sealed:
+                lo, hi = np.searchsorted(columns["truck_id"], [truck_id, truck_id + 1])
+                columns = {name: column[lo:hi] for name, column in columns.items()}
+                lo, hi = np.searchsorted(columns["t"], [start, end])
+                columns = {name: column[lo:hi] for name, column in columns.items()}
+            else:
+                mask = (columns["t"] >= start) & (columns["t"] < end)
+                if truck_id is not None:
+                    mask &= columns["truck_id"] == truck_id
+                columns = {name: column[mask] for name, column in columns.items()}
+            parts.append({name: np.array(column) for name, column in columns.items()})
+        if not parts:
+            return empty_columns(level.columns)
+        return {name: np.concatenate([part[name] for part in parts]) for name in level.columns}
+
+    def bounds(self, level: Level) -> tuple:
+        days = self._days(level)
+        for day in days:
+            first, _ = self._load(level, day)
+            if len(first["t"]):
+                break
+        else:
+            return None, None
+        for day in reversed(days):
+            last, _ = self._load(level, day)
+            if len(last["t"]):
+                return float(first["t"].min()), float(last["t"].max())
+        return None, None
+
+    def seal(self, level: Level, day: int):
+        """Rewrite a closed day sorted by (truck_id, t), keeping the last copy of repeated pings"""
+        with self._lock:
+            directory = self._day_dir(level, day)
+            columns, sealed = self._load(level, day)
+            if sealed:
+                return
+            order = np.lexsort((columns["t"], columns["truck_id"]))
+            columns = {name: column[order] for name, column in columns.items()}
+            truck, t = columns["truck_id"], columns["t"]
+            keep = np.r_[(truck[1:] != truck[:-1]) | (t[1:] != t[:-1]), True]
+            staging = f"{directory}.sealing"
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            for name, column in columns.items():
+                column[keep].tofile(os.path.join(staging, f"{name}.bin"))
+            open(os.path.join(staging, self.SEALED), "w").close()
+            retired = f"{directory}.retired"
+            os.replace(directory, retired)
+            os.replace(staging, directory)
+            shutil.rmtree(retired, ignore_errors=True)
+
+    def prepare(self, now: float):
+        today = int(now // DAY)
+        for level in LEVELS.values():
+            for day in self._days(level):
+                if day < today and not os.path.exists(os.path.join(self._day_dir(level, day), self.SEALED)):
+                    self.seal(level, day)
+
+    def expire(self, level: Level, cutoff: float):
+        for day in self._days(level):
+            if (day + 1) * DAY <= cutoff:
+                with self._lock:
+                    shutil.rmtree(self._day_dir(level, day), ignore_errors=True)
+                logger.info(f"Expired {level.name} telemetry for {_datetime(day * DAY):%Y-%m-%d}")
+
+
+def _copy_value(value: Optional[float]) -> str:
+    return "\\N" if value is None else repr(value)
+
+
+def create_store() -> TelemetryStore:
+    if settings.telemetry_storage == "files":
+        return FileTelemetryStore(settings.telemetry_data_dir)
+    return DatabaseTelemetryStore(engine)
+
+
+telemetry_store = create_store()
@@ -0,0 +1,363 @@
+"""
+Outbound webhooks: shipment and truck events pushed to n8n (or any HTTP
+endpoint) instead of waiting to be polled.
+Events are written to the webhook_deliveries table first, so nothing is
+lost across restarts, then delivered by a background loop that POSTs them
+in batches per destination over one pooled HTTP client. Failed batches are
+retried with exponential backoff and jitter; rows that run out of attempts
+or are rejected outright stay in the table as dead letters until retried
+or purged.
+"""
+
+import asyncio
+import logging
+import random
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import select, update
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..models.base import SessionLocal
+from ..models.tables import WebhookDelivery
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}  # Anything else outside 2xx is a dead letter
+CLAIM_SECONDS = 300.0  # A worker that dies mid-delivery releases its rows after this
+CLAIM_LIMIT = 2000  # Rows leased per delivery pass, across destinations
+MAX_CONNECTIONS = 16
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class WebhookDispatcher:
+    """Durable, batched, retrying delivery of events to webhook destinations"""
+
+    def __init__(
+        self,
+        destinations: Sequence[str],
+        event_types: Sequence[str],
+        batch_size: int = 100,
+        max_attempts: int = 8,
+        retry_base: float = 2.0,
+        retry_max: float = 600.0,
+        timeout: float = 10.0,
+        poll_interval: float = 5.0,
+    ):
+        self.destinations = [destination for destination in destinations if destination]
+        self.event_types = set(event_types)
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.client = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.backoff: Dict[str, datetime] = {}  # Destination -> no deliveries before
+        self.stats = {
+            "enqueued": 0, "delivered": 0, "batches": 0, "failed_batches": 0,
+            "retried": 0, "dead_lettered": 0, "write_errors": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.destinations)
+
+    def retry_delay(self, attempts: int) -> float:
+        """Exponential backoff with full jitter, never shorter than the base"""
+        ceiling = min(self.retry_max, self.retry_base * 2 ** attempts)
+        return random.uniform(self.retry_base, max(ceiling, self.retry_base))
+
+    # Queue
+
+    def insert(self, events: List[Dict[str, Any]]) -> int:
+        now = _now()
+        db = SessionLocal()
+        try:
+            db.add_all([
+                WebhookDelivery(
+                    destination=destination, event_type=event.get("type") or "unknown", payload=event,
+                    status="pending", attempts=0, next_attempt_at=now,
+                )
+                for event in events for destination in self.destinations
+            ])
+            db.commit()
+        finally:
+            db.close()
+        return len(events) * len(self.destinations)
+
+    async def enqueue(self, *events: Dict[str, Any]) -> int:
+        """Persist events of the configured types for every destination; returns rows queued"""
+        events = [event for event in events if event.get("type") in self.event_types]
+        if not self.enabled or not events:
+            return 0
+        try:
+            queued = await run_in_threadpool(self.insert, events)
+        except Exception as e:
+            self.stats["write_errors"] += 1
+            logger.error(f"Webhook enqueue failed: {e}")
+            return 0
+        self.stats["enqueued"] += queued
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return queued
+
+    def claim(self) -> List[WebhookDelivery]:
+        """Lease due rows to this pass; concurrent workers never claim the same row"""
+        now = _now()
+        token = str(uuid.uuid4())
+        due = (WebhookDelivery.status == "pending") & (WebhookDelivery.next_attempt_at <= now)
+        blocked = [destination for destination, until in self.backoff.items() if until > now]
+        if blocked:
+            due &= WebhookDelivery.destination.not_in(blocked)
+        db = SessionLocal()
+        try:
+            ids = select(WebhookDelivery.id).where(due).order_by(WebhookDelivery.id).limit(CLAIM_LIMIT)
+            # Re-checking `due` makes the lease conditional: rows another worker just leased are skipped
+            db.execute(
+                update(WebhookDelivery)
+                .where(WebhookDelivery.id.in_(ids.scalar_subquery()), due)
+                .values(claim=token, next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            rows = db.query(WebhookDelivery).filter(WebhookDelivery.claim == token).order_by(WebhookDelivery.id).all()
+            db.expunge_all()
+            return rows
+        finally:
+            db.close()
+
+    def settle(self, delivered: List[int], retry: Dict[int, tuple], dead: Dict[int, str]):
+        """Delete delivered rows; reschedule or dead-letter the rest. retry maps id -> (attempts, when, error)"""
+        db = SessionLocal()
+        try:
+            if delivered:
+                db.query(WebhookDelivery).filter(WebhookDelivery.id.in_(delivered)).delete(synchronize_session=False)
+            # A batch shares its outcome, so one UPDATE per distinct outcome
+            rescheduled: Dict[tuple, List[int]] = defaultdict(list)
+            for row_id, outcome in retry.items():
+                rescheduled[outcome].append(row_id)
+            for (attempts, when, error), ids in rescheduled.items():
+                db.query(WebhookDelivery).filter(WebhookDelivery.id.in_(ids)).update(
+                    {"attempts": attempts, "next_attempt_at": when, "claim": None, "last_error": error},
+                    synchronize_session=False,
+                )
+            failed: Dict[str, List[int]] = defaultdict(list)
+            for row_id, error in dead.items():
+                failed[error].append(row_id)
+            for error, ids in failed.items():
+                db.query(WebhookDelivery).filter(WebhookDelivery.id.in_(ids)).update(
+                    {"status": "dead", "claim": None, "last_error": error, "attempts": WebhookDelivery.attempts + 1},
+                    synchronize_session=False,
+                )
+            db.commit()
+        finally:
+            db.close()
+
+    # Delivery
+
+    async def post(self, destination: str, rows: List[WebhookDelivery]) -> Optional[str]:
+        """POST one batch; None on success, otherwise the error (prefixed "retry:" when transient)"""
+        body = {
+            "source": "smarthaul",
+            "count": len(rows),
+            "events": [
+                {"id": row.id, "type": row.event_type, "attempt": row.attempts + 1, "data": row.payload}
+                for row in rows
+            ],
+        }
+        try:
+            response = await self.client.post(destination, json=body)
+        except httpx.HTTPError as e:
+            return f"retry: {type(e).__name__}: {e}"
+        if response.is_success:
+            return None
+        error = f"HTTP {response.status_code}: {response.text[:200]}"
+        if response.status_code in RETRY_STATUSES:
+            retry_after = response.headers.get("retry-after", "")
+            if retry_after.isdigit():
+                self.backoff[destination] = _now() + timedelta(seconds=min(int(retry_after), self.retry_max))
+            return f"retry: {error}"
+        return error
+
+    async def deliver_destination(self, destination: str, rows: List[WebhookDelivery], outcome: Dict[str, Any]):
+        """Send a destination's rows in order, batch by batch; a failure holds back the rest"""
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            error = await self.post(destination, batch)
+            self.stats["batches"] += 1
+            if error is None:
+                outcome["delivered"].extend(row.id for row in batch)
+                continue
+            self.stats["failed_batches"] += 1
+            if not error.startswith("retry:"):
+                outcome["dead"].update((row.id, error) for row in batch)
+                continue
+            attempts = batch[0].attempts + 1
+            delay = self.retry_delay(attempts)
+            when = max(_now() + timedelta(seconds=delay), self.backoff.get(destination, _now()))
+            self.backoff[destination] = when
+            for row in batch:
+                if row.attempts + 1 >= self.max_attempts:
+                    outcome["dead"][row.id] = error
+                else:
+                    outcome["retry"][row.id] = (row.attempts + 1, when, error)
+                    self.stats["retried"] += 1
+            # Later batches wait for the destination to recover, without spending an attempt
+            for row in rows[start + self.batch_size:]:
+                outcome["retry"][row.id] = (row.attempts, when, row.last_error)
+            return
+
+    async def deliver_due(self) -> int:
+        """One pass: claim due rows, deliver them per destination concurrently, record the outcome"""
+        rows = await run_in_threadpool(self.claim)
+        if not rows:
+            return 0
+        by_destination: Dict[str, List[WebhookDelivery]] = defaultdict(list)
+        for row in rows:
+            by_destination[row.destination].append(row)
+        outcome = {"delivered": [], "retry": {}, "dead": {}}
+        await asyncio.gather(*[
+            self.deliver_destination(destination, destination_rows, outcome)
+            for destination, destination_rows in by_destination.items()
+        ])
+        await run_in_threadpool(self.settle, outcome["delivered"], outcome["retry"], outcome["dead"])
+        self.stats["delivered"] += len(outcome["delivered"])
+        self.stats["dead_lettered"] += len(outcome["dead"])
+        return len(rows)
+
+    async def start(self):
+        if self.client is None:
+            if not HTTPX_AVAILABLE:
+                raise ImportError("httpx is required for outbound webhooks")
+            # One keep-alive pool for every destination
+            self.client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+                headers={"User-Agent": "SmartHaul-Webhooks/1.0"},
+            )
+        self.wakeup = asyncio.Event()
+
+    async def stop(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def run(self):
+        """Background loop: deliver whenever events are queued or retries fall due"""
+        if not self.enabled:
+            return
+        await self.start()
+        while True:
+            try:
+                claimed = await self.deliver_due()
+            except Exception as e:
+                logger.error(f"Webhook delivery pass failed: {e}")
+                claimed = 0
+            if claimed:
+                continue
+            self.wakeup.clear()
+            # Wake when a destination's backoff ends rather than a whole poll interval later
+            now = _now()
+            waits = [(until - now).total_seconds() for until in self.backoff.values() if until > now]
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), min([self.poll_interval, *waits]))
+            except asyncio.TimeoutError:
+                pass
+
+    # Dead letters
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            rows = db.query(WebhookDelivery).filter(WebhookDelivery.status == "dead").order_by(
+                WebhookDelivery.id.desc()
+            ).limit(limit).all()
+            return [
+                {
+                    "id": row.id,
+                    "destination": row.destination,
+                    "type": row.event_type,
+                    "attempts": row.attempts,
+                    "last_error": row.last_error,
+                    "created_at": row.created_at.isoformat() if row.created_at else None,
+                    "event": row.payload,
+                }
+                for row in rows
+            ]
+        finally:
+            db.close()
+
+    def requeue(self, ids: Optional[List[int]] = None) -> int:
+        """Put dead letters (all, or the given ids) back in the queue with fresh attempts"""
+        db = SessionLocal()
+        try:
+            query = db.query(WebhookDelivery).filter(WebhookDelivery.status == "dead")
+            if ids:
+                query = query.filter(WebhookDelivery.id.in_(ids))
+            requeued = query.update(
+                {"status": "pending", "attempts": 0, "next_attempt_at": _now(), "claim": None},
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+        if requeued and self.wakeup is not None:
+            self.wakeup.set()
+        return requeued
+
+    def purge(self, ids: Optional[List[int]] = None) -> int:
+        db = SessionLocal()
+        try:
+            query = db.query(WebhookDelivery).filter(WebhookDelivery.status == "dead")
+            if ids:
+                query = query.filter(WebhookDelivery.id.in_(ids))
+            purged = query.delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        return purged
+
+    def counts(self) -> Dict[str, int]:
+        db = SessionLocal()
+        try:
+            pending = db.query(WebhookDelivery).filter(WebhookDelivery.status == "pending").count()
+            dead = db.query(WebhookDelivery).filter(WebhookDelivery.status == "dead").count()
+        finally:
+            db.close()
+        return {"pending": pending, "dead": dead}
+
+    def status(self) -> Dict[str, Any]:
+        now = _now()
+        return {
+            "enabled": self.enabled,
+            "destinations": self.destinations,
+            "event_types": sorted(self.event_types),
+            "batch_size": self.batch_size,
+            "backing_off": sorted(destination for destination, until in self.backoff.items() if until > now),
+            **self.stats,
+        }
+
+
+webhook_dispatcher = WebhookDispatcher(
+    destinations=(settings.webhook_urls or [settings.n8n_webhook_url]) if settings.webhooks_enabled else [],
+    event_types=settings.webhook_event_types,
+    batch_size=settings.webhook_batch_size,
+    max_attempts=settings.webhook_max_attempts,
+    retry_base=settings.webhook_retry_base,
+    retry_max=settings.webhook_retry_max,
+    timeout=settings.webhook_timeout,
+)
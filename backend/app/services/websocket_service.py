@@ -0,0 +1,400 @@
+"""
+WebSocket fan-out for real-time notifications.
+Each connection gets a bounded send queue drained by its own writer task, so
+a broadcast only serializes once and enqueues; a slow client never stalls
+the others. Full queues are handled by the slow-client policy (coalesce by
+key, drop oldest, or disconnect); sockets whose sends fail or block past
+the send timeout are evicted.
+
+Clients may subscribe to shipments, trucks and regions (and narrow by
+notification type); an inverted index from topic to subscribers means a
+publish only touches interested clients. Clients without subscriptions
+receive everything.
+
+Published notifications are collected for a short window, deduplicated by
+coalescing key (latest wins) and sent as one {"type": "batch"} frame per
+client, so an alert storm costs one frame per window rather than one per
+alert. A window holding a single notification is sent as before.
+
+Server-Sent Events clients share the same core: EventStreamClient is a
+connection whose queue is drained by the streaming response itself instead
+of a writer task.
+"""
+
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SLOW_CLIENT_POLICIES = ("coalesce", "drop_oldest", "disconnect")
+CLOSE_TRY_AGAIN_LATER = 1013  # WebSocket close code for clients evicted for falling behind
+MAX_TOPICS_PER_CLIENT = 1000
+SSE_RETRY_MS = 5000  # Reconnect delay advertised to EventSource clients
+MAX_BATCH = 500  # Notifications per batch frame; a full batch flushes before the window ends
+# Subscribe message field -> topic prefix; these are OR-ed, "types" narrows them
+TOPIC_FIELDS = {"shipment_ids": "shipment", "truck_ids": "truck", "regions": "region"}
+
+
+def notification_topics(notification: Dict[str, Any]) -> List[str]:
+    """Entity topics a notification is published on"""
+    topics = []
+    if notification.get("shipment_id") is not None:
+        topics.append(f"shipment:{notification['shipment_id']}")
+    if notification.get("truck_id") is not None:
+        topics.append(f"truck:{notification['truck_id']}")
+    if notification.get("region"):
+        topics.append(f"region:{str(notification['region']).strip().upper()}")
+    return topics
+
+
+def parse_subscription(message: Dict[str, Any]) -> tuple:
+    """Subscribe/unsubscribe message -> (entity topics, notification types)"""
+    topics = set()
+    for field, prefix in TOPIC_FIELDS.items():
+        values = message.get(field) or []
+        if not isinstance(values, list):
+            raise ValueError(f"{field} must be a list")
+        for value in values:
+            topics.add(f"{prefix}:{str(value).strip().upper() if prefix == 'region' else int(value)}")
+    types = message.get("types") or []
+    if not isinstance(types, list):
+        raise ValueError("types must be a list")
+    return topics, {str(t) for t in types}
+
+
+def notification_key(notification: Dict[str, Any]) -> Optional[str]:
+    """Coalescing key: a newer notification of the same type about the same entity supersedes a queued one"""
+    entity = notification.get("shipment_id") or notification.get("truck_id")
+    if entity is None and notification.get("type") != "daily_report":
+        return None
+    return f"{notification.get('type')}:{entity}"
+
+
+class ClientConnection:
+    """One WebSocket with its bounded send queue and writer task"""
+
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager"):
+        self.websocket = websocket
+        self.manager = manager
+        # Entries are [key, message, seq] lists so a coalesced message can be replaced in place
+        self.queue: deque = deque()
+        self.queued_keys: Dict[str, List[Any]] = {}
+        self.ready = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.closed = False
+        self.topics: Set[str] = set()
+        self.types: Set[str] = set()
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def enqueue(self, message: str, key: Optional[str] = None, seq: Optional[int] = None) -> bool:
+        """Queue without blocking; returns False if the client was evicted instead"""
+        if self.closed:
+            return False
+        if key is not None and self.manager.policy == "coalesce" and key in self.queued_keys:
+            self.queued_keys[key][1:] = [message, seq]
+            self.coalesced += 1
+            return True
+        if len(self.queue) >= self.manager.max_queue:
+            if self.manager.policy == "disconnect":
+                self.manager.evict(self, "send queue full")
+                return False
+            dropped_key = self.queue.popleft()[0]
+            if dropped_key is not None:
+                self.queued_keys.pop(dropped_key, None)
+            self.dropped += 1
+        entry = [key, message, seq]
+        self.queue.append(entry)
+        if key is not None:
+            self.queued_keys[key] = entry
+        self.ready.set()
+        return True
+
+    def next_message(self) -> List[Any]:
+        entry = self.queue.popleft()
+        key = entry[0]
+        if key is not None and self.queued_keys.get(key) is entry:
+            del self.queued_keys[key]
+        return entry
+
+    async def close(self):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=CLOSE_TRY_AGAIN_LATER), 1.0)
+        except Exception:
+            pass
+
+    async def run_writer(self):
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self.ready.clear()
+                    await self.ready.wait()
+                    continue
+                message = self.next_message()[1]
+                await asyncio.wait_for(self.websocket.send_text(message), self.manager.send_timeout)
+                self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            self.manager.evict(self, "send timed out")
+        except Exception as e:
+            logger.debug(f"WebSocket send failed: {e}")
+            self.manager.evict(self, "send failed")
+
+
+class EventStreamClient(ClientConnection):
+    """Server-Sent Events connection; the response body iterator drains the queue, no writer task"""
+
+    def __init__(self, manager: "ConnectionManager"):
+        super().__init__(None, manager)
+
+    async def close(self):
+        pass  # disconnect() already woke the stream, which ends the response
+
+    async def events(self, heartbeat: float):
+        """SSE body: queued frames as events (id = newest seq), a comment line when idle"""
+        loop = asyncio.get_running_loop()
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while not self.closed:
+                if not self.queue:
+                    self.ready.clear()
+                    wake = loop.call_later(heartbeat, self.ready.set)
+                    await self.ready.wait()
+                    wake.cancel()
+                    if not self.queue and not self.closed:
+                        yield ": keepalive\n\n"
+                    continue
+                chunk = []
+                while self.queue:
+                    _, message, seq = self.next_message()
+                    chunk.append(f"id: {seq}\ndata: {message}\n\n" if seq is not None else f"data: {message}\n\n")
+                    self.sent += 1
+                yield "".join(chunk)
+        finally:
+            self.manager.disconnect(self)
+
+
+class ConnectionManager:
+    """Tracks notification WebSockets and fans messages out through per-client queues"""
+
+    def __init__(self, max_queue: int = 256, send_timeout: float = 10.0, policy: str = "coalesce",
+                 batch_window: float = 0.0):
+        if policy not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"Slow client policy must be one of {', '.join(SLOW_CLIENT_POLICIES)}")
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.policy = policy
+        self.batch_window = batch_window  # Seconds; 0 sends every notification immediately
+        # Coalescing key (or a unique stand-in) -> notification, in arrival order
+        self.pending: Dict[Any, tuple] = {}
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.clients: Dict[int, ClientConnection] = {}
+        # Inverted index: entity topic or "type:<type>" (type-only subscribers) -> clients
+        self.index: Dict[str, Set[ClientConnection]] = {}
+        self.firehose: Set[ClientConnection] = set()  # No subscriptions: receive everything
+        self.stats = {
+            "broadcasts": 0, "published": 0, "deduplicated": 0, "batches": 0, "frames": 0,
+            "deliveries": 0, "evicted": 0, "dropped": 0, "coalesced": 0,
+        }
+
+    async def connect(self, websocket: WebSocket) -> ClientConnection:
+        await websocket.accept()
+        client = ClientConnection(websocket, self)
+        client.writer = asyncio.create_task(client.run_writer())
+        return self.register(client)
+
+    def register(self, client: ClientConnection) -> ClientConnection:
+        self.clients[id(client)] = client
+        self.firehose.add(client)
+        return client
+
+    def disconnect(self, client: ClientConnection):
+        """Forget a client whose socket closed; safe to call more than once"""
+        if self.clients.pop(id(client), None) is None:
+            return
+        client.closed = True
+        client.ready.set()  # Wakes an event stream so it can end
+        self._unindex(client)
+        self.stats["dropped"] += client.dropped
+        self.stats["coalesced"] += client.coalesced
+        if client.writer is not None and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+
+    def evict(self, client: ClientConnection, reason: str):
+        """Drop a dead or lagging client and close its socket in the background"""
+        if id(client) not in self.clients:
+            return
+        logger.info(f"Evicting notification client: {reason}")
+        self.stats["evicted"] += 1
+        self.disconnect(client)
+        asyncio.ensure_future(client.close())
+
+    def _index_keys(self, client: ClientConnection) -> Iterable[str]:
+        if client.topics:
+            return client.topics
+        return [f"type:{t}" for t in client.types]
+
+    def _unindex(self, client: ClientConnection):
+        self.firehose.discard(client)
+        for key in self._index_keys(client):
+            subscribers = self.index.get(key)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self.index[key]
+
+    def _reindex(self, client: ClientConnection):
+        if not client.topics and not client.types:
+            self.firehose.add(client)
+            return
+        for key in self._index_keys(client):
+            self.index.setdefault(key, set()).add(client)
+
+    def subscribe(self, client: ClientConnection, topics: Set[str], types: Set[str]):
+        if len(client.topics | topics) + len(client.types | types) > MAX_TOPICS_PER_CLIENT:
+            raise ValueError(f"At most {MAX_TOPICS_PER_CLIENT} subscriptions per connection")
+        self._unindex(client)
+        client.topics |= topics
+        client.types |= types
+        self._reindex(client)
+
+    def unsubscribe(self, client: ClientConnection, topics: Set[str], types: Set[str]):
+        self._unindex(client)
+        client.topics -= topics
+        client.types -= types
+        self._reindex(client)
+
+    def _targeted(self, notification: Dict[str, Any]) -> Set[ClientConnection]:
+        """Subscribed (non-firehose) clients interested in a notification, from the index only"""
+        notification_type = notification.get("type")
+        recipients = set(self.index.get(f"type:{notification_type}", ()))
+        for topic in notification_topics(notification):
+            for client in self.index.get(topic, ()):
+                if not client.types or notification_type in client.types:
+                    recipients.add(client)
+        return recipients
+
+    def subscribers(self, notification: Dict[str, Any]) -> Set[ClientConnection]:
+        """Clients interested in a notification, touching only matching index entries"""
+        return self.firehose | self._targeted(notification)
+
+    def publish(self, notification: Dict[str, Any], key: Optional[str] = None):
+        """Queue a notification for the current batch window (or deliver now without one)"""
+        self.stats["published"] += 1
+        if self.batch_window <= 0:
+            self._deliver([(notification, key)])
+            return
+        pending_key = key if key is not None else object()
+        if self.pending.pop(pending_key, None) is not None:
+            self.stats["deduplicated"] += 1
+        self.pending[pending_key] = (notification, key)
+        if len(self.pending) >= MAX_BATCH:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self.flush)
+
+    def flush(self):
+        """Send everything collected in the current window"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = list(self.pending.values()), {}
+        if batch:
+            self._deliver(batch)
+
+    def _deliver(self, batch: List[tuple]):
+        """One frame per client: every notification for unfiltered clients, its matches for the rest"""
+        self.stats["batches"] += 1
+        parts = [json.dumps(notification) for notification, _ in batch]
+        seqs = [notification.get("seq") for notification, _ in batch]
+        frames: Dict[tuple, tuple] = {}
+
+        def frame(indices: tuple) -> tuple:
+            """(message, seq of its newest notification)"""
+            if indices not in frames:
+                seq = max((seqs[i] for i in indices if seqs[i] is not None), default=None)
+                if len(indices) == 1:
+                    frames[indices] = (parts[indices[0]], seq)
+                else:
+                    frames[indices] = (f'{{"type": "batch", "count": {len(indices)}, "notifications": ['
+                                       + ", ".join(parts[i] for i in indices) + "]}", seq)
+            return frames[indices]
+
+        matches: Dict[ClientConnection, List[int]] = {}
+        if self.index:
+            for i, (notification, _) in enumerate(batch):
+                for client in self._targeted(notification):
+                    matches.setdefault(client, []).append(i)
+        frames_queued = deliveries = 0
+        if self.firehose:
+            everything = tuple(range(len(batch)))
+            key = batch[0][1] if len(batch) == 1 else None  # Only a lone notification can coalesce
+            message, seq = frame(everything)
+            for client in list(self.firehose):
+                if client.enqueue(message, key, seq):
+                    frames_queued += 1
+                    deliveries += len(batch)
+        for client, indices in matches.items():
+            indices = tuple(indices)
+            message, seq = frame(indices)
+            if client.enqueue(message, batch[indices[0]][1] if len(indices) == 1 else None, seq):
+                frames_queued += 1
+                deliveries += len(indices)
+        self.stats["frames"] += frames_queued
+        self.stats["deliveries"] += deliveries
+
+    def wants(self, client: ClientConnection, notification: Dict[str, Any]) -> bool:
+        """Whether a client's subscriptions match a notification (used for replay)"""
+        if client in self.firehose:
+            return True
+        notification_type = notification.get("type")
+        if not client.topics:
+            return notification_type in client.types
+        if client.types and notification_type not in client.types:
+            return False
+        return not client.topics.isdisjoint(notification_topics(notification))
+
+    def send(self, client: ClientConnection, payload: Dict[str, Any], seq: Optional[int] = None) -> bool:
+        return client.enqueue(json.dumps(payload), seq=seq)
+
+    def broadcast(self, payload: Dict[str, Any], key: Optional[str] = None) -> int:
+        """Serialize once and queue for every client; returns the number of clients queued to"""
+        self.stats["broadcasts"] += 1
+        message = json.dumps(payload)
+        queued = 0
+        for client in list(self.clients.values()):
+            queued += client.enqueue(message, key)
+        return queued
+
+    def status(self) -> Dict[str, Any]:
+        clients = list(self.clients.values())
+        return {
+            "connected_clients": len(clients),
+            "event_streams": sum(1 for c in clients if isinstance(c, EventStreamClient)),
+            "unfiltered_clients": len(self.firehose),
+            "indexed_topics": len(self.index),
+            "policy": self.policy,
+            "max_queue": self.max_queue,
+            "queued_messages": sum(len(c.queue) for c in clients),
+            "slow_clients": sum(1 for c in clients if len(c.queue) >= self.max_queue // 2),
+            **self.stats,
+            "dropped": self.stats["dropped"] + sum(c.dropped for c in clients),
+            "coalesced": self.stats["coalesced"] + sum(c.coalesced for c in clients),
+        }
+
+
+notification_manager = ConnectionManager(
+    max_queue=settings.ws_send_queue_size,
+    send_timeout=settings.ws_send_timeout,
+    policy=settings.ws_slow_client_policy,
+    batch_window=settings.ws_batch_window_ms / 1000.0,
+)
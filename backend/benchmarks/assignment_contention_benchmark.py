@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Contention benchmark for shipment-to-truck assignment
+Fires 100 concurrent dispatch requests at a small pool of trucks and checks
+that no truck ends up carrying two assignments.
+
+Uses DATABASE_URL when set (PostgreSQL exercises SKIP LOCKED), otherwise a
+throwaway SQLite file (exercises the version check).
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/contention.db"
+os.environ.setdefault("DEBUG", "false")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+
+from app.api.shipments import TruckAssignmentRequest, assign_shipment_to_truck
+from app.models.base import Base, SessionLocal, engine
+from app.models.tables import Shipment, Truck
+
+REQUESTS = 100
+TRUCKS = 10
+
+
+def setup():
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        db.query(Shipment).filter(Shipment.tracking_number.like("BENCH-%")).delete(synchronize_session=False)
+        db.query(Truck).filter(Truck.plate_number.like("BENCH%")).delete(synchronize_session=False)
+        db.commit()
+        trucks = [Truck(plate_number=f"BENCH{i:03d}", status="available",
+                        capacity_weight=40000, capacity_volume=3000) for i in range(TRUCKS)]
+        shipments = [Shipment(tracking_number=f"BENCH-{i:05d}", origin="Chicago, IL",
+                              destination="Miami, FL", status="pending",
+                              cargo_weight=1000, cargo_volume=100) for i in range(REQUESTS)]
+        db.add_all(trucks + shipments)
+        db.commit()
+        return [t.id for t in trucks], [s.id for s in shipments]
+    finally:
+        db.close()
+
+
+def dispatch(shipment_id: int, truck_id: int) -> int:
+    db = SessionLocal()
+    try:
+        request = TruckAssignmentRequest(shipment_id=shipment_id, truck_id=truck_id)
+        asyncio.run(assign_shipment_to_truck(request, db))
+        return 200
+    except HTTPException as e:
+        return e.status_code
+    finally:
+        db.close()
+
+
+def main():
+    print("🔒 Assignment Contention Benchmark")
+    print(f"Database: {engine.dialect.name}")
+    truck_ids, shipment_ids = setup()
+
+    jobs = [(shipment_id, truck_ids[i % TRUCKS]) for i, shipment_id in enumerate(shipment_ids)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=REQUESTS) as pool:
+        outcomes = Counter(pool.map(lambda job: dispatch(*job), jobs))
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    try:
+        assigned = db.query(Shipment.assigned_truck_id).filter(
+            Shipment.id.in_(shipment_ids), Shipment.assigned_truck_id.isnot(None)
+        ).all()
+    finally:
+        db.close()
+    per_truck = Counter(truck_id for (truck_id,) in assigned)
+    double_booked = [truck_id for truck_id, count in per_truck.items() if count > 1]
+
+    print(f"Requests:             {REQUESTS} ({TRUCKS} trucks)")
+    print(f"Outcomes:             {dict(outcomes)}")
+    print(f"Throughput:           {REQUESTS / elapsed:.0f} requests/sec ({elapsed * 1000:.0f} ms total)")
+    print(f"Trucks assigned:      {len(per_truck)}")
+    print(f"Double assignments:   {len(double_booked)}")
+    if double_booked:
+        print("❌ Double-booked trucks detected")
+        sys.exit(1)
+    print("✅ No double assignments")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the bulk shipment import endpoint
+Streams 50k NDJSON rows through POST /api/shipments/bulk (target: 20k rows/sec)
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bulk.db"
+os.environ.setdefault("DEBUG", "false")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.base import Base, SessionLocal, engine
+from app.models.tables import Shipment
+
+ROWS = 50_000
+
+
+def ndjson_rows(count: int, prefix: str) -> bytes:
+    return b"".join(
+        json.dumps({
+            "tracking_number": f"{prefix}{i:07d}",
+            "origin": "Chicago, IL",
+            "destination": "Miami, FL",
+            "cargo_type": "dry_goods",
+            "cargo_weight": 1000 + i % 500,
+            "cargo_volume": 80 + i % 40,
+        }).encode() + b"\n"
+        for i in range(count)
+    )
+
+
+def run(client: TestClient, body: bytes, upsert: bool) -> float:
+    started = time.perf_counter()
+    response = client.post(
+        f"/api/shipments/bulk?upsert={'true' if upsert else 'false'}",
+        content=body,
+        headers={"content-type": "application/x-ndjson"},
+    )
+    elapsed = time.perf_counter() - started
+    summary = {k: v for k, v in response.json().items() if k != "results"}
+    print(f"  {summary}")
+    return elapsed
+
+
+def main():
+    print("📦 Bulk Import Benchmark")
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    db.query(Shipment).filter(Shipment.tracking_number.like("BULK%")).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+    client = TestClient(app)
+    body = ndjson_rows(ROWS, "BULK")
+
+    print(f"Inserting {ROWS} rows...")
+    elapsed = run(client, body, upsert=False)
+    print(f"Insert throughput:    {ROWS / elapsed:,.0f} rows/sec ({elapsed:.2f}s)")
+
+    print(f"Upserting {ROWS} existing rows...")
+    elapsed = run(client, body, upsert=True)
+    print(f"Upsert throughput:    {ROWS / elapsed:,.0f} rows/sec ({elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
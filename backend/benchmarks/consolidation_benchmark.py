@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the load consolidation engine
+Measures plan quality and solve time on 10k synthetic pending shipments
+"""
+
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.consolidation_service import ConsolidationService, cargo_class, lane_region
+
+CITIES = [
+    "New York, NY", "Chicago, IL", "Houston, TX", "Phoenix, AZ", "Atlanta, GA",
+    "Seattle, WA", "Denver, CO", "Miami, FL", "Boston, MA", "Los Angeles, CA",
+]
+CARGO_TYPES = ["dry_goods", "electronics", "furniture", "refrigerated", "frozen", "hazardous"]
+
+
+def build_dataset(shipment_count: int, truck_count: int, seed: int = 7):
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 15, 6, 0)
+    shipments = []
+    for shipment_id in range(1, shipment_count + 1):
+        origin, destination = rng.sample(CITIES, 2)
+        pickup = base + timedelta(hours=rng.randint(0, 72))
+        shipments.append({
+            "id": shipment_id,
+            "origin": origin,
+            "destination": destination,
+            "cargo_type": rng.choice(CARGO_TYPES),
+            "cargo_weight": rng.uniform(500, 12000),
+            "cargo_volume": rng.uniform(50, 900),
+            "pickup_time": pickup,
+            "delivery_deadline": pickup + timedelta(hours=rng.randint(24, 96)),
+        })
+    trucks = [
+        {
+            "id": truck_id,
+            "plate_number": f"TRK{truck_id:05d}",
+            "capacity_weight": rng.choice([26000, 34000, 45000]),
+            "capacity_volume": rng.choice([1700, 2400, 3400]),
+        }
+        for truck_id in range(1, truck_count + 1)
+    ]
+    return shipments, trucks
+
+
+def lower_bound(shipments, trucks):
+    """Trucks needed per lane/cargo class if every truck were the largest and perfectly packed"""
+    max_weight = max(t["capacity_weight"] for t in trucks)
+    max_volume = max(t["capacity_volume"] for t in trucks)
+    totals = {}
+    for s in shipments:
+        key = (lane_region(s["origin"]), lane_region(s["destination"]), cargo_class(s["cargo_type"]))
+        weight, volume = totals.get(key, (0.0, 0.0))
+        totals[key] = (weight + s["cargo_weight"], volume + s["cargo_volume"])
+    return sum(max(math.ceil(w / max_weight), math.ceil(v / max_volume)) for w, v in totals.values())
+
+
+def main():
+    print("🚚 Load Consolidation Benchmark")
+    shipments, trucks = build_dataset(10_000, 6_000)
+    service = ConsolidationService()
+
+    started = time.perf_counter()
+    result = service.plan(shipments, trucks)
+    elapsed = time.perf_counter() - started
+
+    summary = result["summary"]
+    bound = lower_bound(shipments, trucks)
+    print(f"Shipments:            {summary['shipments_considered']}")
+    print(f"Consolidated:         {summary['shipments_consolidated']}")
+    print(f"Unassigned:           {len(result['unassigned_shipment_ids'])}")
+    print(f"Trucks used:          {summary['trucks_used']} (lane lower bound {bound})")
+    print(f"Avg utilization:      {summary['avg_utilization']:.2%}")
+    print(f"Shipments per truck:  {summary['shipments_consolidated'] / max(summary['trucks_used'], 1):.2f}")
+    print(f"Solve time:           {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
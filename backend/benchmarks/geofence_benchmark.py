@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the geofence engine
+Matches 50k-point telemetry batches from 10k trucks against 5k fences
+(4k circles, 1k polygons) spread over the continental US, including the
+debounced per-truck enter/exit pass. No database access.
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.geofence_service import GeofenceEngine, GeofenceIndex
+
+FENCES = 5_000
+POLYGON_SHARE = 0.2
+TRUCKS = 10_000
+BATCH = 50_000
+BATCHES = 10
+
+
+def make_fences(rng):
+    fences = []
+    for i in range(FENCES):
+        lat, lng = rng.uniform(25.0, 48.0), rng.uniform(-124.0, -67.0)
+        if i < FENCES * POLYGON_SHARE:
+            angles = np.sort(rng.uniform(0, 2 * np.pi, 8))
+            radius = rng.uniform(0.002, 0.02)
+            polygon = [[lat + radius * np.sin(a), lng + radius * np.cos(a)] for a in angles]
+            fences.append({"id": i + 1, "name": f"F{i}", "kind": "depot", "shape": "polygon",
+                           "polygon": polygon, "location": None, "shipment_id": None})
+        else:
+            fences.append({"id": i + 1, "name": f"F{i}", "kind": "depot", "shape": "circle",
+                           "center_lat": lat, "center_lng": lng, "radius_m": rng.uniform(200, 2000),
+                           "location": None, "shipment_id": None})
+    return fences
+
+
+def main():
+    print("📍 Geofence Benchmark")
+    rng = np.random.default_rng(9)
+    fences = make_fences(rng)
+
+    started = time.perf_counter()
+    engine = GeofenceEngine(refresh_interval=float("inf"))
+    engine.index = GeofenceIndex(fences)
+    engine.fences_by_id = {f["id"]: f for f in fences}
+    engine.loaded_at = time.time()
+    print(f"Index build:          {(time.perf_counter() - started) * 1000:.0f} ms "
+          f"({FENCES:,} fences, {len(engine.index.cell_keys):,} cell entries)")
+
+    # A fifth of the trucks hover around fences, the rest are on the road
+    homes = rng.integers(0, FENCES, TRUCKS)
+    near = rng.random(TRUCKS) < 0.2
+    base_lat = np.where(near, [fences[h]["polygon"][0][0] if fences[h]["shape"] == "polygon"
+                               else fences[h]["center_lat"] for h in homes], rng.uniform(25.0, 48.0, TRUCKS))
+    base_lng = np.where(near, [fences[h]["polygon"][0][1] if fences[h]["shape"] == "polygon"
+                               else fences[h]["center_lng"] for h in homes], rng.uniform(-124.0, -67.0, TRUCKS))
+    start = datetime.now(timezone.utc)
+
+    elapsed, transitions = 0.0, 0
+    for b in range(BATCHES):
+        trucks = np.arange(BATCH) % TRUCKS
+        recorded_at = start + timedelta(seconds=b * 10)
+        lat = base_lat[trucks] + rng.normal(0, 0.005, BATCH)
+        lng = base_lng[trucks] + rng.normal(0, 0.005, BATCH)
+        samples = [
+            (int(truck) + 1, recorded_at + timedelta(milliseconds=i // TRUCKS), float(la), float(lo), None)
+            for i, (truck, la, lo) in enumerate(zip(trucks, lat, lng))
+        ]
+        t0 = time.perf_counter()
+        transitions += len(engine.process(samples))
+        elapsed += time.perf_counter() - t0
+
+    points = BATCH * BATCHES
+    print(f"Points matched:       {points:,} in {elapsed:.2f}s ({points / elapsed:,.0f} points/sec)")
+    print(f"Fence hits:           {engine.stats['fence_hits']:,}")
+    print(f"Confirmed transitions: {transitions:,}")
+    print(f"Per 50k batch:        {elapsed / BATCHES * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Background job queue benchmark
+Measures enqueue latency (one submit per job, as the API does), then
+throughput draining a backlog of QR-code and delivery-confirmation PDF jobs
+with 1 and 2 worker processes, then queue-to-start latency for a trickle of
+jobs arriving at idle workers (bounded by job_poll_interval).
+
+Uses DATABASE_URL when set (the jobs table), otherwise a throwaway SQLite
+file.
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+workdir = tempfile.mkdtemp()
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/jobs.db"
+os.environ.setdefault("DEBUG", "false")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ENQUEUE_JOBS = 2000
+BACKLOGS = [("pdf.qr_code", 1000), ("pdf.delivery_confirmation", 300)]
+WORKER_COUNTS = [1, 2]
+TRICKLE_JOBS = 50
+TRICKLE_RATE = 20.0  # Jobs per second
+
+SHIPMENT = {
+    "tracking_number": "SH042", "origin": "New York, NY", "destination": "Los Angeles, CA",
+    "cargo_type": "Electronics", "cargo_weight": 1000, "cargo_volume": 50, "priority": "high",
+    "pickup_time": "2025-01-15T08:00:00", "delivery_deadline": "2025-01-17T18:00:00",
+}
+
+
+def payload(kind, n):
+    if kind == "pdf.qr_code":
+        return {"data": f"SmartHaul:SH{n:05d}"}
+    return {"shipment_data": {**SHIPMENT, "tracking_number": f"SH{n:05d}"}}
+
+
+def start_workers(count):
+    from app.services.job_queue import run_worker
+
+    workers = [multiprocessing.get_context("spawn").Process(target=run_worker, daemon=True) for _ in range(count)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def stop_workers(workers):
+    for worker in workers:
+        worker.terminate()
+        worker.join()
+
+
+def wait_until_drained(job_queue, timeout=600):
+    started = time.perf_counter()
+    while True:
+        counts = job_queue.counts()
+        if not counts["queued"] and not counts["running"]:
+            return counts
+        if time.perf_counter() - started > timeout:
+            raise RuntimeError("Job backlog did not drain")
+        time.sleep(0.05)
+
+
+def clear(job_queue):
+    from app.models.base import SessionLocal
+    from app.models.tables import Job
+
+    db = SessionLocal()
+    try:
+        db.query(Job).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def start_latencies():
+    from app.models.base import SessionLocal
+    from app.models.tables import Job
+
+    db = SessionLocal()
+    try:
+        rows = db.query(Job.created_at, Job.started_at).filter(Job.status == "succeeded").all()
+    finally:
+        db.close()
+    return np.array([(started - created).total_seconds() * 1000 for created, started in rows])
+
+
+def main():
+    print("🧵 Job Queue Benchmark")
+    from app.models import tables
+    from app.models.base import Base, engine
+    from app.services.job_queue import job_queue
+
+    Base.metadata.create_all(engine)
+    print(f"CPUs: {os.cpu_count()}  poll interval: {job_queue.poll_interval * 1000:.0f} ms")
+
+    latencies = []
+    started = time.perf_counter()
+    for n in range(ENQUEUE_JOBS):
+        submitted = time.perf_counter()
+        job_queue.submit("pdf.qr_code", payload("pdf.qr_code", n))
+        latencies.append((time.perf_counter() - submitted) * 1000)
+    elapsed = time.perf_counter() - started
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"Enqueue:       {ENQUEUE_JOBS / elapsed:8,.0f} jobs/s  latency p50 {p50:.2f} ms  p99 {p99:.2f} ms")
+    clear(job_queue)
+
+    for kind, count in BACKLOGS:
+        for workers in WORKER_COUNTS:
+            for n in range(count):
+                job_queue.submit(kind, payload(kind, n))
+            pool = start_workers(workers)
+            started = time.perf_counter()
+            try:
+                counts = wait_until_drained(job_queue)
+            finally:
+                stop_workers(pool)
+            elapsed = time.perf_counter() - started
+            print(f"{kind + ':':<27} {workers} worker{'s' if workers > 1 else ' '}  "
+                  f"{count / elapsed:7,.1f} jobs/s  ({counts['succeeded']:,} succeeded, {counts['failed']} failed, "
+                  f"{elapsed:5.1f}s incl. worker start)")
+            clear(job_queue)
+
+    pool = start_workers(1)
+    try:
+        time.sleep(3)  # Let the worker finish importing
+        for n in range(TRICKLE_JOBS):
+            job_queue.submit("pdf.qr_code", payload("pdf.qr_code", n))
+            time.sleep(1 / TRICKLE_RATE)
+        wait_until_drained(job_queue)
+    finally:
+        stop_workers(pool)
+    waits = start_latencies()
+    p50, p95, worst = np.percentile(waits, [50, 95, 100])
+    print(f"Queue-to-start ({TRICKLE_RATE:.0f} jobs/s to an idle worker): p50 {p50:.0f} ms  p95 {p95:.0f} ms  "
+          f"max {worst:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Cross-worker delivery benchmark for the notification bus
+Runs 4 notifications workers (uvicorn, one port each) joined by the bus,
+spreads WebSocket clients evenly across them and POSTs notifications to
+each worker in turn, timing delivery to clients on the publishing worker
+and on the others.
+
+Uses the Unix socket bus unless NOTIFICATION_BUS is set (redis/postgres
+need NOTIFICATION_BUS_URL or a reachable default), and DATABASE_URL for the
+notification log when set, otherwise a throwaway SQLite file. Needs
+uvicorn[standard].
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+os.environ.setdefault("NOTIFICATION_BUS", "socket")
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("NOTIFICATION_SOCKET_DIR", os.path.join(workdir, "bus"))
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bus.db"
+os.environ.setdefault("DEBUG", "false")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import websockets
+
+WORKERS = 4
+CLIENTS_PER_WORKER = 250
+NOTIFICATIONS = 40
+BASE_PORT = 8770
+
+
+def serve(port):
+    import uvicorn
+    from fastapi import FastAPI
+
+    from app.api import notifications
+    from app.services.notification_bus import notification_bus
+
+    app = FastAPI()
+    app.include_router(notifications.router, prefix="/api/notifications")
+    app.router.on_startup.append(notification_bus.start)
+    app.router.on_shutdown.append(notification_bus.stop)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", ws="websockets")
+
+
+async def wait_for_workers(http):
+    for port in range(BASE_PORT, BASE_PORT + WORKERS):
+        for _ in range(100):
+            try:
+                status = (await http.get(f"http://127.0.0.1:{port}/api/notifications/status")).json()
+                if status["bus"]["started"]:
+                    break
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError(f"Worker on port {port} did not start")
+
+
+async def open_clients(port):
+    async def connect():
+        socket = await websockets.connect(f"ws://127.0.0.1:{port}/api/notifications/ws/notifications")
+        await socket.recv()  # Welcome message
+        return socket
+
+    return await asyncio.gather(*[connect() for _ in range(CLIENTS_PER_WORKER)])
+
+
+async def arrival(socket):
+    message = await socket.recv()
+    return time.perf_counter(), json.loads(message)
+
+
+async def main_async():
+    async with httpx.AsyncClient(timeout=30) as http:
+        await wait_for_workers(http)
+        workers = [await open_clients(BASE_PORT + w) for w in range(WORKERS)]
+        print(f"Workers:              {WORKERS} x {CLIENTS_PER_WORKER} clients ({os.environ['NOTIFICATION_BUS']} bus)")
+
+        local, remote = [], []
+        for n in range(NOTIFICATIONS):
+            origin = n % WORKERS
+            receive = [asyncio.gather(*[arrival(socket) for socket in sockets]) for sockets in workers]
+            sent_at = time.perf_counter()
+            await http.post(f"http://127.0.0.1:{BASE_PORT + origin}/api/notifications/urgent", json={
+                "type": "urgent_alert", "message": f"Bus {n}", "timestamp": "now", "shipment_id": n,
+            })
+            for w, received in enumerate(await asyncio.gather(*receive)):
+                assert all(message["message"] == f"Bus {n}" for _, message in received)
+                # Time until the last client on this worker had it
+                (local if w == origin else remote).append(max(at for at, _ in received) - sent_at)
+
+        for label, samples in (("Publishing worker", local), ("Other workers", remote)):
+            samples = np.array(samples) * 1000
+            print(f"{label + ':':<21} p50 {np.percentile(samples, 50):6.1f} ms  "
+                  f"p99 {np.percentile(samples, 99):6.1f} ms  (POST to last of {CLIENTS_PER_WORKER} clients)")
+
+        for w in range(WORKERS):
+            status = (await http.get(f"http://127.0.0.1:{BASE_PORT + w}/api/notifications/status")).json()["bus"]
+            print(f"Worker {w} bus:         published {status['published']}, received {status['received']}, "
+                  f"errors {status['send_errors'] + status['receive_errors']}")
+
+        await asyncio.gather(*[socket.close() for sockets in workers for socket in sockets], return_exceptions=True)
+
+
+def create_tables():
+    from app.models import tables
+    from app.models.base import Base, engine
+
+    Base.metadata.create_all(engine)
+
+
+def main():
+    print("🛰️  Notification Bus Benchmark")
+    create_tables()
+    context = multiprocessing.get_context("spawn")
+    servers = [context.Process(target=serve, args=(BASE_PORT + w,), daemon=True) for w in range(WORKERS)]
+    for server in servers:
+        server.start()
+    try:
+        asyncio.run(main_async())
+    finally:
+        for server in servers:
+            server.terminate()
+            server.join()
+
+
+if __name__ == "__main__":
+    main()
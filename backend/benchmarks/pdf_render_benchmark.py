@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+PDF rendering benchmark: inline vs process pool
+Serves the PDF router with uvicorn in a child process, keeps 8 clients
+requesting delivery confirmations for 10s and meanwhile probes a trivial
+endpoint every 20 ms. Reports PDFs/sec and the probe's p50/p99 latency
+(what every other request and WebSocket on the worker experiences) with
+rendering inline on the event loop (the old behaviour) and in the render
+pool, then fires a burst larger than pdf_render_queue to show 503
+backpressure.
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file (nothing is
+written; the PDF router only imports the job queue). Needs uvicorn.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+workdir = tempfile.mkdtemp()
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/pdf.db"
+os.environ.setdefault("DEBUG", "false")
+os.environ.setdefault("PDF_RENDER_QUEUE", "16")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+PORT = 8782
+BASE_URL = f"http://127.0.0.1:{PORT}"
+CLIENTS = 8
+DURATION = 10.0
+PROBE_INTERVAL = 0.02
+BURST = 100
+
+
+def serve():
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import Response
+
+    from app.api import pdf
+    from app.services.pdf_render_pool import pdf_render_pool
+    from app.services.pdf_service import PDFService
+
+    app = FastAPI()
+    app.include_router(pdf.router)
+    inline_service = PDFService()
+
+    @app.on_event("startup")
+    async def warm():
+        await pdf_render_pool.start()
+
+    @app.post("/inline/delivery-confirmation/{shipment_id}")
+    async def inline(shipment_id: int):
+        return Response(inline_service.generate_delivery_confirmation({"tracking_number": f"SH{shipment_id:03d}"}),
+                        media_type="application/pdf")
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    uvicorn.run(app, host="127.0.0.1", port=PORT, log_level="warning")
+
+
+async def load(http, path, stop_at):
+    rendered = 0
+    while time.perf_counter() < stop_at:
+        response = await http.post(path)
+        rendered += response.status_code == 200
+    return rendered
+
+
+async def probe(http, stop_at):
+    latencies = []
+    while time.perf_counter() < stop_at:
+        started = time.perf_counter()
+        await http.get("/ping")
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(PROBE_INTERVAL)
+    return latencies
+
+
+async def measure(http, label, path):
+    stop_at = time.perf_counter() + DURATION
+    results = await asyncio.gather(probe(http, stop_at), *[load(http, path, stop_at) for _ in range(CLIENTS)])
+    latencies, rendered = results[0], sum(results[1:])
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"{label + ':':<8} {rendered / DURATION:6.1f} PDFs/s   /ping p50 {p50:6.1f} ms  p99 {p99:7.1f} ms")
+
+
+async def run():
+    limits = httpx.Limits(max_connections=BURST + 10)
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=60, limits=limits) as http:
+        for _ in range(200):
+            try:
+                if (await http.get("/api/pdf/status")).json()["started"]:
+                    break
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(2)  # Pool warm-up renders
+        await measure(http, "Inline", "/inline/delivery-confirmation/1")
+        await measure(http, "Pool", "/api/pdf/delivery-confirmation/1")
+
+        responses = await asyncio.gather(*[http.post(f"/api/pdf/delivery-confirmation/{n}") for n in range(BURST)])
+        codes = [response.status_code for response in responses]
+        status = (await http.get("/api/pdf/status")).json()
+        print(f"Burst of {BURST}: {codes.count(200)} rendered, {codes.count(503)} rejected with 503 "
+              f"(queue limit {status['max_pending']}, avg render {status['avg_render_ms']} ms)")
+
+
+def main():
+    print("🖨️  PDF Render Benchmark")
+    print(f"CPUs: {os.cpu_count()}  clients: {CLIENTS}  duration: {DURATION:.0f}s per mode")
+    server = multiprocessing.get_context("spawn").Process(target=serve)
+    server.start()
+    try:
+        asyncio.run(run())
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
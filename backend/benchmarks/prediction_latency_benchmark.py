@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for GET /api/shipments/{id}/prediction
+Fires 1,000 concurrent requests for distinct active shipments through the ASGI
+app and reports p50/p95/p99 latency with micro-batching, without it (one
+model call per request), and again on a warm prediction cache.
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+workdir = tempfile.mkdtemp()
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/prediction.db"
+os.environ.setdefault("DEBUG", "false")
+os.environ.setdefault("MODEL_DIR", workdir)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from app.main import app
+from app.models.base import Base, SessionLocal, engine
+from app.models.tables import Shipment
+from app.services.eta_service import prediction_batcher
+from app.core.performance import cache
+
+CONCURRENCY = 1_000
+PRIORITIES = ["low", "normal", "high", "urgent"]
+
+
+def seed_shipments():
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    db.query(Shipment).filter(Shipment.tracking_number.like("PRED%")).delete(synchronize_session=False)
+    now = datetime.now(timezone.utc)
+    rng = np.random.default_rng(3)
+    db.execute(Shipment.__table__.insert(), [
+        {
+            "tracking_number": f"PRED{i:06d}",
+            "origin": f"City {i % 150}, IL",
+            "destination": f"City {i % 90}, TX",
+            "status": "in_transit" if i % 2 else "assigned",
+            "priority": PRIORITIES[i % 4],
+            "route_distance": float(rng.uniform(50, 2000)),
+            "pickup_time": now - timedelta(hours=float(rng.uniform(0, 20))),
+            "delivery_deadline": now + timedelta(hours=float(rng.uniform(2, 40))),
+            "version": 1,
+        }
+        for i in range(CONCURRENCY)
+    ])
+    db.commit()
+    ids = [row[0] for row in db.query(Shipment.id).filter(Shipment.tracking_number.like("PRED%")).all()]
+    db.close()
+    return ids
+
+
+async def burst(client, ids):
+    async def one(shipment_id):
+        started = time.perf_counter()
+        response = await client.get(f"/api/shipments/{shipment_id}/prediction")
+        assert response.status_code == 200, response.text
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = np.array(await asyncio.gather(*[one(shipment_id) for shipment_id in ids])) * 1000
+    wall = time.perf_counter() - started
+    return latencies, wall
+
+
+def report(label, latencies, wall):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"{label:<22} p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  p99 {p99:7.1f} ms  "
+          f"({len(latencies) / wall:,.0f} req/sec)")
+
+
+async def clear_cache(ids):
+    model_version = prediction_batcher.engine.get_model().version
+    for shipment_id in ids:
+        await cache.delete(f"prediction:{shipment_id}:1:{model_version}")
+
+
+async def run(ids):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get(f"/api/shipments/{ids[0]}/prediction")  # Load the model and warm the pool
+
+        prediction_batcher.max_batch, prediction_batcher.window = 1, 0.0
+        await clear_cache(ids)
+        report("Unbatched (cold)", *await burst(client, ids))
+
+        prediction_batcher.max_batch, prediction_batcher.window = 256, 0.005
+        await clear_cache(ids)
+        batches = prediction_batcher.stats["batches"]
+        report("Micro-batched (cold)", *await burst(client, ids))
+        print(f"{'':<22} {prediction_batcher.stats['batches'] - batches} model calls for {len(ids):,} requests")
+
+        report("Micro-batched (warm)", *await burst(client, ids))
+
+
+def main():
+    print("🔮 Prediction Latency Benchmark")
+    ids = seed_shipments()
+    print(f"Concurrent requests:  {len(ids):,}")
+    asyncio.run(run(ids))
+
+
+if __name__ == "__main__":
+    main()
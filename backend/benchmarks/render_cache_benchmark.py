@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Render cache benchmark
+Serves the PDF router with uvicorn in a child process and keeps 8 clients
+requesting delivery confirmations for 5s in three modes: cold (a new
+shipment every request, so every request renders), warm (a working set of
+50 shipments already in the cache, served from disk) and revalidate (clients
+send If-None-Match and get 304 without a body). Then renders more distinct
+documents than render_cache_max_mb (1 MB unless set) holds and checks the
+cache directory stays under the bound.
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file (nothing is
+written; the PDF router only imports the job queue). The cache lives in a
+temporary upload_dir. Needs uvicorn.
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+workdir = tempfile.mkdtemp()
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/pdf.db"
+os.environ.setdefault("DEBUG", "false")
+os.environ.setdefault("UPLOAD_DIR", workdir)  # The spawned server inherits the parent's directory
+os.environ.setdefault("RENDER_CACHE_MAX_MB", "1")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+PORT = 8783
+BASE_URL = f"http://127.0.0.1:{PORT}"
+CLIENTS = 8
+DURATION = 5.0
+WORKING_SET = 50
+OVERFILL = 600  # Distinct documents rendered to overflow the cache (1 MB by default)
+
+
+def serve():
+    import uvicorn
+    from fastapi import FastAPI
+
+    from app.api import pdf
+    from app.services.pdf_render_pool import pdf_render_pool
+
+    app = FastAPI()
+    app.include_router(pdf.router)
+
+    @app.on_event("startup")
+    async def warm():
+        await pdf_render_pool.start()
+
+    uvicorn.run(app, host="127.0.0.1", port=PORT, log_level="warning")
+
+
+async def load(http, shipments, etags, stop_at):
+    latencies = []
+    while time.perf_counter() < stop_at:
+        shipment_id = next(shipments)
+        headers = {"If-None-Match": etags[shipment_id]} if etags else None
+        started = time.perf_counter()
+        response = await http.post(f"/api/pdf/delivery-confirmation/{shipment_id}", headers=headers)
+        if response.status_code in (200, 304):
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+async def measure(http, label, shipments, etags=None):
+    stop_at = time.perf_counter() + DURATION
+    results = await asyncio.gather(*[load(http, shipments, etags, stop_at) for _ in range(CLIENTS)])
+    latencies = [latency for result in results for latency in result]
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"{label + ':':<12} {len(latencies) / DURATION:8,.1f} req/s   latency p50 {p50:6.1f} ms  p99 {p99:7.1f} ms")
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+async def run():
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=60) as http:
+        for _ in range(200):
+            try:
+                if (await http.get("/api/pdf/status")).json()["started"]:
+                    break
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(2)  # Pool warm-up renders
+
+        await measure(http, "Cold", itertools.count(1000))
+        etags = {}
+        for shipment_id in range(WORKING_SET):
+            response = await http.post(f"/api/pdf/delivery-confirmation/{shipment_id}")
+            etags[shipment_id] = response.headers["etag"]
+        await measure(http, "Warm", itertools.cycle(range(WORKING_SET)))
+        await measure(http, "Revalidate", itertools.cycle(range(WORKING_SET)), etags)
+
+        for shipment_id in range(100000, 100000 + OVERFILL):
+            await http.post(f"/api/pdf/delivery-confirmation/{shipment_id}")
+        cache = (await http.get("/api/pdf/status")).json()["cache"]
+        on_disk = directory_size(os.path.join(os.environ["UPLOAD_DIR"], "render-cache")) / 1048576
+        print(f"Eviction: {cache['files']} files, {on_disk:.2f} MB on disk (limit {cache['max_mb']} MB), "
+              f"{cache['evicted']:,} evicted, hit rate {cache['hit_rate']}")
+
+
+def main():
+    print("🗃️  Render Cache Benchmark")
+    print(f"CPUs: {os.cpu_count()}  clients: {CLIENTS}  duration: {DURATION:.0f}s per mode")
+    server = multiprocessing.get_context("spawn").Process(target=serve)
+    server.start()
+    try:
+        asyncio.run(run())
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
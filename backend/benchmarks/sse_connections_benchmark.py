@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Idle-connection benchmark for /api/notifications/stream (Server-Sent Events)
+Serves the notifications router with uvicorn in a child process, holds 20k
+idle SSE connections open and reports server memory per connection and the
+time for one notification to reach all of them, then repeats with the same
+number of WebSocket clients on a fresh server for comparison.
+
+Set SSE_BENCH_CLIENTS to change the count (each process needs that many
+file descriptors; the limit is raised to the hard limit). Uses DATABASE_URL
+when set (notification log), otherwise a throwaway SQLite file. Needs
+uvicorn[standard].
+"""
+
+import asyncio
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import psutil
+
+workdir = tempfile.mkdtemp()
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/sse.db"
+os.environ.setdefault("DEBUG", "false")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import websockets
+
+CLIENTS = int(os.environ.get("SSE_BENCH_CLIENTS", 20_000))
+PORT = 8780
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def serve():
+    raise_fd_limit()
+    import uvicorn
+    from fastapi import FastAPI
+
+    from app.api import notifications
+
+    app = FastAPI()
+    app.include_router(notifications.router, prefix="/api/notifications")
+    uvicorn.run(app, host="127.0.0.1", port=PORT, log_level="warning", backlog=4096)
+
+
+async def wait_for_server(http):
+    for _ in range(100):
+        try:
+            await http.get("/api/notifications/status")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Benchmark server did not start")
+
+
+async def open_stream():
+    reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+    writer.write(f"GET /api/notifications/stream HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+                 f"Accept: text/event-stream\r\n\r\n".encode())
+    await reader.readuntil(b'"type": "connection"')
+    return reader, writer
+
+
+async def open_websocket():
+    socket = await websockets.connect(f"ws://127.0.0.1:{PORT}/api/notifications/ws/notifications",
+                                      max_queue=4, open_timeout=60)
+    await socket.recv()  # Welcome message
+    return socket
+
+
+async def wait_stream(stream):
+    await stream[0].readuntil(b'"type": "delay_alert"')
+
+
+async def wait_websocket(socket):
+    await socket.recv()
+
+
+async def measure(label, server_pid, open_client, wait_client):
+    server = psutil.Process(server_pid)
+    gate = asyncio.Semaphore(500)
+
+    async def connect():
+        async with gate:
+            return await open_client()
+
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=60) as http:
+        await wait_for_server(http)
+        await http.get("/api/notifications/status")
+        baseline = server.memory_info().rss
+        started = time.perf_counter()
+        clients = await asyncio.gather(*[connect() for _ in range(CLIENTS)])
+        connect_s = time.perf_counter() - started
+        await asyncio.sleep(1)
+        per_client = (server.memory_info().rss - baseline) / len(clients)
+
+        started = time.perf_counter()
+        await http.post("/api/notifications/delay", json={
+            "type": "delay_alert", "message": "Benchmark", "timestamp": "now", "shipment_id": 1,
+        })
+        await asyncio.gather(*[wait_client(client) for client in clients])
+        delivered_s = time.perf_counter() - started
+        connected = (await http.get("/api/notifications/status")).json()["fan_out"]["connected_clients"]
+
+    print(f"{label + ':':<12} {connected:,} connected in {connect_s:.1f}s  "
+          f"server memory {per_client / 1024:5.1f} KiB/connection  "
+          f"broadcast to all {delivered_s * 1000:6.0f} ms")
+    return clients
+
+
+def run_phase(label, open_client, wait_client, close_client):
+    server = multiprocessing.get_context("spawn").Process(target=serve, daemon=True)
+    server.start()
+    try:
+        async def phase():
+            clients = await measure(label, server.pid, open_client, wait_client)
+            await asyncio.gather(*[close_client(client) for client in clients], return_exceptions=True)
+
+        asyncio.run(phase())
+    finally:
+        server.terminate()
+        server.join()
+
+
+async def close_stream(stream):
+    stream[1].close()
+
+
+async def close_websocket(socket):
+    await socket.close()
+
+
+def main():
+    print("📡 SSE Connections Benchmark")
+    from app.models import tables
+    from app.models.base import Base, engine
+
+    Base.metadata.create_all(engine)
+    limit = raise_fd_limit()
+    print(f"Idle clients:  {CLIENTS:,} (file descriptor limit {limit:,})")
+    run_phase("SSE", open_stream, wait_stream, close_stream)
+    run_phase("WebSocket", open_websocket, wait_websocket, close_websocket)
+
+
+if __name__ == "__main__":
+    main()
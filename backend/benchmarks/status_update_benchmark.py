@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Write throughput benchmark for shipment status updates
+Compares the single-statement UPDATE ... RETURNING path used by
+PUT /api/shipments/{id} against the old fetch/commit/refresh sequence,
+with concurrent writers flipping statuses on a shared set of shipments.
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/updates.db"
+os.environ.setdefault("DEBUG", "false")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.api.shipments import ShipmentUpdate, update_shipment
+from app.models.base import Base, SessionLocal, engine
+from app.models.tables import Shipment
+
+SHIPMENTS = 200
+WRITERS = 16
+UPDATES_PER_WRITER = 250
+STATUSES = ["assigned", "in_transit", "delivered"]
+
+
+def setup():
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        db.query(Shipment).filter(Shipment.tracking_number.like("UPD-%")).delete(synchronize_session=False)
+        shipments = [Shipment(tracking_number=f"UPD-{i:05d}", origin="Chicago, IL",
+                              destination="Miami, FL", status="pending") for i in range(SHIPMENTS)]
+        db.add_all(shipments)
+        db.commit()
+        return [s.id for s in shipments]
+    finally:
+        db.close()
+
+
+def returning_update(shipment_id: int, new_status: str):
+    db = SessionLocal()
+    try:
+        asyncio.run(update_shipment(shipment_id, ShipmentUpdate(status=new_status), db))
+    finally:
+        db.close()
+
+
+def legacy_update(shipment_id: int, new_status: str):
+    db = SessionLocal()
+    try:
+        db_shipment = db.query(Shipment).filter(Shipment.id == shipment_id).first()
+        db_shipment.status = new_status
+        db_shipment.updated_at = datetime.utcnow()
+        db.commit()
+        db.refresh(db_shipment)
+    except StaleDataError:
+        db.rollback()
+    finally:
+        db.close()
+
+
+def measure(label: str, write, shipment_ids):
+    rng = random.Random(11)
+    jobs = [(rng.choice(shipment_ids), rng.choice(STATUSES)) for _ in range(WRITERS * UPDATES_PER_WRITER)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=WRITERS) as pool:
+        list(pool.map(lambda job: write(*job), jobs))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28}{len(jobs) / elapsed:>8,.0f} writes/sec ({len(jobs)} writes, {WRITERS} writers)")
+
+
+def main():
+    print("✏️  Status Update Benchmark")
+    print(f"Database: {engine.dialect.name}")
+    shipment_ids = setup()
+    measure("fetch/commit/refresh:", legacy_update, shipment_ids)
+    measure("UPDATE ... RETURNING:", returning_update, shipment_ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the telemetry history store (columnar file backend)
+Appends one day of 10-second pings from 500 trucks (4.3M samples), downsamples
+raw -> 1m -> 1h, seals the day and times track queries at each resolution.
+Also compares the compact array payload with per-point JSON objects.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.timeseries_service import DAY, FileTelemetryStore, LEVELS
+
+TRUCKS = 500
+INTERVAL = 10  # Seconds between pings
+FLUSH_SECONDS = 60  # Append granularity, one write per simulated minute
+
+
+def main():
+    print("🗄️  Telemetry History Benchmark")
+    rng = np.random.default_rng(5)
+    root = tempfile.mkdtemp()
+    store = FileTelemetryStore(root)
+    day_start = (time.time() // DAY - 2) * DAY  # A closed day inside every retention window
+
+    ticks = np.arange(0, DAY, INTERVAL)
+    started = time.perf_counter()
+    for flush_start in range(0, DAY, FLUSH_SECONDS):
+        window = ticks[(ticks >= flush_start) & (ticks < flush_start + FLUSH_SECONDS)]
+        n = len(window) * TRUCKS
+        store._append(LEVELS["raw"], {
+            "truck_id": np.tile(np.arange(1, TRUCKS + 1), len(window)),
+            "t": np.repeat(day_start + window, TRUCKS),
+            "lat": rng.uniform(25.0, 48.0, n),
+            "lng": rng.uniform(-124.0, -67.0, n),
+            "temperature": rng.normal(-18.0, 1.5, n),
+        })
+    append_s = time.perf_counter() - started
+    total = len(ticks) * TRUCKS
+
+    started = time.perf_counter()
+    written = store.run_rollups(day_start + DAY + 3600)
+    rollup_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    store.prepare(day_start + DAY + 3600)
+    seal_s = time.perf_counter() - started
+
+    print(f"Samples appended:     {total:,} in {append_s:.2f}s ({total / append_s:,.0f}/sec)")
+    print(f"Rollups:              {written} in {rollup_s:.2f}s")
+    print(f"Seal (sort + dedupe): {seal_s:.2f}s")
+
+    for resolution, span in (("raw", 6 * 3600), ("1m", DAY), ("1h", DAY)):
+        started = time.perf_counter()
+        rounds = 20
+        for truck_id in range(1, rounds + 1):
+            track = store.track(truck_id, day_start, day_start + span, resolution)
+        query_ms = (time.perf_counter() - started) * 1000 / rounds
+        compact = len(json.dumps(track))
+        per_point = len(json.dumps([
+            {name: track[name][i] for name in ("t", "lat", "lng", "temperature")} for i in range(track["points"])
+        ]))
+        print(f"Track {resolution:>3} ({track['points']:>5} pts): {query_ms:6.1f} ms, "
+              f"{compact / 1024:,.0f} KiB arrays vs {per_point / 1024:,.0f} KiB objects")
+
+    shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Outbound webhook dispatcher benchmark
+Serves a stand-in webhook receiver with uvicorn in a child process: /ok
+accepts everything, /flaky answers 503 to one request in twenty and /gone
+always answers 410. Queues 10k events for /ok and /flaky, drains the queue
+and reports enqueue and delivery throughput (events/sec), batches, retries
+and duplicates, one event per POST versus 100-event batches. A final phase
+checks that /gone events become dead letters and can be requeued.
+Set WEBHOOK_BENCH_EVENTS to change the event count.
+
+Uses DATABASE_URL when set (the webhook_deliveries table), otherwise a
+throwaway SQLite file. Needs uvicorn.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+workdir = tempfile.mkdtemp()
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/webhooks.db"
+os.environ.setdefault("DEBUG", "false")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+EVENTS = int(os.environ.get("WEBHOOK_BENCH_EVENTS", 10_000))
+PORT = 8781
+BASE_URL = f"http://127.0.0.1:{PORT}"
+BATCH_SIZES = [1, 100]
+FLAKY_EVERY = 20
+
+
+def serve():
+    import uvicorn
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI()
+    received = {"ok": [], "flaky": [], "gone": []}
+    requests = {"flaky": 0}
+
+    @app.post("/ok")
+    async def ok(request: Request):
+        received["ok"].extend(event["id"] for event in (await request.json())["events"])
+        return {"received": True}
+
+    @app.post("/flaky")
+    async def flaky(request: Request):
+        requests["flaky"] += 1
+        if requests["flaky"] % FLAKY_EVERY == 0:
+            return JSONResponse({"error": "try later"}, status_code=503)
+        received["flaky"].extend(event["id"] for event in (await request.json())["events"])
+        return {"received": True}
+
+    @app.post("/gone")
+    async def gone():
+        return JSONResponse({"error": "workflow deleted"}, status_code=410)
+
+    @app.get("/received")
+    async def summary():
+        return {name: {"events": len(ids), "unique": len(set(ids))} for name, ids in received.items()}
+
+    @app.post("/reset")
+    async def reset():
+        for ids in received.values():
+            ids.clear()
+        return {}
+
+    uvicorn.run(app, host="127.0.0.1", port=PORT, log_level="warning")
+
+
+def make_events(count, offset=0):
+    return [
+        {"type": "shipment_update", "operation": "update", "shipment_id": offset + n,
+         "changes": {"status": ["assigned", "in_transit"]}, "message": f"Shipment {offset + n} is now in_transit"}
+        for n in range(count)
+    ]
+
+
+async def drain(dispatcher, timeout=300):
+    runner = asyncio.create_task(dispatcher.run())
+    started = time.perf_counter()
+    try:
+        while dispatcher.counts()["pending"]:
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError("Webhook queue did not drain")
+            await asyncio.sleep(0.05)
+    finally:
+        runner.cancel()
+        await dispatcher.stop()
+    return time.perf_counter() - started
+
+
+async def throughput(batch_size, http):
+    from app.services.webhook_service import WebhookDispatcher
+
+    await http.post("/reset")
+    dispatcher = WebhookDispatcher(
+        destinations=[f"{BASE_URL}/ok", f"{BASE_URL}/flaky"], event_types=["shipment_update"],
+        batch_size=batch_size, retry_base=0.05, retry_max=0.5, poll_interval=0.05,
+    )
+    events = make_events(EVENTS)
+    started = time.perf_counter()
+    for start in range(0, EVENTS, 500):
+        await dispatcher.enqueue(*events[start:start + 500])
+    enqueue_s = time.perf_counter() - started
+    drain_s = await drain(dispatcher)
+    received = (await http.get("/received")).json()
+    delivered = received["ok"]["unique"] + received["flaky"]["unique"]
+    duplicates = sum(summary["events"] - summary["unique"] for summary in received.values())
+    stats = dispatcher.stats
+    print(f"Batch {batch_size:>3}:  enqueue {2 * EVENTS / enqueue_s:>8,.0f} events/s  "
+          f"deliver {delivered / drain_s:>7,.0f} events/s ({drain_s:5.1f}s)  "
+          f"{stats['batches']:>6,} POSTs  {stats['failed_batches']:>5,} failed  "
+          f"{stats['retried']:>5,} retried  {duplicates} duplicates  "
+          f"{delivered:,}/{2 * EVENTS:,} delivered")
+
+
+async def dead_letters():
+    from app.services.webhook_service import WebhookDispatcher
+
+    dispatcher = WebhookDispatcher(
+        destinations=[f"{BASE_URL}/gone"], event_types=["shipment_update"],
+        batch_size=50, retry_base=0.05, retry_max=0.5, poll_interval=0.05,
+    )
+    await dispatcher.enqueue(*make_events(120))
+    await drain(dispatcher)
+    dead = dispatcher.counts()["dead"]
+    sample = dispatcher.dead_letters(1)[0]
+    requeued = dispatcher.requeue()
+    pending = dispatcher.counts()["pending"]
+    purged = dispatcher.purge()
+    print(f"Dead letters: {dead} after one attempt each ({sample['last_error'][:40]}...), "
+          f"{requeued} requeued ({pending} pending), {purged} purged")
+
+
+async def run():
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=30) as http:
+        for _ in range(100):
+            try:
+                await http.get("/received")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        for batch_size in BATCH_SIZES:
+            await throughput(batch_size, http)
+    await dead_letters()
+
+
+def main():
+    print("🪝 Webhook Dispatcher Benchmark")
+    from app.models import tables
+    from app.models.base import Base, engine
+
+    Base.metadata.create_all(engine)
+    print(f"Events: {EVENTS:,} to each of /ok and /flaky (every {FLAKY_EVERY}th POST to /flaky fails with 503)")
+    server = multiprocessing.get_context("spawn").Process(target=serve, daemon=True)
+    server.start()
+    try:
+        asyncio.run(run())
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
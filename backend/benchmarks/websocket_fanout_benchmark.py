@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Fan-out latency benchmark for /api/notifications/ws/notifications
+Serves the notifications router with uvicorn in a child process, opens 10k
+local WebSocket clients (200 of which stop reading after connecting) and
+times each broadcast from the POST that triggers it to receipt by every
+reading client, then subscribes each reader to one shipment and times a
+targeted publish.
+
+Uses DATABASE_URL when set (notification log), otherwise a throwaway SQLite
+file. Needs uvicorn[standard] (uvicorn + websockets) and a file descriptor
+limit above 10k (ulimit -n).
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+workdir = tempfile.mkdtemp()
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/fanout.db"
+os.environ.setdefault("DEBUG", "false")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import websockets
+
+CLIENTS = 10_000
+SLOW_CLIENTS = 200  # Connect, then never read
+BROADCASTS = 20
+PORT = 8765
+URI = f"ws://127.0.0.1:{PORT}/api/notifications/ws/notifications"
+
+
+def serve():
+    import uvicorn
+    from fastapi import FastAPI
+
+    from app.api import notifications
+
+    app = FastAPI()
+    app.include_router(notifications.router, prefix="/api/notifications")
+    uvicorn.run(app, host="127.0.0.1", port=PORT, log_level="warning", ws="websockets", backlog=4096)
+
+
+async def wait_for_server(http):
+    for _ in range(100):
+        try:
+            await http.get("/api/notifications/status")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Benchmark server did not start")
+
+
+async def open_clients(count):
+    gate = asyncio.Semaphore(500)
+
+    async def connect():
+        async with gate:
+            socket = await websockets.connect(URI, max_queue=16, open_timeout=60)
+            await socket.recv()  # Welcome message
+            return socket
+
+    return await asyncio.gather(*[connect() for _ in range(count)])
+
+
+async def main_async():
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=60) as http:
+        await wait_for_server(http)
+        started = time.perf_counter()
+        sockets = await open_clients(CLIENTS)
+        print(f"Connected:            {len(sockets):,} clients in {time.perf_counter() - started:.1f}s")
+        readers, idle = sockets[SLOW_CLIENTS:], sockets[:SLOW_CLIENTS]
+
+        last_broadcast = []
+        for n in range(BROADCASTS):
+            sent_at = time.perf_counter()
+            receive = [asyncio.ensure_future(socket.recv()) for socket in readers]
+            await http.post("/api/notifications/delay", json={
+                "type": "delay_alert", "message": f"Benchmark {n}", "timestamp": "now", "shipment_id": n,
+            })
+            latencies = []
+            for future in asyncio.as_completed(receive):
+                message = json.loads(await future)
+                assert message["message"] == f"Benchmark {n}"
+                latencies.append(time.perf_counter() - sent_at)
+            last_broadcast.append(max(latencies))
+            if n == BROADCASTS - 1:
+                latencies = np.array(latencies) * 1000
+                print(f"Last broadcast:       p50 {np.percentile(latencies, 50):.0f} ms  "
+                      f"p99 {np.percentile(latencies, 99):.0f} ms  all {latencies.max():.0f} ms")
+
+        complete = np.array(last_broadcast) * 1000
+        print(f"Broadcast to {len(readers):,}:  median {np.median(complete):.0f} ms, "
+              f"worst {complete.max():.0f} ms until the last reading client had it "
+              f"({SLOW_CLIENTS} idle clients connected)")
+        # Each reading client now follows one shipment; a publish should only reach its subscriber
+        for i, socket in enumerate(readers):
+            await socket.send(json.dumps({"action": "subscribe", "shipment_ids": [i]}))
+        await asyncio.gather(*[socket.recv() for socket in readers])
+        targeted = []
+        for n in range(BROADCASTS):
+            sent_at = time.perf_counter()
+            await http.post("/api/notifications/delay", json={
+                "type": "delay_alert", "message": "Targeted", "timestamp": "now", "shipment_id": n,
+            })
+            message = json.loads(await readers[n].recv())
+            assert message["shipment_id"] == n
+            targeted.append(time.perf_counter() - sent_at)
+        targeted = np.array(targeted) * 1000
+        print(f"Targeted publish:     median {np.median(targeted):.1f} ms to the one subscribed client "
+              f"({len(readers):,} subscribed, {SLOW_CLIENTS} unfiltered idle clients)")
+
+        status = (await http.get("/api/notifications/status")).json()["fan_out"]
+        print(f"Server fan-out stats: {status}")
+
+        await asyncio.gather(*[socket.close() for socket in readers + idle], return_exceptions=True)
+
+
+def create_tables():
+    from app.models import tables
+    from app.models.base import Base, engine
+
+    Base.metadata.create_all(engine)
+
+
+def main():
+    print("📣 WebSocket Fan-out Benchmark")
+    create_tables()
+    server = multiprocessing.get_context("spawn").Process(target=serve, daemon=True)
+    server.start()
+    try:
+        asyncio.run(main_async())
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test script for the telemetry ingestion pipeline
+Runs against DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/telemetry.db"
+os.environ.setdefault("DEBUG", "false")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime, timezone
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app.api import telemetry
+from app.models import tables
+from app.models.base import Base, SessionLocal, engine
+from app.services.telemetry_service import TelemetryPipeline
+
+Base.metadata.create_all(engine)
+
+
+def stored(truck_id):
+    db = SessionLocal()
+    try:
+        return db.execute(
+            select(func.count()).select_from(tables.TelemetrySample).where(tables.TelemetrySample.truck_id == truck_id)
+        ).scalar()
+    finally:
+        db.close()
+
+
+def test_duplicate_ping_across_flushes():
+    """A ping re-sent after it was already flushed is skipped, not a failed batch"""
+    print("📡 Flushing the same ping twice...")
+    pipeline = TelemetryPipeline()
+    ping = (9001, datetime(2025, 1, 15, 8, 0, tzinfo=timezone.utc), 40.71, -74.0, 4.5)
+
+    pipeline.ingest([ping])
+    assert asyncio.run(pipeline.flush()) == 1
+    pipeline.ingest([ping, (9001, datetime(2025, 1, 15, 8, 1, tzinfo=timezone.utc), 40.72, -74.0, 4.6)])
+    assert asyncio.run(pipeline.flush()) == 2
+
+    assert pipeline.stats["flush_errors"] == 0
+    assert pipeline.buffered == 0
+    assert stored(9001) == 2
+    print("✅ Duplicate ping skipped, buffer drained")
+
+
+def test_rejected_sample_is_dead_lettered():
+    """A sample the database refuses is dead-lettered once; the rest of its batch is written"""
+    print("🪦 Flushing a batch with an invalid sample...")
+    pipeline = TelemetryPipeline()
+    pipeline.ingest([
+        (9002, datetime(2025, 1, 15, 8, 0, tzinfo=timezone.utc), 40.71, -74.0, 4.5),
+        (None, datetime(2025, 1, 15, 8, 0, tzinfo=timezone.utc), 40.71, -74.0, 4.5),
+        (9002, datetime(2025, 1, 15, 8, 1, tzinfo=timezone.utc), 40.72, -74.0, 4.6),
+    ])
+    assert asyncio.run(pipeline.flush()) == 2
+
+    assert pipeline.buffered == 0
+    assert pipeline.stats["samples_dead_lettered"] == 1
+    assert pipeline.dead_letters[0]["truck_id"] is None
+    assert stored(9002) == 2
+    assert asyncio.run(pipeline.flush()) == 0
+    print("✅ Invalid sample dead-lettered, not retried")
+
+
+def test_listeners_run_outside_flush_lock():
+    """A slow listener does not hold up the next flush, and batches still reach it in order"""
+    print("👂 Flushing while a listener is still busy...")
+    pipeline = TelemetryPipeline()
+    seen = []
+
+    async def slow_listener(samples):
+        await asyncio.sleep(0.05)
+        seen.append((samples[0][1].minute, pipeline._flush_lock.locked()))
+
+    async def flush_twice():
+        pipeline.add_listener(slow_listener)
+        pipeline.ingest([(9004, datetime(2025, 1, 15, 8, 0, tzinfo=timezone.utc), 40.71, -74.0, 4.5)])
+        first = asyncio.ensure_future(pipeline.flush())
+        await asyncio.sleep(0.01)
+        pipeline.ingest([(9004, datetime(2025, 1, 15, 8, 1, tzinfo=timezone.utc), 40.72, -74.0, 4.6)])
+        second = await pipeline.flush()
+        return await first, second
+
+    assert asyncio.run(flush_twice()) == (1, 1)
+    assert [minute for minute, _ in seen] == [0, 1]
+    assert not any(locked for _, locked in seen)
+    print("✅ Listeners ran in order without the flush lock")
+
+
+def test_mixed_timestamps_in_batch():
+    """Timestamps without an offset are read as UTC and can be mixed with aware ones"""
+    print("🕒 Posting naive, Z-suffixed and missing timestamps for one truck...")
+    app = FastAPI()
+    app.include_router(telemetry.router, prefix="/api/telemetry")
+    with TestClient(app) as client:
+        response = client.post("/api/telemetry/batch", json={"samples": [
+            {"truck_id": 9003, "lat": 40.71, "lng": -74.0, "recorded_at": "2025-01-01T00:00:00"},
+            {"truck_id": 9003, "lat": 40.72, "lng": -74.0, "recorded_at": "2025-01-01T00:00:05Z"},
+            {"truck_id": 9003, "lat": 40.73, "lng": -74.0},
+            {"truck_id": 9003, "lat": 40.74, "lng": -74.0, "recorded_at": "2025-01-01T00:00:10"},
+        ]})
+    assert response.status_code == 202, response.text
+    assert response.json()["accepted"] == 4
+    latest = telemetry.telemetry_pipeline.latest[9003]
+    assert latest[1].tzinfo is not None and latest[2] == 40.73
+    print("✅ Mixed timestamps accepted")
+
+
+if __name__ == "__main__":
+    test_duplicate_ping_across_flushes()
+    test_rejected_sample_is_dead_lettered()
+    test_listeners_run_outside_flush_lock()
+    test_mixed_timestamps_in_batch()
+    print("\n🎉 All telemetry tests passed!")
@@ -58,11 +58,14 @@ const NotificationPanel: React.FC = () => {
 
       ws.onmessage = (event) => {
         try {
-          const notification: Notification = JSON.parse(event.data);
+          const message = JSON.parse(event.data);
+          // Alert storms arrive as one batch frame, oldest first
+          const incoming: Notification[] = message.type === 'batch' ? message.notifications : [message];
           
           // Don't add connection messages to notifications
-          if (notification.type !== 'connection') {
-            setNotifications(prev => [notification, ...prev.slice(0, 49)]); // Keep last 50
+          const fresh = incoming.filter(notification => notification.type !== 'connection').reverse();
+          if (fresh.length) {
+            setNotifications(prev => [...fresh, ...prev].slice(0, 50)); // Keep last 50
           }
         } catch (error) {
           console.error('Failed to parse notification:', error);